@@ -0,0 +1,91 @@
+"""Benchmark alert ingest and paginated queries as the alert history grows.
+
+Usage:
+    python benchmarks/bench_alert_store.py [--printers 10000] [--records 2000000]
+
+Fills the store in stages with alerts from a simulated fleet (a mix of
+repeats that roll up into existing records and new alerts) and, at every
+stage, times ingest, a fleet-wide page, a page for one printer and a
+deep page reached through a cursor. Per-operation cost should stay flat
+as the history grows.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from alert_store import AlertStore  # noqa: E402
+
+MESSAGES = [
+    ('critical', 'High wear conditions detected', 'Nozzle', 'critical'),
+    ('critical', 'Sudden change in extruder temperature', 'Temperature Control', 'critical'),
+    ('warning', 'Bed temperature drifting upward', 'Bed', 'high'),
+    ('warning', 'Nozzle maintenance due in 3.0 days', 'Nozzle', 'medium'),
+]
+
+
+def make_alert(kind):
+    alert_type, message, component, priority = MESSAGES[kind % len(MESSAGES)]
+    # Unique components stand in for the long tail of distinct alerts
+    if kind >= len(MESSAGES):
+        component = f'{component} ({kind})'
+    return {'type': alert_type, 'message': message, 'component': component, 'priority': priority}
+
+
+def timed(n, func):
+    start = time.perf_counter()
+    for i in range(n):
+        func(i)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--printers', type=int, default=10000)
+    parser.add_argument('--records', type=int, default=2000000)
+    parser.add_argument('--stages', type=int, default=4)
+    parser.add_argument('--repeat-ratio', type=float, default=0.5,
+                        help='fraction of ingested alerts that repeat an open record')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    store = AlertStore(dedup_window=3600.0, max_records=args.records * 2)
+    printer_ids = [f'printer-{i:05d}' for i in range(args.printers)]
+    now = time.time()
+    kind_counter = len(MESSAGES)
+
+    print(f"{'records':>10} {'ingest':>12} {'page fleet':>12} {'page printer':>13} {'deep page':>12}")
+    per_stage = args.records // args.stages
+    for _ in range(args.stages):
+        printers = rng.integers(0, args.printers, per_stage)
+        repeats = rng.random(per_stage) < args.repeat_ratio
+        start = time.perf_counter()
+        occurrences = 0
+        for printer, repeat in zip(printers, repeats):
+            if repeat:
+                kind = int(printer) % len(MESSAGES)
+            else:
+                kind = kind_counter
+                kind_counter += 1
+            store.ingest(printer_ids[printer], [make_alert(kind)], now)
+            occurrences += 1
+            now += 0.001
+        ingest_us = (time.perf_counter() - start) / occurrences * 1e6
+
+        fleet_us = timed(200, lambda i: store.query(limit=50, now=now))
+        printer_us = timed(2000, lambda i: store.query(printer_ids[i % args.printers], limit=50, now=now))
+        middle = len(store) // 2
+        deep_us = timed(200, lambda i: store.query(cursor=middle + i, limit=50, now=now))
+        print(f"{len(store):>10} {ingest_us:10.2f}us {fleet_us:10.2f}us {printer_us:11.2f}us {deep_us:10.2f}us")
+
+    page = store.query(printer_ids[0], limit=5, now=now)
+    print(f"\n{store.occurrences} alert occurrences rolled up into {len(store)} records; "
+          f"printer {printer_ids[0]} top alert seen {page['items'][0]['count']} times")
+
+
+if __name__ == '__main__':
+    main()
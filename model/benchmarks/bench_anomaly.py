@@ -0,0 +1,98 @@
+"""Benchmark streaming anomaly detection throughput on one core and across a process pool.
+
+Usage:
+    python benchmarks/bench_anomaly.py [--printers 2000] [--seconds 60] [--processes 4]
+
+Every printer reports all monitored metrics once per simulated second.
+Events are fed to the detector in micro-batches of --batch-seconds worth
+of fleet telemetry. For the pool run, printers are sharded across worker
+processes, each with its own detector, as they would be across API
+workers.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from anomaly import METRIC_NAMES, StreamingDetector, process_telemetry  # noqa: E402
+
+
+def simulate(printers, seconds, seed):
+    """Noisy telemetry for every (printer, metric) stream, with a few drifts and spikes."""
+    rng = np.random.default_rng(seed)
+    values = rng.normal(0.0, 1.0, (seconds, printers, len(METRIC_NAMES)))
+    faulty = rng.choice(printers, max(1, printers // 100), replace=False)
+    values[seconds // 2:, faulty, 0] += np.linspace(0, 6, seconds - seconds // 2)[:, None]
+    values[seconds * 3 // 4, faulty, 1] += 30.0
+    return values
+
+
+def run_detector(printers, seconds, batch_seconds, seed):
+    """Process a shard of the fleet; returns (events, detections, elapsed)."""
+    values = simulate(printers, seconds, seed)
+    detector = StreamingDetector()
+    streams = np.array([[detector.stream_index(p, m) for m in METRIC_NAMES] for p in range(printers)])
+    streams = np.broadcast_to(streams, (batch_seconds,) + streams.shape).ravel()
+
+    detections = 0
+    start = time.perf_counter()
+    for lo in range(0, seconds, batch_seconds):
+        batch = values[lo:lo + batch_seconds].ravel()
+        detections += len(detector.process(streams[:len(batch)], batch))
+    return values.size, detections, time.perf_counter() - start
+
+
+def _pool_worker(args):
+    return run_detector(*args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--printers', type=int, default=2000)
+    parser.add_argument('--seconds', type=int, default=60)
+    parser.add_argument('--batch-seconds', type=int, default=5)
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    events, detections, elapsed = run_detector(args.printers, args.seconds, args.batch_seconds, 0)
+    print(f"one core: {events / elapsed:12.0f} events/s  ({events} events, "
+          f"{args.printers * len(METRIC_NAMES)} streams, {detections} detections)")
+
+    shards = [
+        (len(range(i, args.printers, args.processes)), args.seconds, args.batch_seconds, i)
+        for i in range(args.processes)
+    ]
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.processes) as pool:
+        results = pool.map(_pool_worker, shards)
+    wall = time.perf_counter() - start
+    events = sum(r[0] for r in results)
+    busiest = max(r[2] for r in results)
+    print(f"{args.processes} processes: {events / busiest:12.0f} events/s detector time, "
+          f"{events / wall:12.0f} events/s wall clock incl. pool start-up")
+
+    # End to end through the API helper: dict samples -> streams -> alerts
+    detector = StreamingDetector()
+    rng = np.random.default_rng(1)
+    samples = [
+        {'extruderTemp': 210 + rng.normal(0, 0.5), 'extruderTargetTemp': 210,
+         'bedTemp': 60 + rng.normal(0, 0.3), 'bedTargetTemp': 60,
+         'motorVibrationX': rng.normal(0.2, 0.02), 'filamentFlowRate': rng.normal(5, 0.1),
+         'powerConsumption': rng.normal(150, 5)}
+        for _ in range(200)
+    ]
+    n_printers = 200
+    start = time.perf_counter()
+    for printer in range(n_printers):
+        process_telemetry(detector, printer, samples)
+    elapsed = time.perf_counter() - start
+    print(f"process_telemetry (dict samples): {n_printers * len(samples) * 5 / elapsed:10.0f} events/s")
+
+
+if __name__ == '__main__':
+    main()
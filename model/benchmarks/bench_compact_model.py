@@ -0,0 +1,99 @@
+"""Compare the compact .npz model export with the joblib pickle.
+
+Usage:
+    python benchmarks/bench_compact_model.py [--quantize] [--prune-tolerance 0.0]
+
+Exports models/printer_model.pkl to a temporary .npz and reports file
+size, load time (in a fresh interpreter, including imports), single-row
+and 1000-row inference time and the accuracy delta on data/data.csv.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), '..', 'src')
+DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'data.csv')
+MODEL_PATH = os.path.join(os.path.dirname(__file__), '..', 'models', 'printer_model.pkl')
+sys.path.insert(0, SRC_DIR)
+
+from compact_model import CompactTreeModel, export_model  # noqa: E402
+
+LOAD_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+sys.path.insert(0, {src!r})
+from compact_model import load_artifact
+load_artifact({path!r})
+print(time.perf_counter() - start)
+"""
+
+
+def cold_load_time(path, repeat=3):
+    """Seconds to import the loader and load the model in a fresh process (best of `repeat`)."""
+    script = LOAD_SCRIPT.format(src=os.path.abspath(SRC_DIR), path=os.path.abspath(path))
+    return min(float(subprocess.check_output([sys.executable, '-c', script])) for _ in range(repeat))
+
+
+def per_call(func, n):
+    func()
+    start = time.perf_counter()
+    for _ in range(n):
+        func()
+    return (time.perf_counter() - start) / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--quantize', action='store_true')
+    parser.add_argument('--prune-tolerance', type=float, default=0.0)
+    args = parser.parse_args()
+
+    df = pd.read_csv(DATA_PATH)
+    pipeline = joblib.load(args.model)
+    X = df[list(pipeline.feature_names_in_)]
+    y = df['maintenance_needed']
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'model.npz')
+        report = export_model(pipeline, path, X, y, quantize=args.quantize,
+                              prune_tolerance=args.prune_tolerance)
+        compact = CompactTreeModel.load(path)
+
+        print(f"{'':<24} {'joblib':>12} {'compact':>12}")
+        print(f"{'file size':<24} {os.path.getsize(args.model) / 1024:10.0f}KB {os.path.getsize(path) / 1024:10.0f}KB")
+        print(f"{'cold load':<24} {cold_load_time(args.model) * 1000:10.1f}ms {cold_load_time(path) * 1000:10.1f}ms")
+        start = time.perf_counter()
+        joblib.load(args.model)
+        joblib_warm = time.perf_counter() - start
+        start = time.perf_counter()
+        CompactTreeModel.load(path)
+        compact_warm = time.perf_counter() - start
+        print(f"{'warm load':<24} {joblib_warm * 1000:10.1f}ms {compact_warm * 1000:10.1f}ms")
+
+        single = X.head(1)
+        batch = X.sample(n=1000, replace=True, random_state=0)
+        print(f"{'predict 1 row':<24} {per_call(lambda: pipeline.predict_proba(single), 50) * 1000:10.2f}ms "
+              f"{per_call(lambda: compact.predict_proba(single), 200) * 1000:10.2f}ms")
+        print(f"{'predict 1000 rows':<24} {per_call(lambda: pipeline.predict_proba(batch), 10) * 1000:10.2f}ms "
+              f"{per_call(lambda: compact.predict_proba(batch), 10) * 1000:10.2f}ms")
+
+        meta = compact.meta
+        print(f"\n{meta['n_trees']} trees, {meta['n_nodes']} nodes (from {meta['source_nodes']}), "
+              f"quantized={meta['quantized']}, prune_tolerance={meta['prune_tolerance']}")
+        print(f"accuracy {report['accuracy_source']:.4f} -> {report['accuracy_compact']:.4f} "
+              f"(delta {report['accuracy_delta']:+.4f}), max |probability diff| "
+              f"{report['max_abs_probability_diff']:.2e}")
+        assert np.allclose(compact.predict_proba(batch), pipeline.predict_proba(batch),
+                           atol=max(report['max_abs_probability_diff'], 1e-6) * 2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Compare loading training data with pd.read_csv against the columnar cache.
+
+Usage:
+    python benchmarks/bench_dataset_cache.py [--rows 1000000]
+
+Builds a CSV of --rows rows by resampling data/data.csv with noise, then
+reports load time and in-memory size for pd.read_csv with default dtypes,
+building the cache, and loading from the cache (memory-mapped and fully
+read), plus bulk scoring time from each frame.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), '..', 'src')
+DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'data.csv')
+MODEL_PATH = os.path.join(os.path.dirname(__file__), '..', 'models', 'printer_model.pkl')
+sys.path.insert(0, SRC_DIR)
+
+from dataset_cache import build_cache, load_cached_frame, load_dataset  # noqa: E402
+
+
+def make_csv(path, rows, seed=42):
+    rng = np.random.default_rng(seed)
+    base = pd.read_csv(DATA_PATH)
+    df = base.sample(n=rows, replace=True, random_state=seed).reset_index(drop=True)
+    for column in df.select_dtypes('float').columns:
+        df[column] *= rng.normal(1.0, 0.01, rows)
+    df.to_csv(path, index=False)
+
+
+def timed(func, repeat=3):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def frame_bytes(df):
+    return int(df.memory_usage(deep=True, index=False).sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='dataset-cache-bench-')
+    try:
+        csv_path = os.path.join(workdir, 'jobs.csv')
+        cache_dir = os.path.join(workdir, 'jobs.cache')
+        make_csv(csv_path, args.rows)
+        print(f"{args.rows} rows, CSV {os.path.getsize(csv_path) / 1e6:.1f} MB")
+
+        csv_time, csv_df = timed(lambda: pd.read_csv(csv_path))
+        build_time, _ = timed(lambda: build_cache(csv_path, cache_dir), repeat=1)
+        mmap_time, mmap_df = timed(lambda: load_dataset(csv_path, cache_dir))
+        full_time, full_df = timed(lambda: load_cached_frame(cache_dir, mmap=False))
+        cache_bytes = sum(os.path.getsize(os.path.join(cache_dir, name)) for name in os.listdir(cache_dir))
+
+        print(f"{'read_csv':<24} {csv_time * 1000:10.1f}ms  {frame_bytes(csv_df) / 1e6:8.1f} MB in memory")
+        print(f"{'build cache (once)':<24} {build_time * 1000:10.1f}ms  {cache_bytes / 1e6:8.1f} MB on disk")
+        print(f"{'cache, memory-mapped':<24} {mmap_time * 1000:10.1f}ms  {frame_bytes(mmap_df) / 1e6:8.1f} MB mapped "
+              f"(checks freshness)")
+        print(f"{'cache, fully read':<24} {full_time * 1000:10.1f}ms  {frame_bytes(full_df) / 1e6:8.1f} MB in memory")
+        print(f"load speedup {csv_time / mmap_time:.0f}x (mmap), {csv_time / full_time:.0f}x (read); "
+              f"memory {frame_bytes(csv_df) / frame_bytes(full_df):.1f}x smaller")
+
+        if os.path.exists(MODEL_PATH):
+            model = joblib.load(MODEL_PATH)
+            features = list(model.feature_names_in_)
+            n = min(args.rows, 200000)
+            csv_score, p_csv = timed(lambda: model.predict_proba(csv_df.iloc[:n][features])[:, 1], repeat=1)
+            cache_score, p_cache = timed(lambda: model.predict_proba(mmap_df.iloc[:n][features])[:, 1], repeat=1)
+            print(f"bulk scoring {n} rows: read_csv frame {csv_score * 1000:.0f}ms, "
+                  f"cached frame {cache_score * 1000:.0f}ms, max |diff| {np.abs(p_csv - p_cache).max():.2e}")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
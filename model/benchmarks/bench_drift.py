@@ -0,0 +1,99 @@
+"""Benchmark input drift monitoring: request overhead, sketch throughput, memory and score accuracy.
+
+Usage:
+    python benchmarks/bench_drift.py [--rows 1000000]
+
+Uses the reference sketch next to models/printer_model.pkl (build it with
+`python src/drift.py` if missing). Reports the cost of DriftMonitor.submit
+on the request path, sketch update throughput, sketch memory before and
+after --rows rows (it must not grow), and how close the binned KS distance
+is to scipy's exact two-sample KS on the same raw data, with and without a
+shift in print speed.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from scipy.stats import ks_2samp
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), '..', 'src')
+REFERENCE_PATH = os.path.join(os.path.dirname(__file__), '..', 'models', 'printer_model.drift.json')
+sys.path.insert(0, SRC_DIR)
+
+from drift import DriftMonitor, DriftSketch, NUMERIC_FEATURES, binned_ks  # noqa: E402
+from train_model import generate_synthetic_data  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    reference = DriftSketch.load(REFERENCE_PATH)
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+    live = generate_synthetic_data(5000)
+    jobs = live.drop(columns=['maintenance_needed', 'health_score']).to_dict(orient='records')
+
+    # Request path: one non-blocking put per request
+    monitor = DriftMonitor(reference, queue_size=100000)
+    start = time.perf_counter()
+    for job in jobs:
+        monitor.submit([job])
+    submit_us = (time.perf_counter() - start) / len(jobs) * 1e6
+    start = time.perf_counter()
+    monitor.drain()
+    drain = time.perf_counter() - start
+    print(f"submit(): {submit_us:.2f}us per request; background thread counted "
+          f"{len(jobs)} single-job requests in {drain * 1000:.0f}ms")
+
+    # Sketch throughput and memory over many rows
+    frame = pd.DataFrame(jobs)
+    sketch = reference.empty_like()
+    size_before = sketch.nbytes
+    tracemalloc.start()
+    sketch.update(frame)
+    baseline, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    counted = len(frame)
+    while counted < args.rows:
+        sketch.update(frame)
+        counted += len(frame)
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"update(): {(counted - len(frame)) / elapsed:,.0f} rows/s over {counted:,} rows")
+    print(f"sketch size {size_before} bytes before, {sketch.nbytes} bytes after {counted:,} rows "
+          f"(retained allocations grew by {max(0, current - baseline)} bytes)")
+    assert sketch.nbytes == size_before
+
+    # Binned KS against the exact statistic on raw samples
+    random.seed(args.seed + 1)
+    np.random.seed(args.seed + 1)
+    training = generate_synthetic_data(20000)
+    shifted = live.copy()
+    shifted['print_speed'] *= 1.15
+    print(f"\n{'data':<10} {'material':<6} {'feature':<20} {'binned KS':>10} {'exact KS':>10}")
+    for label, data in (('same', live), ('shifted', shifted)):
+        sample = reference.empty_like()
+        sample.update(data)
+        worst = 0.0
+        for g, group in enumerate(reference.groups):
+            for f, feature in enumerate(NUMERIC_FEATURES):
+                binned = binned_ks(reference.numeric[g, f], sample.numeric[g, f])
+                exact = ks_2samp(training.loc[training.material == group, feature],
+                                 data.loc[data.material == group, feature]).statistic
+                worst = max(worst, abs(binned - exact))
+                if feature == 'print_speed':
+                    print(f"{label:<10} {group:<6} {feature:<20} {binned:10.4f} {exact:10.4f}")
+        print(f"{label:<10} max |binned - exact| over all features: {worst:.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Measure the cost of per-feature path attributions against plain inference.
+
+Usage:
+    python benchmarks/bench_explain.py [--rows 1000] [--max-overhead 2.0]
+
+Times CompactTreeModel.predict_proba and CompactTreeModel.explain on the
+committed random forest (models/printer_model.npz) and on a gradient
+boosting pipeline trained on data/data.csv, for a single row and a batch.
+Checks that the contributions add up to every prediction and that explain
+stays within --max-overhead times the inference time.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), '..', 'src')
+DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'data.csv')
+COMPACT_PATH = os.path.join(os.path.dirname(__file__), '..', 'models', 'printer_model.npz')
+sys.path.insert(0, SRC_DIR)
+
+from compact_model import CompactTreeModel, explainer_for  # noqa: E402
+from train_model import build_model  # noqa: E402
+
+
+def per_call(func, n):
+    func()
+    start = time.perf_counter()
+    for _ in range(n):
+        func()
+    return (time.perf_counter() - start) / n
+
+
+def check_additive(model, X):
+    probabilities, base_value, contributions = model.explain(X)
+    total = base_value + contributions.sum(axis=1)
+    if model.explanation_space == 'log_odds':
+        total = 1.0 / (1.0 + np.exp(-total))
+    error = float(np.abs(total - probabilities).max())
+    assert error < 1e-9, f"contributions do not add up to the prediction (max error {error})"
+    assert np.allclose(probabilities, model.predict_proba(X)[:, 1])
+    return error
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--max-overhead', type=float, default=2.0)
+    args = parser.parse_args()
+
+    df = pd.read_csv(DATA_PATH)
+    X = df.drop(columns=['maintenance_needed'])
+    boosting = build_model(X)
+    boosting.fit(X, df['maintenance_needed'])
+    models = [
+        ('random forest', CompactTreeModel.load(COMPACT_PATH)),
+        ('gradient boosting', explainer_for(boosting)),
+    ]
+
+    worst = 0.0
+    print(f"{'model':<18} {'rows':>6} {'predict':>10} {'explain':>10} {'ratio':>7}")
+    for name, model in models:
+        features = X[list(model.feature_names_in_)]
+        check_additive(model, features)
+        batch = features.sample(n=args.rows, replace=True, random_state=0)
+        for rows, repeat in ((features.head(1), 300), (batch, 20)):
+            predict = per_call(lambda: model.predict_proba(rows), repeat)
+            explain = per_call(lambda: model.explain(rows), repeat)
+            worst = max(worst, explain / predict)
+            print(f"{name:<18} {len(rows):>6} {predict * 1000:8.2f}ms {explain * 1000:8.2f}ms "
+                  f"{explain / predict:6.2f}x")
+
+    print(f"\nworst overhead {worst:.2f}x (limit {args.max_overhead}x)")
+    assert worst <= args.max_overhead, "explain() is slower than the allowed overhead"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Benchmark update and query throughput of the component RUL forecaster.
+
+Usage:
+    python benchmarks/bench_forecasting.py [--printers 10000] [--events 200000]
+
+Simulates a fleet where every printer reports jobs over 90 days, then
+times single-event updates, micro-batched updates, a one-call forecast of
+the whole fleet and single-printer lookups.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from forecasting import COMPONENTS, ComponentForecaster, job_wear  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--printers', type=int, default=10000)
+    parser.add_argument('--events', type=int, default=200000)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    printer_ids = [f'printer-{i:05d}' for i in range(args.printers)]
+    events = rng.integers(0, args.printers, args.events)
+    start_time = time.time() - 90 * 86400
+    timestamps = np.sort(rng.uniform(start_time, time.time(), args.events))
+    # Per-printer usage intensity so rates differ across the fleet
+    intensity = rng.uniform(0.5, 2.0, (args.printers, len(COMPONENTS)))
+    increments = intensity[events] * rng.uniform(0.5, 1.5, (args.events, len(COMPONENTS))) * 1e-3
+
+    sample_job = {
+        'material': 'PLA', 'nozzle_temperature': 205, 'bed_temperature': 60, 'print_speed': 70,
+        'fan_speed': 80, 'layer_height': 0.2, 'wall_thickness': 0.8, 'nozzle_diameter': 0.4,
+        'infill_density': 20, 'infill_pattern': 'grid', 'print_time': 3.0
+    }
+    n = 20000
+    start = time.perf_counter()
+    for _ in range(n):
+        job_wear(sample_job)
+    print(f"job_wear (rules -> wear)       {n / (time.perf_counter() - start):12.0f} jobs/s")
+
+    forecaster = ComponentForecaster()
+    n = min(args.events, 50000)
+    start = time.perf_counter()
+    for i in range(n):
+        forecaster.update(printer_ids[events[i]], increments[i], timestamps[i])
+    elapsed = time.perf_counter() - start
+    print(f"update (one event per call)    {n / elapsed:12.0f} events/s  {elapsed / n * 1e6:8.2f}us/event")
+
+    forecaster = ComponentForecaster()
+    start = time.perf_counter()
+    for lo in range(0, args.events, args.batch_size):
+        hi = lo + args.batch_size
+        forecaster.update_batch([printer_ids[i] for i in events[lo:hi]], increments[lo:hi], timestamps[lo:hi])
+    elapsed = time.perf_counter() - start
+    print(f"update_batch ({args.batch_size}/call)        {args.events / elapsed:12.0f} events/s")
+
+    repeats = 20
+    start = time.perf_counter()
+    for _ in range(repeats):
+        _, _, _, days_remaining = forecaster.forecast()
+    elapsed = (time.perf_counter() - start) / repeats
+    print(f"forecast (whole fleet)         {elapsed * 1000:12.2f}ms for {len(forecaster)} printers "
+          f"({len(forecaster) / elapsed:.0f} printers/s)")
+
+    n = 10000
+    start = time.perf_counter()
+    for i in range(n):
+        forecaster.forecast_printer(printer_ids[i % args.printers])
+    elapsed = time.perf_counter() - start
+    print(f"forecast_printer               {n / elapsed:12.0f} lookups/s {elapsed / n * 1e6:8.2f}us/lookup")
+
+    finite = days_remaining[np.isfinite(days_remaining)]
+    print(f"median days remaining: {np.median(finite):.1f} over {finite.size} component forecasts")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Benchmark the per-request overhead of the token-bucket rate limiter.
+
+Usage:
+    python benchmarks/bench_rate_limiter.py [--calls 20000] [--keys 1000]
+
+Reports microseconds per consume() call for each storage backend, plus
+the end-to-end cost on /predict through the Flask test client with the
+limiter off and on.
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from rate_limiter import TokenBucketLimiter, create_storage  # noqa: E402
+
+
+def time_calls(func, n):
+    samples = np.empty(n)
+    for i in range(n):
+        start = time.perf_counter()
+        func(i)
+        samples[i] = (time.perf_counter() - start) * 1e6
+    return samples
+
+
+def report(label, samples):
+    p50, p99 = np.percentile(samples, [50, 99])
+    print(f"{label:<28} mean={samples.mean():8.2f}us p50={p50:8.2f}us p99={p99:8.2f}us")
+
+
+def bench_storage(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        for uri in ['memory://', f"sqlite:///{os.path.join(tmp, 'buckets.db')}"]:
+            limiter = TokenBucketLimiter(create_storage(uri), capacity=1e9, refill_rate=1e6)
+            keys = [f'printer:{i}' for i in range(args.keys)]
+            time_calls(lambda i: limiter.consume(keys[i % len(keys)]), 1000)
+            samples = time_calls(lambda i: limiter.consume(keys[i % len(keys)], cost=1 + i % 8), args.calls)
+            report(uri.split(':')[0], samples)
+
+
+def bench_endpoint(args):
+    import api
+
+    logging.disable(logging.CRITICAL)
+    client = api.app.test_client()
+    payload = {
+        'printer_id': 'bench-1', 'material': 'PLA', 'nozzle_temperature': 200,
+        'bed_temperature': 60, 'print_speed': 60, 'fan_speed': 80, 'layer_height': 0.2,
+        'wall_thickness': 0.8, 'nozzle_diameter': 0.4, 'infill_density': 20,
+        'infill_pattern': 'grid', 'print_time': 2
+    }
+    n = max(200, args.calls // 20)
+
+    def call(_):
+        assert client.post('/predict', json=payload).status_code == 200
+
+    with tempfile.TemporaryDirectory() as tmp:
+        api.rate_limiter = None
+        time_calls(call, 50)
+        off = time_calls(call, n)
+        api.rate_limiter = TokenBucketLimiter(
+            create_storage(f"sqlite:///{os.path.join(tmp, 'buckets.db')}"),
+            capacity=1e9, refill_rate=1e6
+        )
+        on = time_calls(call, n)
+    report('/predict limiter off', off)
+    report('/predict limiter on (sqlite)', on)
+    print(f"{'overhead (p50)':<28} {np.median(on) - np.median(off):+.2f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=20000)
+    parser.add_argument('--keys', type=int, default=1000)
+    parser.add_argument('--skip-endpoint', action='store_true')
+    args = parser.parse_args()
+
+    bench_storage(args)
+    if not args.skip_endpoint:
+        bench_endpoint(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Compare response-surface lookups with exact scoring.
+
+Usage:
+    python src/response_surface.py            # build models/response_surface.npz first
+    python benchmarks/bench_response_surface.py [--surface models/response_surface.npz]
+
+Times the rule scores plus model probability for single jobs and
+1000-job batches, exactly (sklearn pipeline and compact export) and by
+interpolation, on jobs drawn from the training distribution, and reports
+the interpolation error on those jobs next to the bound stored with the
+surface.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), '..', 'models')
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from compact_model import load_artifact  # noqa: E402
+from response_surface import OUTPUTS, ResponseSurface, exact_scores  # noqa: E402
+from train_model import generate_synthetic_data  # noqa: E402
+
+
+def per_call(func, n):
+    func()
+    start = time.perf_counter()
+    for _ in range(n):
+        func()
+    return (time.perf_counter() - start) / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--surface', default=os.path.join(MODEL_DIR, 'response_surface.npz'))
+    parser.add_argument('--model', default=os.path.join(MODEL_DIR, 'printer_model.pkl'))
+    args = parser.parse_args()
+
+    surface = ResponseSurface.load(args.surface)
+    pipeline = load_artifact(args.model)
+    compact = load_artifact(os.path.join(MODEL_DIR, 'printer_model.npz'))
+
+    random.seed(42)
+    np.random.seed(42)
+    df = generate_synthetic_data(2000).drop(columns=['maintenance_needed', 'health_score'])
+    jobs = df.to_dict(orient='records')
+    _, inside = surface.lookup(jobs)
+    grid_jobs = [job for job, ok in zip(jobs, inside) if ok]
+    print(f"{inside.sum()} of {len(jobs)} jobs fall inside the grid")
+
+    single = grid_jobs[:1]
+    batch = [grid_jobs[i % len(grid_jobs)] for i in range(1000)]
+    single_frame, batch_frame = pd.DataFrame(single), pd.DataFrame(batch)
+
+    print(f"{'':<28} {'1 job':>10} {'1000 jobs':>12}")
+    for name, func in (
+        ('exact (sklearn pipeline)', lambda frame, _: exact_scores(pipeline, frame)),
+        ('exact (compact export)', lambda frame, _: exact_scores(compact, frame)),
+        ('response surface', lambda _, records: surface.lookup(records)),
+    ):
+        one = per_call(lambda: func(single_frame, single), 50)
+        many = per_call(lambda: func(batch_frame, batch), 5)
+        print(f"{name:<28} {one * 1000:8.3f}ms {many * 1000:10.2f}ms")
+
+    approximate, _ = surface.lookup(grid_jobs)
+    error = np.abs(approximate - exact_scores(pipeline, pd.DataFrame(grid_jobs)))
+    print(f"\n{'error':<24} {'jobs max':>12} {'jobs mean':>13} {'documented max':>15}")
+    for i, name in enumerate(OUTPUTS):
+        print(f"{name:<24} {error[:, i].max():12.4f} {error[:, i].mean():13.4f} "
+              f"{surface.meta['error'][name]['max']:15.4f}")
+
+
+if __name__ == '__main__':
+    main()
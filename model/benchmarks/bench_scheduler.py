@@ -0,0 +1,107 @@
+"""Benchmark the fleet maintenance scheduler on a large fleet.
+
+Usage:
+    python benchmarks/bench_scheduler.py [--printers 10000] [--alerts 100000]
+
+Fills an alert store with open maintenance alerts (all distinct, so none
+roll up) and a forecaster with 90 days of wear for every printer, then
+times building a plan: collecting open alerts and forecasts, the greedy
+pass and the local search. It also reports what the local search adds over
+the greedy pass, next to an upper bound. With many technicians the greedy
+pass fills the hours almost exactly and is already within about 0.1% of the
+bound; the local search pays off when days end with spare hours, e.g. with
+--technicians 1.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from alert_store import AlertStore  # noqa: E402
+from anomaly import TELEMETRY_MAINTENANCE_ITEMS  # noqa: E402
+from forecasting import COMPONENTS, ComponentForecaster  # noqa: E402
+from scheduler import build_candidates, maintenance_plan, select_tasks, task_value  # noqa: E402
+
+PRIORITIES = ('critical', 'high', 'medium', 'low')
+
+
+def alert_code(k):
+    """A letters-only name for alert k: the store masks numbers, so digits would not tell alerts apart."""
+    letters = ''
+    while True:
+        k, digit = divmod(k, 26)
+        letters = chr(ord('a') + digit) + letters
+        if not k:
+            return letters
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--printers', type=int, default=10000)
+    parser.add_argument('--alerts', type=int, default=100000)
+    parser.add_argument('--events', type=int, default=200000)
+    parser.add_argument('--technicians', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    now = time.time()
+    printer_ids = [f'printer-{i:05d}' for i in range(args.printers)]
+    components = list(TELEMETRY_MAINTENANCE_ITEMS)
+
+    store = AlertStore()
+    for k in range(args.alerts):
+        component = components[rng.integers(len(components))]
+        store.ingest(printer_ids[rng.integers(args.printers)], [{
+            'type': 'warning',
+            'message': f'{component} alert {alert_code(k)}',
+            'component': component,
+            'priority': PRIORITIES[rng.integers(len(PRIORITIES))],
+            'maintenance_items': TELEMETRY_MAINTENANCE_ITEMS[component],
+        }], now)
+
+    forecaster = ComponentForecaster()
+    events = rng.integers(0, args.printers, args.events)
+    timestamps = np.sort(rng.uniform(now - 90 * 86400, now, args.events))
+    increments = rng.uniform(0.0, 0.02, (args.events, len(COMPONENTS)))
+    forecaster.update_batch([printer_ids[i] for i in events], increments, timestamps)
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        alerts = store.open_alerts(now)
+        plan = maintenance_plan(alerts, forecaster.forecast(), now, technicians=args.technicians)
+        timings.append(time.perf_counter() - start)
+    print(f"plan ({len(alerts)} open alerts, {args.printers} printers)  "
+          f"median={np.median(timings) * 1000:.1f}ms  min={min(timings) * 1000:.1f}ms")
+    print(f"{plan['candidates']} candidate tasks, {plan['scheduled']} scheduled, "
+          f"{plan['technician_hours_used']:.1f}/{plan['technician_hours_available']:.0f} technician hours, "
+          f"net benefit ${plan['net_benefit']:,.0f}")
+
+    # How much the local search adds over the greedy pass alone
+    candidates = build_candidates(alerts, forecaster.forecast())
+    benefit, cost = task_value(candidates)
+    value = benefit - cost
+    codes = {}
+    printers = np.array([codes.setdefault(p, len(codes)) for p in candidates['printer_id']])
+    day_capacity = args.technicians * 8.0
+    greedy = value[select_tasks(printers, candidates['hours'], value, day_capacity, 7, 4.0, max_swaps=0) >= 0].sum()
+    refined = value[select_tasks(printers, candidates['hours'], value, day_capacity, 7, 4.0) >= 0].sum()
+    # Upper bound: the fractional knapsack on total hours, ignoring days and downtime
+    by_ratio = np.argsort(-(value / candidates['hours']))
+    by_ratio = by_ratio[value[by_ratio] > 0]
+    used = np.cumsum(candidates['hours'][by_ratio])
+    whole = used <= day_capacity * 7
+    partial = by_ratio[~whole][:1]
+    bound = value[by_ratio[whole]].sum() + (
+        value[partial].sum() * (day_capacity * 7 - used[whole][-1]) / candidates['hours'][partial].sum()
+        if len(partial) and whole.any() else 0.0)
+    print(f"greedy ${greedy:,.0f} -> local search ${refined:,.0f} (upper bound ${bound:,.0f})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Benchmark /predict latency with and without shadow evaluation.
+
+Usage:
+    python benchmarks/bench_shadow.py [--requests 2000] [--candidate models/printer_model.pkl]
+
+The same request stream is replayed through the Flask test client with
+shadow mode off and on. Shadow scoring happens in low-priority worker
+processes, so the primary latency percentiles should match within noise.
+On a single core use a non-zero --interval so the workers have idle time
+to run in; with --interval 0 the queue fills and samples are dropped
+instead of delaying requests.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import api  # noqa: E402
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'data.csv')
+
+
+def load_requests(n):
+    df = pd.read_csv(DATA_PATH).drop(columns=['maintenance_needed'])
+    df['nozzle_diameter'] = 0.4
+    df['print_time'] = 2.0
+    records = df.to_dict(orient='records')
+    return [records[i % len(records)] for i in range(n)]
+
+
+def replay(client, payloads, interval):
+    latencies = np.empty(len(payloads))
+    for i, payload in enumerate(payloads):
+        start = time.perf_counter()
+        response = client.post('/predict', json=payload)
+        latencies[i] = (time.perf_counter() - start) * 1000.0
+        assert response.status_code == 200, response.get_json()
+        if interval:
+            time.sleep(interval)
+    return latencies
+
+
+def summarise(label, latencies):
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    print(f"{label:<12} mean={latencies.mean():7.3f}ms p50={p50:7.3f}ms "
+          f"p95={p95:7.3f}ms p99={p99:7.3f}ms")
+    return p50, p99
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--candidate', default=api.app.config['MODEL_PATH'])
+    parser.add_argument('--interval', type=float, default=0.002,
+                        help='pause between requests in seconds (0 = closed loop)')
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    api.rate_limiter = None
+    if api.model is None:
+        sys.exit("Production model not found; cannot benchmark shadow mode")
+
+    client = api.app.test_client()
+    payloads = load_requests(args.requests)
+    replay(client, payloads[:100], args.interval)  # warm up
+
+    api.configure_shadow(None)
+    off = summarise('shadow off', replay(client, payloads, args.interval))
+
+    evaluator = api.configure_shadow(args.candidate)
+    on = summarise('shadow on', replay(client, payloads, args.interval))
+    evaluator.drain()
+    stats = evaluator.stats()
+    api.configure_shadow(None)
+
+    print(f"shadow scored={stats['scored']} dropped={stats['dropped']} "
+          f"agreement={stats.get('agreement_rate', float('nan')):.3f} "
+          f"candidate p50={stats['candidate_latency_ms']['p50']:.3f}ms/row")
+    print(f"p50 overhead={on[0] - off[0]:+.3f}ms p99 overhead={on[1] - off[1]:+.3f}ms")
+
+
+if __name__ == '__main__':
+    main()
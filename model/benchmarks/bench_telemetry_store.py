@@ -0,0 +1,123 @@
+"""Benchmark tiered telemetry retention: ingest, compaction and range queries over 90 days.
+
+Usage:
+    python benchmarks/bench_telemetry_store.py [--printers 1000] [--days 90] [--live-seconds 300]
+
+Builds a TelemetryStore holding --days of history for --printers printers
+(7 metrics each), all on a simulated clock:
+- hourly rollups for the older history and per-minute rollups for the
+  last day are loaded with import_rollups;
+- --live-seconds of per-second telemetry are then ingested for every
+  printer, with compaction every 10 seconds as the background thread
+  would run it.
+Reports ingest throughput, compaction time, store memory and /telemetry
+range query latency (tier read, points returned) for ranges from an hour
+to the full history. For comparison it also times a single min/max/mean
+pass over the raw per-second points each range would otherwise hold.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), '..', 'src')
+sys.path.insert(0, SRC_DIR)
+
+from anomaly import METRIC_NAMES  # noqa: E402
+from telemetry_store import TelemetryStore  # noqa: E402
+
+DAY = 86400
+RANGES = (('1 hour', 3600), ('1 day', DAY), ('7 days', 7 * DAY), ('30 days', 30 * DAY), ('90 days', 90 * DAY))
+
+
+def synthetic(times, base, rng):
+    """Per-bucket min/max/mean/count around a daily cycle."""
+    mean = base + 3.0 * np.sin(2 * np.pi * times / DAY) + rng.normal(0, 0.5, len(times))
+    spread = np.abs(rng.normal(1.5, 0.3, len(times)))
+    return mean - spread, mean + spread, mean
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--printers', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--live-seconds', type=int, default=300)
+    parser.add_argument('--queries', type=int, default=200, help='queries per range')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    store = TelemetryStore()
+    printers = [f'printer-{i:05d}' for i in range(args.printers)]
+    now = float(1_790_000_000 // DAY * DAY)
+    history_start = now - args.days * DAY
+    hours = np.arange(history_start, now - DAY, 3600.0)
+    minutes = np.arange(now - DAY, now, 60.0)
+
+    start = time.perf_counter()
+    for printer_id in printers:
+        for metric, base in zip(METRIC_NAMES, rng.uniform(0.2, 220.0, len(METRIC_NAMES))):
+            low, high, mean = synthetic(hours, base, rng)
+            store.import_rollups('1h', printer_id, metric, hours, low, high, mean, np.full(len(hours), 3600))
+            low, high, mean = synthetic(minutes, base, rng)
+            store.import_rollups('1m', printer_id, metric, minutes, low, high, mean, np.full(len(minutes), 60))
+    print(f"loaded {args.days} days of rollups for {len(printers)} printers x {len(METRIC_NAMES)} metrics "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    written = store.compact(now)
+    print(f"first compaction (rolls the history into daily buckets): {time.perf_counter() - start:.2f}s {written}")
+
+    # Live per-second telemetry: one request per printer per second
+    values = rng.uniform(0.2, 220.0, (len(printers), len(METRIC_NAMES)))
+    ingest_time = compaction_time = slowest = 0.0
+    compactions = 0
+    for second in range(args.live_seconds):
+        clock = now + second
+        noise = values + rng.normal(0, 0.5, values.shape)
+        start = time.perf_counter()
+        for row, printer_id in enumerate(printers):
+            sample = dict(zip(METRIC_NAMES, noise[row].tolist()))
+            sample['timestamp'] = clock
+            store.ingest(printer_id, [sample], now=clock)
+        ingest_time += time.perf_counter() - start
+        if second % 10 == 0:
+            start = time.perf_counter()
+            store.compact(clock)
+            elapsed = time.perf_counter() - start
+            compaction_time += elapsed
+            slowest = max(slowest, elapsed)
+            compactions += 1
+    now += args.live_seconds
+    stored = args.live_seconds * len(printers) * len(METRIC_NAMES)
+    print(f"ingest: {stored / ingest_time:,.0f} values/s ({args.live_seconds * len(printers) / ingest_time:,.0f} "
+          f"requests/s); compaction every 10s: {compaction_time / compactions * 1000:.1f}ms on average, {slowest * 1000:.1f}ms max")
+    print(f"store memory: {store.nbytes / 2 ** 20:.0f}MB "
+          f"({store.nbytes / len(printers) / 1024:.0f}KB per printer, fixed by the retention policy)")
+
+    print(f"\n{'range':<10} {'tier':>5} {'points':>7} {'p50':>9} {'p99':>9} {'raw scan':>10}")
+    for label, seconds in RANGES:
+        if seconds > args.days * DAY:
+            continue
+        latencies, tiers, points = [], set(), 0
+        for _ in range(args.queries):
+            printer_id = printers[rng.integers(len(printers))]
+            metric = METRIC_NAMES[rng.integers(len(METRIC_NAMES))]
+            begin = time.perf_counter()
+            history = store.query(printer_id, metric, now - seconds, now)
+            latencies.append(time.perf_counter() - begin)
+            tiers.add(history['tier'])
+            points = len(history['timestamps'])
+        raw = rng.normal(200.0, 1.0, seconds).astype(np.float32)
+        begin = time.perf_counter()
+        raw.min(), raw.max(), raw.mean()
+        raw_scan = time.perf_counter() - begin
+        p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+        print(f"{label:<10} {','.join(sorted(tiers)):>5} {points:>7} {p50:7.2f}ms {p99:7.2f}ms "
+              f"{raw_scan * 1000:8.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+"""Load-test the API with a simulated print farm and find its saturation point.
+
+Usage:
+    python benchmarks/loadtest.py --printers 500 --server gunicorn --workers 4
+    python benchmarks/loadtest.py --url http://127.0.0.1:5001 --max-concurrency 64
+
+A local server is started (Flask dev server or gunicorn) unless --url is
+given. N virtual printers, each with a material and job profile drawn from
+generate_synthetic_data, submit jobs to /predict and telemetry
+micro-batches to /telemetry (mixed by --telemetry-ratio) at increasing
+client concurrency. Each step reports throughput, latency percentiles and error rate; the
+ramp stops once throughput stops improving (or errors/latency blow up)
+and the best step is reported as the node's capacity, together with the
+number of printers that capacity supports at --printer-rate.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), '..', 'src')
+sys.path.insert(0, SRC_DIR)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind, workers, threads, app='api', env=None):
+    """Start a local server for `app` (the API by default) with rate limiting off; returns (process, base_url)."""
+    port = free_port()
+    env = dict(os.environ, RATE_LIMIT_ENABLED='0', **(env or {}))
+    if kind == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', '-w', str(workers), '--threads', str(threads),
+                   '-b', f'127.0.0.1:{port}', '--log-level', 'warning', f'{app}:app']
+    else:
+        command = [sys.executable, '-m', 'flask', '--app', app, 'run',
+                   '--port', str(port), '--with-threads']
+    process = subprocess.Popen(command, cwd=SRC_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{kind} server exited with code {process.returncode}")
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/test')
+            if connection.getresponse().status == 200:
+                return process, base_url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{kind} server did not become ready on port {port}")
+
+
+def build_print_farm(n_printers, seed):
+    """Give every virtual printer a material and job profile from the training distribution."""
+    from train_model import generate_synthetic_data
+
+    random.seed(seed)
+    np.random.seed(seed)
+    df = generate_synthetic_data(max(n_printers, 200))
+    df = df.drop(columns=['maintenance_needed', 'health_score'])
+    printers = []
+    for i, row in enumerate(df.head(n_printers).to_dict(orient='records')):
+        row = {key: (float(value) if isinstance(value, (np.floating, float)) else value)
+               for key, value in row.items()}
+        row.update(printer_id=f'printer-{i:05d}', nozzle_diameter=0.4,
+                   print_time=round(random.uniform(0.5, 12.0), 2))
+        printers.append(row)
+    return printers
+
+
+def jittered_job(profile, rng):
+    """A new job from a printer: its profile with small per-job variation."""
+    job = dict(profile)
+    for key, scale in (('nozzle_temperature', 2.0), ('bed_temperature', 1.0),
+                       ('print_speed', 3.0), ('fan_speed', 2.0)):
+        job[key] = job[key] + rng.gauss(0, scale)
+    job['print_time'] = round(rng.uniform(0.5, 12.0), 2)
+    return job
+
+
+def telemetry_batch(profile, rng, size):
+    """A micro-batch of per-second telemetry from a printer running its profile."""
+    now = time.time()
+    return {
+        'printer_id': profile['printer_id'],
+        'samples': [
+            {
+                'timestamp': now - size + i,
+                'extruderTemp': profile['nozzle_temperature'] + rng.gauss(0, 0.8),
+                'extruderTargetTemp': profile['nozzle_temperature'],
+                'bedTemp': profile['bed_temperature'] + rng.gauss(0, 0.4),
+                'bedTargetTemp': profile['bed_temperature'],
+                'motorVibrationX': abs(rng.gauss(0.2, 0.03)),
+                'motorVibrationY': abs(rng.gauss(0.2, 0.03)),
+                'motorVibrationZ': abs(rng.gauss(0.1, 0.02)),
+                'filamentFlowRate': profile['print_speed'] * profile['layer_height'] * 0.4 + rng.gauss(0, 0.1),
+                'powerConsumption': 120 + profile['bed_temperature'] * 0.8 + rng.gauss(0, 4),
+            }
+            for i in range(size)
+        ]
+    }
+
+
+def client_loop(base_url, printers, stop, results, seed, telemetry_ratio, telemetry_size):
+    parsed = urllib.parse.urlparse(base_url)
+    rng = random.Random(seed)
+    connection = None
+    latencies, errors = [], 0
+    while not stop.is_set():
+        profile = rng.choice(printers)
+        if rng.random() < telemetry_ratio:
+            path, body = '/telemetry', json.dumps(telemetry_batch(profile, rng, telemetry_size))
+        else:
+            path, body = '/predict', json.dumps(jittered_job(profile, rng))
+        start = time.perf_counter()
+        try:
+            if connection is None:
+                connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=30)
+            connection.request('POST', path, body, {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            if connection is not None:
+                connection.close()
+            connection = None
+    if connection is not None:
+        connection.close()
+    results.append((latencies, errors))
+
+
+def run_step(base_url, printers, concurrency, duration, seed, telemetry_ratio=0.0, telemetry_size=10):
+    stop = threading.Event()
+    results = []
+    shards = [printers[i::concurrency] or printers for i in range(concurrency)]
+    threads = [
+        threading.Thread(target=client_loop, args=(base_url, shards[i], stop, results, seed + i,
+                                                   telemetry_ratio, telemetry_size))
+        for i in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([value for lat, _ in results for value in lat]) * 1000.0
+    errors = sum(err for _, err in results)
+    total = len(latencies) + errors
+    step = {
+        'concurrency': concurrency,
+        'requests': total,
+        'throughput_rps': len(latencies) / elapsed,
+        'error_rate': errors / total if total else 0.0,
+    }
+    if len(latencies):
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        step.update(p50_ms=float(p50), p90_ms=float(p90), p99_ms=float(p99))
+    return step
+
+
+def is_saturated(step, best, args):
+    if step['error_rate'] > args.max_error_rate:
+        return True
+    if args.max_p99_ms and step.get('p99_ms', 0.0) > args.max_p99_ms:
+        return True
+    return step['throughput_rps'] < best['throughput_rps'] * (1 + args.min_gain)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='target an already running server instead of starting one')
+    parser.add_argument('--server', choices=['flask', 'gunicorn'], default='flask')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=4, help='gunicorn threads per worker')
+    parser.add_argument('--printers', type=int, default=200)
+    parser.add_argument('--telemetry-ratio', type=float, default=0.5,
+                        help='fraction of requests that are /telemetry micro-batches')
+    parser.add_argument('--telemetry-batch', type=int, default=10,
+                        help='samples per /telemetry request')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per concurrency step')
+    parser.add_argument('--max-concurrency', type=int, default=128)
+    parser.add_argument('--min-gain', type=float, default=0.05,
+                        help='throughput gain below which a step counts as saturated')
+    parser.add_argument('--patience', type=int, default=2,
+                        help='consecutive saturated steps before stopping')
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--max-p99-ms', type=float, default=1000.0)
+    parser.add_argument('--printer-rate', type=float, default=1.0,
+                        help='requests per printer per minute, used for the capacity estimate')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write the step results as JSON')
+    args = parser.parse_args()
+
+    printers = build_print_farm(args.printers, args.seed)
+    process = None
+    base_url = args.url
+    if base_url is None:
+        process, base_url = start_server(args.server, args.workers, args.threads)
+        print(f"Started {args.server} server at {base_url}")
+
+    steps, best, strikes = [], None, 0
+    try:
+        concurrency = 1
+        while concurrency <= args.max_concurrency:
+            step = run_step(base_url, printers, concurrency, args.duration, args.seed,
+                            args.telemetry_ratio, args.telemetry_batch)
+            steps.append(step)
+            print(f"c={concurrency:<4} {step['throughput_rps']:8.1f} req/s  "
+                  f"p50={step.get('p50_ms', float('nan')):8.2f}ms  "
+                  f"p90={step.get('p90_ms', float('nan')):8.2f}ms  "
+                  f"p99={step.get('p99_ms', float('nan')):8.2f}ms  "
+                  f"errors={step['error_rate']:.2%}")
+            if best is None:
+                best = step
+            elif is_saturated(step, best, args):
+                strikes += 1
+                if strikes >= args.patience:
+                    break
+            else:
+                strikes = 0
+            if step['error_rate'] <= args.max_error_rate and step['throughput_rps'] > best['throughput_rps']:
+                best = step
+            concurrency *= 2
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(10)
+
+    supported = best['throughput_rps'] * 60.0 / args.printer_rate
+    print(f"\nSaturation at concurrency {best['concurrency']}: {best['throughput_rps']:.1f} req/s, "
+          f"p99={best.get('p99_ms', float('nan')):.2f}ms")
+    print(f"Estimated printers per node at {args.printer_rate:g} req/printer/min: {int(supported)}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'steps': steps, 'saturation': best,
+                       'supported_printers': int(supported)}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
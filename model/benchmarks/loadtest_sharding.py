@@ -0,0 +1,202 @@
+"""Load-test consistent-hash sharding: key movement, rebalancing and throughput from 1 to 8 shards.
+
+Usage:
+    python benchmarks/loadtest_sharding.py --max-shards 8 --concurrency 32 --duration 20
+    python benchmarks/loadtest_sharding.py --skip-scaling --printers 2000
+
+Three parts:
+- ring: for --keys printer IDs and 1..--max-shards shards, the load spread
+  (largest shard / mean) and the share of printers that move when one
+  shard is added, against the ideal 1/n and against hash(id) % n placement;
+- scaling: for each shard count, that many API processes (gunicorn, one
+  worker each) are started behind router.py and a closed-loop mix of
+  /predict and /telemetry requests (loadtest.run_step) is run at
+  --concurrency, reporting throughput, speedup over one shard and latency;
+- rebalance: one shard is loaded with --printers printers' jobs, alerts
+  and telemetry, then shards are added one at a time with POST /shards
+  while requests keep coming, reporting printers moved, migration time and
+  failed requests.
+All processes share this host, so throughput can only scale with the CPU
+cores it has (printed first); per-shard state also shrinks by 1/n.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), '..', 'src')
+sys.path.insert(0, SRC_DIR)
+sys.path.insert(0, os.path.dirname(__file__))
+
+from loadtest import build_print_farm, client_loop, jittered_job, run_step, start_server, telemetry_batch  # noqa: E402
+from loadtest_stream import get_json  # noqa: E402
+from sharding import HashRing, stable_hash  # noqa: E402
+
+# Shards sit behind the router, one trusted hop
+SHARD_ENV = {'TRUSTED_PROXY_HOPS': '1'}
+
+
+def post_json(base_url, path, payload):
+    parsed = urllib.parse.urlparse(base_url)
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=300)
+    try:
+        connection.request('POST', path, json.dumps(payload), {'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def ring_report(keys, max_shards, vnodes):
+    print(f"ring: {keys} printer IDs, {vnodes} points per shard")
+    print(f"{'shards':>6} {'max/mean load':>14} {'moved on add':>13} {'ideal':>7} {'hash % n':>9}")
+    ids = [f'printer-{i:06d}' for i in range(keys)]
+    hashes = np.array([stable_hash(p) for p in ids], dtype=np.uint64)
+    ring = HashRing(vnodes=vnodes)
+    previous = None
+    for n in range(1, max_shards + 1):
+        ring.add(f'shard-{n - 1}')
+        owners = [ring.node_for(p) for p in ids]
+        _, counts = np.unique(owners, return_counts=True)
+        if previous is None:
+            moved = modulo = float('nan')
+        else:
+            moved = np.mean([a != b for a, b in zip(owners, previous)])
+            modulo = np.mean(hashes % np.uint64(n) != hashes % np.uint64(n - 1))
+        print(f"{n:>6} {counts.max() / counts.mean():>14.3f} {moved:>13.3f} {1 / n if n > 1 else float('nan'):>7.3f} "
+              f"{modulo:>9.3f}")
+        previous = owners
+
+
+def start_cluster(shards, threads):
+    processes, backends = [], []
+    try:
+        for i in range(shards):
+            process, url = start_server('gunicorn', 1, threads, env=SHARD_ENV)
+            processes.append(process)
+            backends.append(f'shard-{i}={url}')
+        router, router_url = start_server('gunicorn', 1, 64, app='router',
+                                          env={'SHARD_BACKENDS': ','.join(backends)})
+        processes.append(router)
+    except Exception:
+        stop_processes(processes)
+        raise
+    return processes, router_url
+
+
+def stop_processes(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.wait(10)
+
+
+def scaling_report(args, printers):
+    print(f"\nscaling: {args.concurrency} clients for {args.duration:g}s per shard count "
+          f"({args.telemetry_ratio:.0%} /telemetry)")
+    print(f"{'shards':>6} {'req/s':>8} {'speedup':>8} {'p50':>9} {'p99':>9} {'errors':>7}")
+    rows, base = [], None
+    for shards in range(1, args.max_shards + 1):
+        processes, router_url = start_cluster(shards, args.shard_threads)
+        try:
+            run_step(router_url, printers, args.concurrency, 2.0, args.seed)  # warm-up
+            step = run_step(router_url, printers, args.concurrency, args.duration, args.seed,
+                            args.telemetry_ratio)
+        finally:
+            stop_processes(processes)
+        base = base or step['throughput_rps']
+        step.update(shards=shards, speedup=step['throughput_rps'] / base)
+        rows.append(step)
+        print(f"{shards:>6} {step['throughput_rps']:>8.1f} {step['speedup']:>7.2f}x {step.get('p50_ms', 0):7.1f}ms "
+              f"{step.get('p99_ms', 0):7.1f}ms {step['error_rate']:>7.2%}")
+    return rows
+
+
+def rebalance_report(args, printers):
+    print(f"\nrebalance: {len(printers)} printers on one shard, adding shards up to {args.max_shards} under load")
+    processes, router_url = start_cluster(1, args.shard_threads)
+    try:
+        rng = random.Random(args.seed)
+        now = time.time()
+        for day in range(3, 0, -1):
+            for i in range(0, len(printers), 500):
+                jobs = [dict(jittered_job(p, rng), timestamp=now - day * 86400) for p in printers[i:i + 500]]
+                status, reply = post_json(router_url, '/predict/batch', {'jobs': jobs})
+                assert status == 200, reply
+        for profile in printers:
+            post_json(router_url, '/telemetry', telemetry_batch(profile, rng, 30))
+
+        stop = threading.Event()
+        results = []
+        clients = [threading.Thread(target=client_loop,
+                                    args=(router_url, printers, stop, results, args.seed + i, args.telemetry_ratio, 10))
+                   for i in range(4)]
+        for client in clients:
+            client.start()
+        print(f"{'shards':>6} {'held':>6} {'moved':>6} {'moved %':>8} {'ideal %':>8} {'seconds':>8}")
+        rows = []
+        try:
+            for n in range(2, args.max_shards + 1):
+                process, url = start_server('gunicorn', 1, args.shard_threads, env=SHARD_ENV)
+                processes.append(process)
+                start = time.perf_counter()
+                status, summary = post_json(router_url, '/shards', {'name': f'shard-{n - 1}', 'url': url})
+                elapsed = time.perf_counter() - start
+                assert status == 200, summary
+                rows.append({'shards': n, 'printers': summary['printers'], 'moved': summary['moved'],
+                             'seconds': elapsed})
+                print(f"{n:>6} {summary['printers']:>6} {summary['moved']:>6} "
+                      f"{summary['moved'] / summary['printers']:>8.1%} {1 / n:>8.1%} {elapsed:>8.2f}")
+        finally:
+            stop.set()
+            for client in clients:
+                client.join()
+        latencies = np.array([value for lat, _ in results for value in lat]) * 1000.0
+        errors = sum(err for _, err in results)
+        print(f"requests during rebalancing: {len(latencies)} ok, {errors} failed, "
+              f"p99 {np.percentile(latencies, 99):.0f}ms, max {latencies.max():.0f}ms")
+        held = get_json(router_url, '/shards')
+        print(f"router: {held['moved']} printers moved in total across {len(held['shards'])} shards")
+        return {'steps': rows, 'requests': len(latencies), 'errors': errors}
+    finally:
+        stop_processes(processes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--max-shards', type=int, default=8)
+    parser.add_argument('--keys', type=int, default=100000, help='printer IDs for the ring analysis')
+    parser.add_argument('--vnodes', type=int, default=160)
+    parser.add_argument('--printers', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds of load per shard count')
+    parser.add_argument('--shard-threads', type=int, default=8)
+    parser.add_argument('--telemetry-ratio', type=float, default=0.5)
+    parser.add_argument('--skip-scaling', action='store_true')
+    parser.add_argument('--skip-rebalance', action='store_true')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPU cores available")
+    ring_report(args.keys, args.max_shards, args.vnodes)
+    printers = build_print_farm(args.printers, args.seed)
+    results = {'cpu_count': os.cpu_count()}
+    if not args.skip_scaling:
+        results['scaling'] = scaling_report(args, printers)
+    if not args.skip_rebalance:
+        results['rebalance'] = rebalance_report(args, printers)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+"""Load-test the /stream Server-Sent Events push channel with many concurrent subscribers.
+
+Usage:
+    python benchmarks/loadtest_stream.py --subscribers 5000 --printers 500 --rate 50
+    python benchmarks/loadtest_stream.py --url http://127.0.0.1:5001 --subscribers 1000
+
+A local Flask server is started unless --url is given. --subscribers
+dashboard connections are opened (each following one printer of the
+simulated farm, as the per-printer dashboard view does) and read from a
+single selector loop. While they are connected, jobs from random printers
+are posted to /predict at --rate per second; every job pushes a health
+delta, plus any new alerts, to the subscribers of its printer. Reports
+connected subscribers, delivery latency percentiles, resyncs (events
+dropped for slow readers), server memory and threads, and the polling
+load the same dashboards would have generated.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import selectors
+import socket
+import sys
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from loadtest import build_print_farm, jittered_job, start_server  # noqa: E402
+
+
+class Subscriber:
+    """A raw-socket SSE reader; only complete `data:` lines are parsed."""
+
+    def __init__(self, printer_id):
+        self.printer_id = printer_id
+        self.sock = None
+        self.buffer = b''
+        self.events = 0
+        self.resyncs = 0
+        self.connected = False
+
+
+def open_subscriber(host, port, subscriber, selector):
+    sock = socket.socket()
+    sock.setblocking(False)
+    sock.connect_ex((host, port))
+    subscriber.sock = sock
+    request = (f'GET /stream?printers={subscriber.printer_id} HTTP/1.1\r\nHost: {host}\r\n'
+               f'Accept: text/event-stream\r\n\r\n').encode()
+    selector.register(sock, selectors.EVENT_WRITE, (subscriber, request))
+
+
+def handle(key, mask, selector, latencies, now, failed):
+    subscriber, request = key.data
+    sock = key.fileobj
+    if mask & selectors.EVENT_WRITE:
+        try:
+            sock.send(request)
+        except OSError:
+            selector.unregister(sock)
+            sock.close()
+            failed.append(subscriber)
+            return
+        selector.modify(sock, selectors.EVENT_READ, (subscriber, None))
+        return
+    try:
+        chunk = sock.recv(65536)
+    except (BlockingIOError, InterruptedError):
+        return
+    except OSError:
+        chunk = b''
+    if not chunk:
+        selector.unregister(sock)
+        sock.close()
+        if not subscriber.connected:
+            failed.append(subscriber)
+        subscriber.connected = False
+        return
+    subscriber.connected = True
+    lines = (subscriber.buffer + chunk).split(b'\n')
+    subscriber.buffer = lines.pop()
+    for line in lines:
+        if line.startswith(b'data: {'):
+            data = json.loads(line[6:])
+            subscriber.events += 1
+            if 'published_at' in data:
+                latencies.append(now - data['published_at'])
+        elif line == b'event: resync':
+            subscriber.resyncs += 1
+
+
+def poll(selector, latencies, timeout, failed=None):
+    """Service ready sockets; subscribers whose connection failed before the stream started go to `failed`."""
+    failed = [] if failed is None else failed
+    for key, mask in selector.select(timeout):
+        handle(key, mask, selector, latencies, time.time(), failed)
+    return failed
+
+
+def get_json(base_url, path):
+    parsed = urllib.parse.urlparse(base_url)
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=30)
+    try:
+        connection.request('GET', path)
+        return json.loads(connection.getresponse().read())
+    finally:
+        connection.close()
+
+
+def publisher_loop(base_url, printers, rate, stop, counts, seed):
+    """Post jobs from random printers to /predict at `rate` per second."""
+    parsed = urllib.parse.urlparse(base_url)
+    rng = random.Random(seed)
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=30)
+    interval = 1.0 / rate
+    next_time = time.perf_counter()
+    while not stop.is_set():
+        job = jittered_job(rng.choice(printers), rng)
+        job['timestamp'] = time.time()
+        try:
+            connection.request('POST', '/predict', json.dumps(job), {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            response.read()
+            counts['sent' if response.status == 200 else 'errors'] += 1
+        except (OSError, http.client.HTTPException):
+            counts['errors'] += 1
+            connection.close()
+            connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=30)
+        next_time += interval
+        time.sleep(max(0.0, next_time - time.perf_counter()))
+    connection.close()
+
+
+def process_usage(pid):
+    """Resident memory (MB) and thread count of a local process, from /proc."""
+    usage = {}
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    usage['rss_mb'] = int(line.split()[1]) / 1024
+                elif line.startswith('Threads:'):
+                    usage['threads'] = int(line.split()[1])
+    except OSError:
+        pass
+    return usage
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='target an already running server instead of starting one')
+    parser.add_argument('--subscribers', type=int, default=5000)
+    parser.add_argument('--printers', type=int, default=500)
+    parser.add_argument('--rate', type=float, default=50.0, help='/predict jobs per second while streaming')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds of publishing')
+    parser.add_argument('--connect-batch', type=int, default=100,
+                        help='connection handshakes kept in flight while ramping up')
+    parser.add_argument('--poll-interval', type=float, default=5.0,
+                        help='dashboard polling interval the push channel replaces, in seconds')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    printers = build_print_farm(args.printers, args.seed)
+    process = None
+    base_url = args.url
+    if base_url is None:
+        process, base_url = start_server('flask', 1, 1)
+        print(f"Started flask server at {base_url}")
+    parsed = urllib.parse.urlparse(base_url)
+
+    selector = selectors.DefaultSelector()
+    subscribers = [Subscriber(printers[i % len(printers)]['printer_id']) for i in range(args.subscribers)]
+    latencies = []
+    stop = threading.Event()
+    counts = {'sent': 0, 'errors': 0}
+    try:
+        # Keep at most --connect-batch handshakes in flight (the listen backlog
+        # is small) and retry connections the server refused or reset
+        start = time.perf_counter()
+        waiting = list(reversed(subscribers))
+        deadline = time.perf_counter() + 300
+        while time.perf_counter() < deadline:
+            pending = sum(1 for s in subscribers if s.sock is not None and not s.connected)
+            for _ in range(min(len(waiting), args.connect_batch - pending)):
+                open_subscriber(parsed.hostname, parsed.port, waiting.pop(), selector)
+            for subscriber in poll(selector, latencies, 0.05):
+                subscriber.sock = None
+                waiting.append(subscriber)
+            if not waiting and all(s.connected for s in subscribers):
+                break
+        ramp = time.perf_counter() - start
+        before = get_json(base_url, '/stream/stats')['stats']
+        print(f"{before['subscribers']} subscribers connected in {ramp:.1f}s")
+        latencies.clear()
+
+        publisher = threading.Thread(target=publisher_loop,
+                                     args=(base_url, printers, args.rate, stop, counts, args.seed))
+        publisher.start()
+        end = time.perf_counter() + args.duration
+        while time.perf_counter() < end:
+            poll(selector, latencies, 0.2)
+        stop.set()
+        publisher.join()
+        drain = time.perf_counter() + 2.0
+        while time.perf_counter() < drain:
+            poll(selector, latencies, 0.2)
+
+        after = get_json(base_url, '/stream/stats')['stats']
+        usage = process_usage(process.pid) if process is not None else {}
+    finally:
+        stop.set()
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+        if process is not None:
+            process.terminate()
+            process.wait(10)
+
+    delivered = after['delivered'] - before['delivered']
+    lat = np.array(latencies) * 1000.0
+    result = {
+        'subscribers': before['subscribers'],
+        'connect_seconds': ramp,
+        'jobs_posted': counts['sent'],
+        'job_errors': counts['errors'],
+        'events_published': after['published'] - before['published'],
+        'events_queued': delivered,
+        'events_received': len(latencies),
+        'events_dropped': after['dropped'] - before['dropped'],
+        'resyncs': sum(s.resyncs for s in subscribers),
+        'push_events_per_second': len(latencies) / args.duration,
+        'polling_requests_per_second': args.subscribers * 2 / args.poll_interval,
+        **usage,
+    }
+    if len(lat):
+        p50, p95, p99 = np.percentile(lat, [50, 95, 99])
+        result.update(latency_p50_ms=float(p50), latency_p95_ms=float(p95), latency_p99_ms=float(p99),
+                      latency_max_ms=float(lat.max()))
+
+    print(f"posted {result['jobs_posted']} jobs ({result['job_errors']} errors) -> "
+          f"{result['events_published']} events, {result['events_queued']} queued, "
+          f"{result['events_received']} received, {result['events_dropped']} dropped "
+          f"({result['resyncs']} resyncs)")
+    if len(lat):
+        print(f"delivery latency p50={result['latency_p50_ms']:.1f}ms p95={result['latency_p95_ms']:.1f}ms "
+              f"p99={result['latency_p99_ms']:.1f}ms max={result['latency_max_ms']:.1f}ms")
+    if usage:
+        print(f"server: {usage.get('rss_mb', 0):.0f}MB resident, {usage.get('threads', 0)} threads")
+    print(f"push: {result['push_events_per_second']:.0f} events/s to {result['subscribers']} dashboards; "
+          f"polling alerts + health every {args.poll_interval:g}s would be "
+          f"{result['polling_requests_per_second']:.0f} req/s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'result': result}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
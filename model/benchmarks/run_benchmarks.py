@@ -0,0 +1,293 @@
+"""Benchmark suite for the Python backend with baseline regression tracking.
+
+Usage:
+    python benchmarks/run_benchmarks.py                     # run and compare to baseline.json
+    python benchmarks/run_benchmarks.py --update-baseline   # store this run as the baseline
+    python benchmarks/run_benchmarks.py --filter predict --threshold 0.5
+
+Each benchmark is timed `repeat` times (more while the runs add up to less
+than MIN_TIME seconds) and the fastest run, which is the least affected by
+scheduler and neighbour noise, is compared with the baseline's. The run
+fails (exit code 1) if any benchmark is slower than baseline * (1 +
+threshold), where the threshold is set per benchmark unless --threshold
+overrides it. Baselines are machine specific and not kept in the
+repository: record one on the benchmark host with --update-baseline. The
+comparison warns when the host differs from the one that recorded it.
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import re
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), '..', 'src')
+DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'data.csv')
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+sys.path.insert(0, SRC_DIR)
+
+BENCHMARKS = {}
+
+
+# Allowed slowdown of the min-of-N time as a fraction of the baseline
+DEFAULT_THRESHOLD = 0.25
+
+# Seconds of timed runs per benchmark at least, so a brief stall on the
+# host cannot slow every sample
+MIN_TIME = 2.0
+
+# Environment fields that must match for a baseline to be comparable
+HOST_FIELDS = ('python', 'platform', 'processor', 'cpu_count')
+
+
+def benchmark(name, repeat=15, threshold=DEFAULT_THRESHOLD):
+    """Register a benchmark.
+
+    The decorated function does any setup and returns (func, items): `func`
+    is the timed callable and `items` the number of units it processes,
+    used to report throughput. `threshold` is the allowed slowdown for this
+    benchmark; those dominated by allocation, per-call sklearn dispatch or
+    Flask overhead get a looser one because their min-of-N still moves
+    with the host.
+    """
+    def decorator(setup):
+        BENCHMARKS[name] = (setup, repeat, threshold)
+        return setup
+    return decorator
+
+
+def sample_jobs(n, seed=0):
+    """Realistic /predict payloads drawn from the bundled dataset."""
+    df = pd.read_csv(DATA_PATH).drop(columns=['maintenance_needed'])
+    df = df.sample(n=n, replace=n > len(df), random_state=seed).reset_index(drop=True)
+    df['nozzle_diameter'] = 0.4
+    df['print_time'] = 2.0
+    return df.to_dict(orient='records')
+
+
+def seed_everything(seed=42):
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+@benchmark('rules_scalar')
+def bench_rules_scalar():
+    from maintenance_rules import MATERIAL_PROPERTIES, analyze_thermal_stress, calculate_wear_factor, generate_alerts
+
+    job = sample_jobs(1)[0]
+
+    def run():
+        for _ in range(1000):
+            calculate_wear_factor(job)
+            analyze_thermal_stress(job, MATERIAL_PROPERTIES[job['material']])
+            generate_alerts(job)
+    return run, 1000
+
+
+@benchmark('rules_batch_1000', threshold=0.5)
+def bench_rules_batch():
+    import api
+
+    jobs = sample_jobs(1000)
+
+    def run():
+        # Rules only: take the model out of score_jobs for the duration
+        saved, api.model = api.model, None
+        try:
+            api.score_jobs(jobs)
+        finally:
+            api.model = saved
+    return run, len(jobs)
+
+
+@benchmark('generate_synthetic_data_2000', repeat=5, threshold=0.5)
+def bench_generate_synthetic_data():
+    from train_model import generate_synthetic_data
+
+    def run():
+        seed_everything()
+        generate_synthetic_data(2000)
+    return run, 2000
+
+
+@benchmark('train_gradient_boosting_2000', repeat=5, threshold=0.5)
+def bench_training():
+    from train_model import build_model, generate_synthetic_data
+
+    seed_everything()
+    df = generate_synthetic_data(2000)
+    X = df.drop(['maintenance_needed', 'health_score'], axis=1)
+    y = df['maintenance_needed']
+
+    def run():
+        build_model(X, n_estimators=50, max_depth=5).fit(X, y)
+    return run, len(X)
+
+
+@benchmark('model_inference_single', threshold=0.5)
+def bench_model_single():
+    import api
+
+    frame = pd.DataFrame(sample_jobs(1))[list(api.model.feature_names_in_)]
+
+    def run():
+        for _ in range(50):
+            api.model.predict_proba(frame)
+    return run, 50
+
+
+@benchmark('model_inference_batch_1000')
+def bench_model_batch():
+    import api
+
+    frame = pd.DataFrame(sample_jobs(1000))[list(api.model.feature_names_in_)]
+
+    def run():
+        api.model.predict_proba(frame)
+    return run, len(frame)
+
+
+@benchmark('predict_endpoint', threshold=0.5)
+def bench_predict_endpoint():
+    import api
+
+    api.rate_limiter = None
+    client = api.app.test_client()
+    jobs = sample_jobs(100)
+
+    def run():
+        for job in jobs:
+            response = client.post('/predict', json=job)
+            assert response.status_code == 200
+    return run, len(jobs)
+
+
+@benchmark('predict_batch_endpoint_100', threshold=0.5)
+def bench_predict_batch_endpoint():
+    import api
+
+    api.rate_limiter = None
+    client = api.app.test_client()
+    payload = {'jobs': sample_jobs(100)}
+
+    def run():
+        response = client.post('/predict/batch', json=payload)
+        assert response.status_code == 200
+    return run, len(payload['jobs'])
+
+
+def run_benchmarks(pattern=None):
+    results = {}
+    for name, (setup, repeat, threshold) in BENCHMARKS.items():
+        if pattern and not re.search(pattern, name):
+            continue
+        func, items = setup()
+        func()  # warm up
+        timings = []
+        # Short benchmarks keep repeating so their samples span MIN_TIME
+        while len(timings) < repeat or sum(timings) < MIN_TIME:
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        median = statistics.median(timings)
+        fastest = min(timings)
+        results[name] = {
+            'median_s': median,
+            'min_s': fastest,
+            'repeat': len(timings),
+            'threshold': threshold,
+            'items': items,
+            'items_per_s': items / fastest if fastest else None,
+        }
+        print(f"{name:<32} min={fastest * 1000:10.3f}ms median={median * 1000:10.3f}ms "
+              f"{items / fastest:12.1f} items/s")
+    return results
+
+
+def compare(results, baseline, threshold=None):
+    """Return the benchmarks whose min-of-N is slower than baseline * (1 + threshold).
+
+    `threshold` overrides the per-benchmark thresholds when given.
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get('results', {}).get(name)
+        if reference is None:
+            print(f"{name:<32} no baseline")
+            continue
+        allowed = result['threshold'] if threshold is None else threshold
+        ratio = result['min_s'] / reference['min_s']
+        status = 'REGRESSION' if ratio > 1 + allowed else 'ok'
+        print(f"{name:<32} {ratio:6.2f}x baseline (limit {1 + allowed:.2f}x)  {status}")
+        if status != 'ok':
+            regressions.append((name, ratio))
+    return regressions
+
+
+def environment():
+    import sklearn
+
+    return {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'scikit-learn': sklearn.__version__,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--filter', help='regex selecting benchmarks by name')
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(__file__), 'results.json'))
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--threshold', type=float,
+                        default=float(os.environ['BENCH_THRESHOLD']) if 'BENCH_THRESHOLD' in os.environ else None,
+                        help='allowed slowdown for every benchmark, overriding the per-benchmark thresholds')
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    report = {'environment': environment(), 'results': run_benchmarks(args.filter)}
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to: {args.output}")
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    recorded = baseline.get('environment', {})
+    differences = [field for field in HOST_FIELDS if recorded.get(field) != report['environment'][field]]
+    if differences:
+        print(f"Warning: baseline was recorded on a different host ({', '.join(differences)} differ); "
+              f"run with --update-baseline on this host")
+    regressions = compare(report['results'], baseline, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed beyond their threshold")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
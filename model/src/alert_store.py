@@ -0,0 +1,289 @@
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+ALERT_STATUSES = ('open', 'acknowledged', 'snoozed')
+
+# Fields of an alert dict kept as record attributes; everything else
+# (maintenance_items, due_date, value, score, ...) goes into details. An alert
+# is identified by printer, component, type and its message with the numbers
+# masked, so "due in 6.9 days" and "due in 6.8 days" are the same alert; the
+# message, priority and details are taken from the latest occurrence
+_IDENTITY_FIELDS = ('type', 'message', 'component', 'priority')
+
+_NUMBER = re.compile(r'[-+]?\d+(?:\.\d+)?')
+
+
+def message_identity(message):
+    """An alert message with its numbers masked."""
+    return _NUMBER.sub('#', message) if isinstance(message, str) else message
+
+
+class AlertRecord:
+    """One rolled-up alert: every occurrence of the same alert within the dedup window."""
+
+    __slots__ = ('id', 'printer_id', 'component', 'type', 'message', 'priority', 'details',
+                 'count', 'first_seen', 'last_seen', 'status', 'acknowledged_at', 'snoozed_until')
+
+    def __init__(self, alert_id, printer_id, alert, now):
+        self.id = alert_id
+        self.printer_id = printer_id
+        self.component = alert.get('component')
+        self.type = alert.get('type')
+        self.message = alert.get('message')
+        self.priority = alert.get('priority')
+        self.details = {k: v for k, v in alert.items() if k not in _IDENTITY_FIELDS}
+        self.count = 1
+        self.first_seen = now
+        self.last_seen = now
+        self.status = 'open'
+        self.acknowledged_at = None
+        self.snoozed_until = None
+
+    def key(self):
+        return (self.printer_id, self.component, self.type, message_identity(self.message))
+
+    def current_status(self, now):
+        if self.snoozed_until is not None and self.snoozed_until > now:
+            return 'snoozed'
+        return self.status
+
+    def to_dict(self, now):
+        return {
+            'id': self.id,
+            'printer_id': self.printer_id,
+            'type': self.type,
+            'message': self.message,
+            'component': self.component,
+            'priority': self.priority,
+            **self.details,
+            'count': self.count,
+            'first_seen': self.first_seen,
+            'last_seen': self.last_seen,
+            'status': self.current_status(now),
+            'acknowledged_at': self.acknowledged_at,
+            'snoozed_until': self.snoozed_until,
+        }
+
+
+class AlertStore:
+    """Server-side alert history with deduplication, rollups and ack/snooze state.
+
+    A hash index on (printer, component, alert type, message with numbers
+    masked) points at the latest rollup record for that alert, so a repeat
+    within `dedup_window` seconds only bumps its count and last_seen and
+    takes the repeat's message. Records get increasing ids
+    and each printer keeps a sorted array of its ids, so inserts are O(1)
+    and a page of results costs O(limit) (O(log n) to find a cursor within
+    one printer), however long the history grows. Once more than
+    `max_records` are held the oldest are dropped.
+    """
+
+    def __init__(self, dedup_window=3600.0, max_records=5_000_000, max_scan=2000):
+        self.dedup_window = dedup_window
+        self.max_records = max_records
+        self.max_scan = max_scan
+        self._records = []
+        self._offset = 0  # id of self._records[0]
+        self._latest = {}
+        self._by_printer = {}
+        self._lock = threading.Lock()
+        self.occurrences = 0
+
+    def __len__(self):
+        return len(self._records)
+
+    @staticmethod
+    def index_key(printer_id, alert):
+        return (printer_id, alert.get('component'), alert.get('type'), message_identity(alert.get('message')))
+
+    def ingest(self, printer_id, alerts, now=None, opened=None):
+        """Store a batch of alert dicts for a printer; returns the affected records.
+
+        If `opened` is a list, the records this call created are appended to it.
+        """
+        now = time.time() if now is None else float(now)
+        records = []
+        with self._lock:
+            for alert in alerts:
+                record, created = self._ingest_one(printer_id, alert, now)
+                if created and opened is not None:
+                    opened.append(record)
+                records.append(record)
+            self._trim()
+        return records
+
+    def _ingest_one(self, printer_id, alert, now):
+        self.occurrences += 1
+        key = self.index_key(printer_id, alert)
+        record = self._get(self._latest.get(key))
+        if record is not None and now - record.last_seen <= self.dedup_window:
+            record.count += 1
+            if now >= record.last_seen:
+                record.last_seen = now
+                record.message = alert.get('message')
+                record.priority = alert.get('priority')
+                record.details.update((k, v) for k, v in alert.items() if k not in _IDENTITY_FIELDS)
+            return record, False
+
+        record = AlertRecord(self._offset + len(self._records), printer_id, alert, now)
+        self._records.append(record)
+        self._latest[key] = record.id
+        ids = self._by_printer.get(printer_id)
+        if ids is None:
+            ids = self._by_printer[printer_id] = array('q')
+        ids.append(record.id)
+        return record, True
+
+    def _get(self, alert_id):
+        if alert_id is None or alert_id < self._offset:
+            return None
+        position = alert_id - self._offset
+        return self._records[position] if position < len(self._records) else None
+
+    def _trim(self):
+        # Drop in chunks so the cost is amortized over many inserts
+        excess = len(self._records) - self.max_records
+        if excess <= max(1, self.max_records // 10):
+            return
+        for record in self._records[:excess]:
+            if record is not None and self._latest.get(record.key()) == record.id:
+                del self._latest[record.key()]
+        del self._records[:excess]
+        self._offset += excess
+        for printer_id in list(self._by_printer):
+            ids = self._by_printer[printer_id]
+            cut = bisect_left(ids, self._offset)
+            if cut == len(ids):
+                del self._by_printer[printer_id]
+            elif cut:
+                del ids[:cut]
+
+    def printer_ids(self):
+        with self._lock:
+            return list(self._by_printer)
+
+    def export_printer(self, printer_id):
+        """A printer's alert records, oldest first (for moving it to another process)."""
+        with self._lock:
+            records = [self._get(alert_id) for alert_id in self._by_printer.get(printer_id, ())]
+            return [
+                {field: getattr(record, field) for field in AlertRecord.__slots__ if field != 'printer_id'}
+                for record in records if record is not None
+            ]
+
+    def import_printer(self, printer_id, records):
+        """Append records from export_printer under new ids, keeping their counts and ack/snooze state.
+
+        Returns (exported id, new id) pairs so callers can redirect old ids.
+        """
+        renamed = []
+        with self._lock:
+            for state in records:
+                alert = {field: state[field] for field in ('component', 'type', 'message', 'priority')}
+                record = AlertRecord(self._offset + len(self._records), printer_id, alert, state['first_seen'])
+                for field, value in state.items():
+                    if field != 'id':
+                        setattr(record, field, value)
+                if state.get('id') is not None:
+                    renamed.append((state['id'], record.id))
+                self._records.append(record)
+                self._latest[record.key()] = record.id
+                ids = self._by_printer.get(printer_id)
+                if ids is None:
+                    ids = self._by_printer[printer_id] = array('q')
+                ids.append(record.id)
+            self._trim()
+        return renamed
+
+    def drop_printer(self, printer_id):
+        """Forget a printer's alerts; their ids are left unused."""
+        with self._lock:
+            ids = self._by_printer.pop(printer_id, None)
+            if ids is None:
+                return False
+            for alert_id in ids:
+                record = self._get(alert_id)
+                if record is None:
+                    continue
+                if self._latest.get(record.key()) == record.id:
+                    del self._latest[record.key()]
+                self._records[alert_id - self._offset] = None
+            return True
+
+    def get(self, alert_id, now=None):
+        now = time.time() if now is None else float(now)
+        with self._lock:
+            record = self._get(alert_id)
+            return record.to_dict(now) if record is not None else None
+
+    def acknowledge(self, alert_id, now=None):
+        """Acknowledge an alert; returns the updated alert dict or None if unknown."""
+        now = time.time() if now is None else float(now)
+        with self._lock:
+            record = self._get(alert_id)
+            if record is None:
+                return None
+            record.status = 'acknowledged'
+            record.acknowledged_at = now
+            record.snoozed_until = None
+            return record.to_dict(now)
+
+    def snooze(self, alert_id, seconds, now=None):
+        """Hide an alert from open queries for `seconds`; repeats are still counted."""
+        now = time.time() if now is None else float(now)
+        with self._lock:
+            record = self._get(alert_id)
+            if record is None:
+                return None
+            record.snoozed_until = now + seconds
+            return record.to_dict(now)
+
+    def open_alerts(self, now=None, max_age=None):
+        """Latest record of every distinct alert that is neither acknowledged nor snoozed.
+
+        Only the dedup index is walked, so the cost follows the number of
+        distinct alerts rather than the length of the history. Records last
+        seen more than `max_age` seconds ago are left out.
+        """
+        now = time.time() if now is None else float(now)
+        oldest = None if max_age is None else now - max_age
+        with self._lock:
+            records = [self._get(alert_id) for alert_id in self._latest.values()]
+        return [
+            record for record in records
+            if record is not None and record.current_status(now) == 'open'
+            and (oldest is None or record.last_seen >= oldest)
+        ]
+
+    def query(self, printer_id=None, status=None, cursor=None, limit=50, now=None):
+        """Page through alerts newest first.
+
+        Pass the returned `next_cursor` back as `cursor` for the next page.
+        With a status filter at most `max_scan` records are examined per
+        call; the page may then be short but `next_cursor` still advances.
+        """
+        now = time.time() if now is None else float(now)
+        items = []
+        with self._lock:
+            if printer_id is None:
+                ids = range(self._offset, self._offset + len(self._records))
+            else:
+                ids = self._by_printer.get(printer_id, array('q'))
+            position = len(ids) if cursor is None else bisect_left(ids, int(cursor))
+
+            scanned = 0
+            while position > 0 and len(items) < limit and scanned < self.max_scan:
+                position -= 1
+                scanned += 1
+                record = self._get(ids[position])
+                if record is None:
+                    continue
+                if status is not None and record.current_status(now) != status:
+                    continue
+                items.append(record.to_dict(now))
+
+            next_cursor = ids[position] if position > 0 else None
+        return {'items': items, 'next_cursor': next_cursor}
@@ -0,0 +1,278 @@
+import math
+import threading
+
+import numpy as np
+
+# Telemetry fields (as sent by the dashboard, see PrinterMetrics) that are
+# monitored, with the component and label used in alerts. Temperatures are
+# monitored as tracking error against their target when one is reported.
+TELEMETRY_METRICS = {
+    'extruderTemp': ('Temperature Control', 'extruder temperature', 'extruderTargetTemp'),
+    'bedTemp': ('Bed', 'bed temperature', 'bedTargetTemp'),
+    'motorVibrationX': ('Mechanical', 'X motor vibration', None),
+    'motorVibrationY': ('Mechanical', 'Y motor vibration', None),
+    'motorVibrationZ': ('Mechanical', 'Z motor vibration', None),
+    'filamentFlowRate': ('Extruder', 'filament flow rate', None),
+    'powerConsumption': ('Power', 'power consumption', None),
+}
+METRIC_NAMES = tuple(TELEMETRY_METRICS)
+
+TELEMETRY_MAINTENANCE_ITEMS = {
+    'Temperature Control': [
+        "Verify temperature sensor calibration",
+        "Check thermistor wiring and connector",
+        "Inspect heater cartridge and heat break"
+    ],
+    'Bed': [
+        "Verify bed thermal sensor",
+        "Check bed heating elements"
+    ],
+    'Mechanical': [
+        "Check belt tension",
+        "Inspect bearings for wear",
+        "Lubricate linear rails"
+    ],
+    'Extruder': [
+        "Check extruder gear for wear",
+        "Check for partial nozzle clog"
+    ],
+    'Power': [
+        "Inspect power supply and connectors",
+        "Check heater and motor current draw"
+    ],
+}
+
+SPIKE = 1
+DRIFT_UP = 2
+DRIFT_DOWN = 3
+
+
+def telemetry_values(sample):
+    """Yield (metric, value) for every monitored field present in a telemetry sample.
+
+    Raises ValueError for NaN or infinite values, which would stay in the
+    stream's baseline for good.
+    """
+    for metric, (_, _, target_field) in TELEMETRY_METRICS.items():
+        value = sample.get(metric)
+        if value is None:
+            continue
+        if target_field is not None and sample.get(target_field) is not None:
+            value = value - sample[target_field]
+        value = float(value)
+        if not math.isfinite(value):
+            raise ValueError(f"{metric} must be a finite number")
+        yield metric, value
+
+
+class StreamingDetector:
+    """Constant-memory anomaly and change-point detection over many telemetry streams.
+
+    Each (printer, metric) stream keeps a handful of floats: a slowly
+    adapting robust baseline (Huber-clipped exponentially weighted mean and
+    scale), giving a robust z-score per sample, and a two-sided CUSUM on
+    that z-score. A single large z-score is reported as a sudden change
+    (e.g. a heater fault); the CUSUM crossing its limit is reported as a
+    drift (e.g. a thermistor slowly going off). Micro-batches are processed
+    vectorized across streams, one round per repeated stream.
+    """
+
+    def __init__(self, alpha=0.01, spike_z=6.0, cusum_k=0.5, cusum_h=12.0,
+                 warmup=30, cooldown=120, initial_capacity=1024):
+        self.alpha = alpha
+        self.spike_z = spike_z
+        self.cusum_k = cusum_k
+        self.cusum_h = cusum_h
+        self.warmup = warmup
+        self.cooldown = cooldown
+        self._index = {}
+        self._keys = []
+        self._free = []  # indexes of dropped streams, reused before growing
+        self._lock = threading.Lock()
+        # Per-stream state: count, mean, scale, cusum high, cusum low, samples since last alarm
+        self._state = np.zeros((6, initial_capacity))
+
+    def __len__(self):
+        return len(self._index)
+
+    def stream_index(self, printer_id, metric):
+        key = (printer_id, metric)
+        index = self._index.get(key)
+        if index is not None:
+            return index
+        with self._lock:
+            index = self._index.get(key)
+            if index is None:
+                if self._free:
+                    index = self._free.pop()
+                    self._keys[index] = key
+                else:
+                    index = len(self._keys)
+                    if index == self._state.shape[1]:
+                        state = np.zeros((6, index * 2))
+                        state[:, :index] = self._state
+                        self._state = state
+                    self._keys.append(key)
+                self._index[key] = index
+        return index
+
+    def stream_key(self, index):
+        return self._keys[index]
+
+    def printer_ids(self):
+        with self._lock:
+            return list({printer_id for printer_id, _ in self._index})
+
+    def export_printer(self, printer_id):
+        """Detector state of a printer's streams, by metric (for moving it to another process)."""
+        with self._lock:
+            return {
+                metric: self._state[:, self._index[(printer_id, metric)]].tolist()
+                for metric in METRIC_NAMES if (printer_id, metric) in self._index
+            }
+
+    def import_printer(self, printer_id, state):
+        """Restore a printer's streams from export_printer, replacing any existing state."""
+        for metric, values in state.items():
+            index = self.stream_index(printer_id, metric)
+            with self._lock:
+                self._state[:, index] = values
+
+    def drop_printer(self, printer_id):
+        """Forget a printer's streams; their indexes are reused, so others never move."""
+        with self._lock:
+            dropped = [self._index.pop((printer_id, metric)) for metric in METRIC_NAMES
+                       if (printer_id, metric) in self._index]
+            for index in dropped:
+                self._keys[index] = None
+                self._state[:, index] = 0.0
+                self._free.append(index)
+            return bool(dropped)
+
+    def process(self, streams, values):
+        """Feed a micro-batch of (stream index, value) pairs, in arrival order.
+
+        Returns an array of detections with one row per alarm:
+        (position in the batch, stream index, kind, z-score).
+        """
+        streams = np.asarray(streams, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        if not len(streams):
+            return np.empty((0, 4))
+        if not np.isfinite(values).all():
+            raise ValueError("Telemetry values must be finite numbers")
+
+        # Rank of each event among the events of its stream in this batch
+        order = np.argsort(streams, kind='stable')
+        sorted_streams = streams[order]
+        starts = np.flatnonzero(np.r_[True, sorted_streams[1:] != sorted_streams[:-1]])
+        lengths = np.diff(np.r_[starts, len(order)])
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order)) - np.repeat(starts, lengths)
+
+        detections = []
+        with self._lock:
+            by_rank = np.argsort(rank, kind='stable')
+            bounds = np.searchsorted(rank[by_rank], np.arange(rank.max() + 2))
+            for r in range(rank.max() + 1):
+                positions = by_rank[bounds[r]:bounds[r + 1]]
+                found = self._step(streams[positions], values[positions])
+                if found is not None:
+                    mask, kind, z = found
+                    detections.append(np.column_stack([
+                        positions[mask], streams[positions][mask], kind[mask], z[mask]
+                    ]))
+        if not detections:
+            return np.empty((0, 4))
+        result = np.concatenate(detections)
+        return result[np.argsort(result[:, 0], kind='stable')]
+
+    def _step(self, idx, x):
+        count, mean, scale, high, low, since = self._state[:, idx]
+
+        first = count == 0
+        mean = np.where(first, x, mean)
+        scale = np.where(first, np.maximum(np.abs(x) * 0.01, 1e-3), scale)
+        since = np.where(first, self.cooldown, since)
+        count = count + 1
+        since = since + 1
+
+        z = (x - mean) / scale
+        warm = count > self.warmup
+        clipped = np.where(warm, np.clip(z, -3.0, 3.0), z)
+
+        high = np.where(warm, np.maximum(0.0, high + clipped - self.cusum_k), 0.0)
+        low = np.where(warm, np.maximum(0.0, low - clipped - self.cusum_k), 0.0)
+
+        ready = warm & (since > self.cooldown)
+        spike = ready & (np.abs(z) > self.spike_z)
+        drift_up = ready & ~spike & (high > self.cusum_h)
+        drift_down = ready & ~spike & ~drift_up & (low > self.cusum_h)
+        alarm = spike | drift_up | drift_down
+
+        # Learn fast during warm-up, slowly afterwards; outliers only move the
+        # baseline by their clipped amount
+        rate = np.where(warm, self.alpha, 1.0 / count)
+        mean = mean + rate * clipped * scale
+        scale = np.sqrt((1 - rate) * scale ** 2 + rate * (clipped * scale) ** 2)
+        scale = np.maximum(scale, 1e-3)
+
+        # After a drift alarm, restart the change detector from the new level;
+        # a spike is treated as a one-off and leaves the baseline alone
+        mean = np.where(drift_up | drift_down, x, mean)
+        high = np.where(alarm, 0.0, high)
+        low = np.where(alarm, 0.0, low)
+        since = np.where(alarm, 0.0, since)
+
+        self._state[:, idx] = count, mean, scale, high, low, since
+
+        if not alarm.any():
+            return None
+        kind = np.select([spike, drift_up, drift_down], [SPIKE, DRIFT_UP, DRIFT_DOWN], 0)
+        return alarm, kind, z
+
+
+def detection_alert(metric, kind, z_score, value, timestamp=None):
+    """Format one detection as an alert in the generate_alerts format."""
+    component, label, _ = TELEMETRY_METRICS[metric]
+    if kind == SPIKE:
+        alert = {
+            'type': 'critical',
+            'message': f'Sudden change in {label}',
+            'component': component,
+            'priority': 'critical'
+        }
+    else:
+        direction = 'upward' if kind == DRIFT_UP else 'downward'
+        alert = {
+            'type': 'warning',
+            'message': f'{label.capitalize()} drifting {direction}',
+            'component': component,
+            'priority': 'high'
+        }
+    alert.update({
+        'maintenance_items': TELEMETRY_MAINTENANCE_ITEMS[component],
+        'metric': metric,
+        'value': float(value),
+        'score': float(z_score),
+        'timestamp': timestamp
+    })
+    return alert
+
+
+def process_telemetry(detector, printer_id, samples):
+    """Run a printer's telemetry samples through the detector and return alerts."""
+    streams, values, origins = [], [], []
+    for position, sample in enumerate(samples):
+        for metric, value in telemetry_values(sample):
+            streams.append(detector.stream_index(printer_id, metric))
+            values.append(value)
+            origins.append(position)
+
+    alerts = []
+    for position, stream, kind, z_score in detector.process(streams, values):
+        position = int(position)
+        _, metric = detector.stream_key(int(stream))
+        alerts.append(detection_alert(metric, int(kind), z_score, values[position],
+                                      samples[origins[position]].get('timestamp')))
+    return alerts
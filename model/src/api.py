@@ -1,16 +1,31 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
+from functools import wraps
+from werkzeug.middleware.proxy_fix import ProxyFix
+import math
 import os
-import joblib
-import numpy as pd
+import time
+import pandas as pd
 import numpy as np
 import logging
 import traceback
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
 from maintenance_rules import generate_alerts, calculate_wear_factor, analyze_thermal_stress, MATERIAL_PROPERTIES
+from config import Config
+from shadow import ShadowEvaluator
+from rate_limiter import TokenBucketLimiter, create_storage
+from profiling import init_profiling
+from forecasting import COMPONENTS, ComponentForecaster, component_forecast, forecast_alerts
+from anomaly import METRIC_NAMES, StreamingDetector, process_telemetry
+from alert_store import ALERT_STATUSES, AlertStore
+from scheduler import maintenance_plan
+from compact_model import explainer_for, known_categories, load_artifact
+from dataset_cache import file_sha256
+from response_surface import ResponseSurface
+from push import HEARTBEAT, PushHub, health_snapshot
+from drift import DriftMonitor, DriftSketch
+from telemetry_store import TelemetryStore
 
 # Configure logging
 logging.basicConfig(
@@ -20,12 +35,181 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-limiter = Limiter(
-    app=app,
-    key_func=get_remote_address,
-    default_limits=["200 per day", "50 per hour"]
-)
+app.config.from_object(Config)
 CORS(app, resources={r"/*": {"origins": "*"}})
+if app.config['TRUSTED_PROXY_HOPS']:
+    # Behind the shard router (or another proxy) take the client address from X-Forwarded-For
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXY_HOPS'])
+init_profiling(app)
+
+rate_limiter = None
+if app.config['RATE_LIMIT_ENABLED']:
+    rate_limiter = TokenBucketLimiter(
+        create_storage(app.config['RATE_LIMIT_STORAGE']),
+        capacity=app.config['RATE_LIMIT_CAPACITY'],
+        refill_rate=app.config['RATE_LIMIT_REFILL_RATE'],
+        overrides=app.config['RATE_LIMIT_OVERRIDES'],
+        printer_limit=(app.config['RATE_LIMIT_PRINTER_CAPACITY'], app.config['RATE_LIMIT_PRINTER_REFILL_RATE'])
+    )
+
+def resolve_model_path(path):
+    """Resolve a model path relative to the model directory."""
+    if os.path.isabs(path):
+        return path
+    return os.path.join(os.path.dirname(__file__), '..', path)
+
+def load_model(path):
+    """Load a model (pickled pipeline or compact .npz export), returning None if it is missing or unreadable."""
+    path = resolve_model_path(path)
+    logger.info(f"Looking for model at: {path}")
+    if not os.path.exists(path):
+        logger.warning(f"Model file not found at {path}")
+        return None
+    try:
+        loaded = load_artifact(path)
+        logger.info("Model loaded successfully")
+        return loaded
+    except Exception as e:
+        logger.error(f"Error loading model: {str(e)}")
+        logger.error(traceback.format_exc())
+        return None
+
+model = load_model(app.config['MODEL_PATH'])
+# Path attributions for explain=true; a pickled pipeline is converted once at startup
+explainer = explainer_for(model) if model is not None else None
+# Jobs with a level the model never saw (e.g. the gyroid infill pattern) get
+# the rule-based scores only
+model_categories = known_categories(model) if model is not None else {}
+shadow = None
+
+def load_response_surface(path):
+    """Load the precomputed response surface for PREDICTION_MODE=surface, or None.
+
+    The surface must have been built from the model file at MODEL_PATH and
+    be within RESPONSE_SURFACE_MAX_ERROR.
+    """
+    path = resolve_model_path(path)
+    if not os.path.exists(path):
+        logger.warning("Response surface not found at %s; scoring exactly", path)
+        return None
+    try:
+        surface = ResponseSurface.load(path)
+        surface.check(file_sha256(resolve_model_path(app.config['MODEL_PATH'])),
+                      app.config['RESPONSE_SURFACE_MAX_ERROR'])
+    except Exception as e:
+        logger.error("Error loading response surface: %s; scoring exactly", str(e))
+        return None
+    logger.info("Serving predictions from response surface (max error %s)", surface.max_error)
+    return surface
+
+response_surface = None
+if app.config['PREDICTION_MODE'] == 'surface':
+    response_surface = load_response_surface(app.config['RESPONSE_SURFACE_PATH'])
+
+def load_drift_monitor(path):
+    """Start input drift monitoring against the model's reference sketch, or return None without one."""
+    path = resolve_model_path(path)
+    if not os.path.exists(path):
+        logger.warning("Drift reference not found at %s; drift monitoring disabled", path)
+        return None
+    try:
+        reference = DriftSketch.load(path)
+    except Exception as e:
+        logger.error("Error loading drift reference: %s", str(e))
+        return None
+    return DriftMonitor(
+        reference,
+        window_seconds=app.config['DRIFT_WINDOW_SECONDS'],
+        queue_size=app.config['DRIFT_QUEUE_SIZE'],
+        min_samples=app.config['DRIFT_MIN_SAMPLES']
+    )
+
+drift_monitor = load_drift_monitor(app.config['DRIFT_REFERENCE_PATH'])
+
+def configure_shadow(candidate_path):
+    """Start (or stop, when candidate_path is None) shadow evaluation of a candidate model."""
+    global shadow
+    if shadow is not None:
+        shadow.stop()
+        shadow = None
+    if not candidate_path or model is None:
+        return None
+    candidate_path = resolve_model_path(candidate_path)
+    if not os.path.exists(candidate_path):
+        logger.warning(f"Shadow model file not found at {candidate_path}")
+        return None
+    shadow = ShadowEvaluator(
+        candidate_path,
+        model.feature_names_in_,
+        workers=app.config['SHADOW_WORKERS'],
+        queue_size=app.config['SHADOW_QUEUE_SIZE'],
+        batch_size=app.config['SHADOW_BATCH_SIZE'],
+        linger=app.config['SHADOW_BATCH_LINGER'],
+        buffer_size=app.config['SHADOW_BUFFER_SIZE']
+    )
+    logger.info("Shadow evaluation enabled with candidate model %s", candidate_path)
+    return shadow
+
+configure_shadow(app.config['SHADOW_MODEL_PATH'])
+
+forecaster = ComponentForecaster(forgetting=app.config['FORECAST_FORGETTING'])
+detector = StreamingDetector(
+    spike_z=app.config['ANOMALY_SPIKE_Z'],
+    cusum_h=app.config['ANOMALY_CUSUM_H'],
+    warmup=app.config['ANOMALY_WARMUP'],
+    cooldown=app.config['ANOMALY_COOLDOWN']
+)
+alert_store = AlertStore(
+    dedup_window=app.config['ALERT_DEDUP_WINDOW'],
+    max_records=app.config['ALERT_STORE_MAX_RECORDS']
+)
+telemetry_store = TelemetryStore(
+    retention=app.config['TELEMETRY_RETENTION'],
+    grace=app.config['TELEMETRY_LATE_GRACE']
+)
+telemetry_store.start(app.config['TELEMETRY_COMPACTION_INTERVAL'])
+push_hub = PushHub(
+    queue_size=app.config['PUSH_QUEUE_SIZE'],
+    max_subscribers=app.config['PUSH_MAX_SUBSCRIBERS']
+)
+
+def store_alerts(printer_id, alerts, timestamp=None):
+    """Record alerts in the alert store and push the newly opened ones to stream subscribers."""
+    opened = []
+    alert_store.ingest(printer_id, alerts, timestamp, opened=opened)
+    now = time.time()
+    # Pushed as of the end of this call, so repeats within the call are counted
+    push_hub.publish_alerts(printer_id, [record.to_dict(now) for record in opened])
+
+# Sample timestamps above this are taken to be in milliseconds (1e11 s is year 5138)
+MILLISECOND_TIMESTAMPS = 1e11
+
+def normalize_sample_timestamps(samples, now, max_age=None):
+    """Convert telemetry sample timestamps to seconds in place, accepting milliseconds.
+
+    Returns an error message if a timestamp is not a number or lies outside
+    the accepted range (older than `max_age`, by default the raw telemetry
+    tier's retention, or further ahead than the late-sample grace period),
+    otherwise None.
+    """
+    if max_age is None:
+        max_age = app.config['TELEMETRY_RETENTION']['raw']
+    earliest = now - max_age
+    latest = now + app.config['TELEMETRY_LATE_GRACE']
+    for sample in samples:
+        if sample.get('timestamp') is None:
+            continue
+        try:
+            timestamp = float(sample['timestamp'])
+        except (TypeError, ValueError):
+            return f"timestamp must be a number of seconds, got {sample['timestamp']!r}"
+        if timestamp > MILLISECOND_TIMESTAMPS:
+            timestamp /= 1000.0
+        if not earliest <= timestamp <= latest:
+            return (f"timestamp {sample['timestamp']} is outside the accepted range "
+                    f"({earliest:.0f} to {latest:.0f} seconds since the epoch)")
+        sample['timestamp'] = timestamp
+    return None
 
 def validate_prediction_data(data):
     """Validate the prediction request data."""
@@ -45,9 +229,194 @@ def validate_prediction_data(data):
     if data['material'] not in MATERIAL_PROPERTIES:
         return False, f"Invalid material type: {data['material']}"
 
+    # The router hashes printer IDs as strings; 42 and "42" must not split one printer's state
+    if data.get('printer_id') is not None and not isinstance(data['printer_id'], str):
+        return False, "printer_id must be a string"
+
+    # The job's timestamp dates its wear in the forecaster; milliseconds are converted here
+    error = normalize_sample_timestamps([data], time.time(), app.config['FORECAST_MAX_JOB_AGE'])
+    if error:
+        return False, error
+
     return True, None
 
+def explain_requested(data):
+    """Whether per-feature contributions were asked for, via ?explain=true or "explain": true in the body."""
+    if request.args.get('explain', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return isinstance(data, dict) and data.get('explain') is True
+
+def model_can_score(job):
+    """Whether every categorical field of a job is a level the model was trained on."""
+    return all(str(job.get(column)) in levels for column, levels in model_categories.items())
+
+def score_jobs(jobs, explain=False):
+    """Score validated print jobs with the maintenance rules and, if loaded, the model.
+
+    With `explain`, each result also carries the model's per-feature
+    contributions to its maintenance probability; those jobs are always
+    scored exactly.
+    """
+    if drift_monitor is not None:
+        drift_monitor.submit(jobs)
+
+    # In surface mode, jobs inside the precomputed grid are answered by interpolation
+    approximate, on_surface = None, np.zeros(len(jobs), dtype=bool)
+    if response_surface is not None and not explain:
+        approximate, on_surface = response_surface.lookup(jobs)
+
+    results = []
+    for i, data in enumerate(jobs):
+        if on_surface[i]:
+            wear_factor = float(approximate[i, 0])
+            thermal_stress = float(approximate[i, 1])
+        else:
+            # Calculate wear factor
+            logger.debug("Calculating wear factor...")
+            wear_factor = calculate_wear_factor(data)
+            if isinstance(wear_factor, (np.floating, np.integer)):
+                wear_factor = float(wear_factor)
+            logger.debug("Wear factor calculated: %s", wear_factor)
+
+            # Calculate thermal stress
+            logger.debug("Analyzing thermal stress...")
+            thermal_stress = analyze_thermal_stress(data, MATERIAL_PROPERTIES[data['material']])
+            if isinstance(thermal_stress, (np.floating, np.integer)):
+                thermal_stress = float(thermal_stress)
+            logger.debug("Thermal stress calculated: %s", thermal_stress)
+        
+        # Generate alerts
+        logger.debug("Generating maintenance alerts...")
+        try:
+            alerts = generate_alerts(data)
+            if not isinstance(alerts, list):
+                logger.warning("generate_alerts returned non-list value: %s", alerts)
+                alerts = []
+        except Exception as e:
+            logger.error("Error generating alerts: %s", str(e))
+            alerts = []
+        
+        result = {
+            'status': 'success',
+            'wear_factor': wear_factor if wear_factor is not None else 0.0,
+            'thermal_stress': thermal_stress if thermal_stress is not None else 0.0,
+            'alerts': alerts
+        }
+        if on_surface[i]:
+            result['approximate'] = True
+        results.append(result)
+
+    # Model probability, mirrored to the shadow candidate if one is configured
+    if model is not None:
+        for i in np.flatnonzero(on_surface):
+            results[i]['maintenance_probability'] = float(approximate[i, 2])
+        exact = [i for i in np.flatnonzero(~on_surface) if model_can_score(jobs[i])]
+        if len(exact):
+            start = time.perf_counter()
+            features = [{name: jobs[i][name] for name in model.feature_names_in_} for i in exact]
+            frame = pd.DataFrame(features, columns=model.feature_names_in_)
+            if explain and explainer is not None:
+                probabilities, base_value, contributions = explainer.explain(frame)
+                for i, row_contributions in zip(exact, contributions.tolist()):
+                    results[i]['explanation'] = {
+                        'base_value': base_value,
+                        'output': explainer.explanation_space,
+                        'contributions': dict(zip(explainer.feature_names_in_.tolist(), row_contributions))
+                    }
+            else:
+                probabilities = model.predict_proba(frame)[:, 1]
+            latency_ms = (time.perf_counter() - start) * 1000.0 / len(exact)
+            for i, row, probability in zip(exact, features, probabilities):
+                results[i]['maintenance_probability'] = float(probability)
+                if shadow is not None:
+                    shadow.submit(row, float(probability), latency_ms)
+
+    # Per-component remaining useful life for jobs reported by a known printer;
+    # recorded only once every job has been scored, so a failed request leaves no trace
+    for data, result in zip(jobs, results):
+        if data.get('printer_id') is not None:
+            forecaster.observe(data['printer_id'], data, data.get('timestamp'))
+            forecast = forecaster.forecast_printer(data['printer_id'])
+            result['maintenance_forecast'] = forecast['components']
+            result['alerts'].extend(forecast_alerts(forecast, app.config['FORECAST_ALERT_HORIZON_DAYS']))
+            store_alerts(data['printer_id'], result['alerts'], data.get('timestamp'))
+            push_hub.publish_health(data['printer_id'], health_snapshot(forecast))
+
+    return results
+
+def rate_limit_key():
+    """Identify the caller by a configured API key, otherwise by remote address.
+
+    Keys and printer IDs sent by clients are not trusted on their own:
+    rotating them would give every request a fresh bucket.
+    """
+    api_key = request.headers.get('X-API-Key')
+    if api_key and (api_key in app.config['RATE_LIMIT_API_KEYS'] or f'key:{api_key}' in rate_limiter.overrides):
+        return f'key:{api_key}'
+    return f'ip:{request.remote_addr}'
+
+def printer_costs(data):
+    """Tokens per printer_id a request body asks to score: one per job, or one for a single-printer request."""
+    costs = {}
+    if isinstance(data, dict):
+        jobs = data.get('jobs') if isinstance(data.get('jobs'), list) else [data]
+        if len(jobs) > app.config['MAX_BATCH_SIZE']:
+            return costs
+        for job in jobs:
+            printer_id = job.get('printer_id') if isinstance(job, dict) else None
+            if isinstance(printer_id, str):
+                costs[printer_id] = costs.get(printer_id, 0) + 1
+    return costs
+
+def batch_cost(data):
+    """Batch requests consume one token per job.
+
+    A batch the view will refuse anyway (not a list, or over
+    MAX_BATCH_SIZE) costs one token, so it gets its 400/413 rather than a 429.
+    """
+    if isinstance(data, dict) and isinstance(data.get('jobs'), list):
+        if len(data['jobs']) <= app.config['MAX_BATCH_SIZE']:
+            return max(1, len(data['jobs']))
+    return 1
+
+def rate_limit_response(key, retry_after):
+    logger.warning("Rate limit exceeded for %s", key)
+    response = jsonify({
+        'status': 'error',
+        'error': 'Rate limit exceeded',
+        'retry_after': retry_after
+    })
+    if retry_after is not None:
+        response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response, 429
+
+def rate_limited(cost=None):
+    """Apply the token-bucket limiter to a view; `cost` maps the JSON body to a token count."""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if rate_limiter is None:
+                return view(*args, **kwargs)
+            data = request.get_json(silent=True)
+            key = rate_limit_key()
+            allowed, remaining, retry_after = rate_limiter.consume(key, cost(data) if cost else 1)
+            if not allowed:
+                return rate_limit_response(key, retry_after)
+            # Per-printer quotas, only under an authenticated key: printer IDs
+            # alone are client-chosen and would each get a fresh bucket
+            if key.startswith('key:'):
+                for printer_id, printer_cost in printer_costs(data).items():
+                    printer_key = f'{key}:printer:{printer_id}'
+                    allowed, remaining, retry_after = rate_limiter.consume(
+                        printer_key, printer_cost, rate_limiter.printer_limit)
+                    if not allowed:
+                        return rate_limit_response(printer_key, retry_after)
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
+
 @app.route('/predict', methods=['POST'])
+@rate_limited()
 def predict():
     """Handle 3D printer maintenance prediction requests."""
     try:
@@ -81,39 +450,7 @@ def predict():
             }), 400
 
         try:
-            # Calculate wear factor
-            logger.debug("Calculating wear factor...")
-            wear_factor = calculate_wear_factor(data)
-            if isinstance(wear_factor, (np.floating, np.integer)):
-                wear_factor = float(wear_factor)
-            logger.debug("Wear factor calculated: %s", wear_factor)
-            
-            # Calculate thermal stress
-            logger.debug("Analyzing thermal stress...")
-            thermal_stress = analyze_thermal_stress(data, MATERIAL_PROPERTIES[data['material']])
-            if isinstance(thermal_stress, (np.floating, np.integer)):
-                thermal_stress = float(thermal_stress)
-            logger.debug("Thermal stress calculated: %s", thermal_stress)
-            
-            # Generate alerts
-            logger.debug("Generating maintenance alerts...")
-            try:
-                alerts = generate_alerts(data)
-                if not isinstance(alerts, list):
-                    logger.warning("generate_alerts returned non-list value: %s", alerts)
-                    alerts = []
-            except Exception as e:
-                logger.error("Error generating alerts: %s", str(e))
-                alerts = []
-            
-            # Prepare successful response
-            response = {
-                'status': 'success',
-                'wear_factor': wear_factor if wear_factor is not None else 0.0,
-                'thermal_stress': thermal_stress if thermal_stress is not None else 0.0,
-                'alerts': alerts
-            }
-            
+            response = score_jobs([data], explain=explain_requested(data))[0]
             logger.info("Prediction successful: %s", response)
             return jsonify(response)
             
@@ -141,6 +478,426 @@ def predict():
             'alerts': ['Error: Unexpected server error']
         }), 500
 
+@app.route('/predict/batch', methods=['POST'])
+@rate_limited(cost=batch_cost)
+def predict_batch():
+    """Score a list of print jobs in one request."""
+    try:
+        data = request.get_json(silent=True)
+        jobs = data.get('jobs') if isinstance(data, dict) else None
+        if not isinstance(jobs, list) or not jobs:
+            return jsonify({
+                'status': 'error',
+                'error': 'Request must contain a non-empty "jobs" list'
+            }), 400
+        if len(jobs) > app.config['MAX_BATCH_SIZE']:
+            return jsonify({
+                'status': 'error',
+                'error': f"Batch too large: at most {app.config['MAX_BATCH_SIZE']} jobs per request"
+            }), 413
+
+        for index, job in enumerate(jobs):
+            is_valid, error_message = validate_prediction_data(job)
+            if not is_valid:
+                logger.error("Validation error in job %d: %s", index, error_message)
+                return jsonify({
+                    'status': 'error',
+                    'error': f'Job {index}: {error_message}'
+                }), 400
+
+        results = score_jobs(jobs, explain=explain_requested(data))
+        logger.info("Batch prediction successful: %d jobs", len(results))
+        return jsonify({
+            'status': 'success',
+            'count': len(results),
+            'results': results
+        })
+
+    except Exception as e:
+        logger.error("Error processing batch prediction: %s", str(e))
+        logger.error("Full traceback: %s", traceback.format_exc())
+        return jsonify({
+            'status': 'error',
+            'error': 'Failed to process batch prediction',
+            'details': str(e)
+        }), 500
+
+@app.route('/telemetry', methods=['POST'])
+@rate_limited()
+def ingest_telemetry():
+    """Run a micro-batch of printer telemetry through streaming anomaly detection."""
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not isinstance(data.get('printer_id'), str):
+            return jsonify({
+                'status': 'error',
+                'error': 'Request must contain a printer_id string'
+            }), 400
+        samples = data.get('samples')
+        if isinstance(samples, dict):
+            samples = [samples]
+        if not isinstance(samples, list) or not samples or not all(isinstance(s, dict) for s in samples):
+            return jsonify({
+                'status': 'error',
+                'error': 'Request must contain a non-empty "samples" list of objects'
+            }), 400
+        if len(samples) > app.config['MAX_TELEMETRY_SAMPLES']:
+            return jsonify({
+                'status': 'error',
+                'error': f"Too many samples: at most {app.config['MAX_TELEMETRY_SAMPLES']} per request"
+            }), 413
+        error = normalize_sample_timestamps(samples, time.time())
+        if error:
+            return jsonify({
+                'status': 'error',
+                'error': error
+            }), 400
+
+        try:
+            alerts = process_telemetry(detector, data['printer_id'], samples)
+            telemetry_store.ingest(data['printer_id'], samples)
+        except (TypeError, ValueError) as e:
+            return jsonify({
+                'status': 'error',
+                'error': f'Invalid telemetry value: {str(e)}'
+            }), 400
+
+        if alerts:
+            logger.info("Telemetry alerts for printer %s: %d", data['printer_id'], len(alerts))
+            store_alerts(data['printer_id'], alerts)
+        return jsonify({
+            'status': 'success',
+            'processed': len(samples),
+            'alerts': alerts
+        })
+
+    except Exception as e:
+        logger.error("Error processing telemetry: %s", str(e))
+        logger.error("Full traceback: %s", traceback.format_exc())
+        return jsonify({
+            'status': 'error',
+            'error': 'Failed to process telemetry',
+            'details': str(e)
+        }), 500
+
+def query_alerts(printer_id=None):
+    """Shared handler for the paginated alert listings."""
+    status = request.args.get('status')
+    if status is not None and status not in ALERT_STATUSES:
+        return jsonify({
+            'status': 'error',
+            'error': f"status must be one of: {', '.join(ALERT_STATUSES)}"
+        }), 400
+    try:
+        limit = min(max(1, int(request.args.get('limit', 50))), 500)
+        cursor = request.args.get('cursor')
+        cursor = int(cursor) if cursor is not None else None
+    except ValueError:
+        return jsonify({
+            'status': 'error',
+            'error': 'limit and cursor must be integers'
+        }), 400
+    page = alert_store.query(printer_id=printer_id, status=status, cursor=cursor, limit=limit)
+    return jsonify({'status': 'success', **page})
+
+@app.route('/alerts', methods=['GET'])
+def list_alerts():
+    """Deduplicated alerts across the fleet, newest first."""
+    return query_alerts(request.args.get('printer_id'))
+
+@app.route('/printers/<printer_id>/alerts', methods=['GET'])
+def list_printer_alerts(printer_id):
+    """Deduplicated alerts for one printer, newest first."""
+    return query_alerts(printer_id)
+
+@app.route('/alerts/<int:alert_id>/acknowledge', methods=['POST'])
+def acknowledge_alert(alert_id):
+    """Acknowledge an alert."""
+    alert = alert_store.acknowledge(alert_id)
+    if alert is None:
+        return jsonify({'status': 'error', 'error': f'Unknown alert: {alert_id}'}), 404
+    push_hub.publish_alerts(alert['printer_id'], [alert])
+    return jsonify({'status': 'success', 'alert': alert})
+
+@app.route('/alerts/<int:alert_id>/snooze', methods=['POST'])
+def snooze_alert(alert_id):
+    """Hide an alert from open listings for a number of seconds."""
+    data = request.get_json(silent=True) or {}
+    try:
+        seconds = float(data.get('seconds', 3600))
+    except (TypeError, ValueError):
+        return jsonify({'status': 'error', 'error': 'seconds must be a number'}), 400
+    alert = alert_store.snooze(alert_id, seconds)
+    if alert is None:
+        return jsonify({'status': 'error', 'error': f'Unknown alert: {alert_id}'}), 404
+    push_hub.publish_alerts(alert['printer_id'], [alert])
+    return jsonify({'status': 'success', 'alert': alert})
+
+@app.route('/printers/<printer_id>/telemetry', methods=['GET'])
+def printer_telemetry(printer_id):
+    """Min/max/mean history of one telemetry metric, read from the coarsest tier that fits the step."""
+    metric = request.args.get('metric')
+    if metric not in METRIC_NAMES:
+        return jsonify({
+            'status': 'error',
+            'error': f"metric must be one of: {', '.join(METRIC_NAMES)}"
+        }), 400
+    try:
+        end = float(request.args.get('end', time.time()))
+        start = float(request.args.get('start', end - 86400))
+        step = request.args.get('step')
+        step = float(step) if step is not None else None
+        max_points = min(max(1, int(request.args.get('max_points', 500))), 5000)
+    except ValueError:
+        return jsonify({
+            'status': 'error',
+            'error': 'start, end and step must be numbers and max_points an integer'
+        }), 400
+    if end <= start or (step is not None and step <= 0):
+        return jsonify({'status': 'error', 'error': 'end must be after start and step positive'}), 400
+    step = max(step or 0.0, (end - start) / max_points)
+    history = telemetry_store.query(printer_id, metric, start, end, step=step)
+    if history is None:
+        return jsonify({
+            'status': 'error',
+            'error': f'No {metric} telemetry recorded for printer {printer_id}'
+        }), 404
+    return jsonify({'status': 'success', **history})
+
+@app.route('/telemetry/stats', methods=['GET'])
+def telemetry_stats():
+    """Stream count, storage size and compaction progress of the telemetry store."""
+    return jsonify({'status': 'ok', 'stats': telemetry_store.stats()})
+
+@app.route('/printers/<printer_id>/forecast', methods=['GET'])
+def printer_forecast(printer_id):
+    """Predicted maintenance due dates for each component of one printer."""
+    forecast = forecaster.forecast_printer(printer_id)
+    if forecast is None:
+        return jsonify({
+            'status': 'error',
+            'error': f'No jobs recorded for printer {printer_id}'
+        }), 404
+    return jsonify({'status': 'success', **forecast})
+
+@app.route('/printers/<printer_id>/maintenance', methods=['POST'])
+def record_maintenance(printer_id):
+    """Record completed maintenance on a component, resetting its wear."""
+    data = request.get_json(silent=True) or {}
+    component = data.get('component')
+    if component not in COMPONENTS:
+        return jsonify({
+            'status': 'error',
+            'error': f"component must be one of: {', '.join(COMPONENTS)}"
+        }), 400
+    error = normalize_sample_timestamps([data], time.time(), app.config['FORECAST_MAX_JOB_AGE'])
+    if error:
+        return jsonify({'status': 'error', 'error': error}), 400
+    forecaster.reset(printer_id, component, data.get('timestamp'))
+    forecast = forecaster.forecast_printer(printer_id)
+    push_hub.publish_health(printer_id, health_snapshot(forecast))
+    return jsonify({'status': 'success', **forecast})
+
+@app.route('/forecast', methods=['GET'])
+def fleet_forecast():
+    """Components across the fleet due for maintenance soonest."""
+    try:
+        due_within_days = float(request.args.get('due_within_days', 30))
+        limit = int(request.args.get('limit', 100))
+        if limit < 0:
+            raise ValueError(limit)
+    except ValueError:
+        return jsonify({
+            'status': 'error',
+            'error': 'due_within_days must be a number and limit a non-negative integer'
+        }), 400
+
+    now = time.time()
+    printer_ids, wear, rate, days_remaining = forecaster.forecast()
+    remaining = np.where(np.isnan(days_remaining), np.inf, days_remaining)
+    rows, columns = np.nonzero(remaining <= due_within_days)
+    order = np.argsort(remaining[rows, columns], kind='stable')[:limit]
+
+    items = []
+    for row, column in zip(rows[order], columns[order]):
+        item = component_forecast(wear[row, column], rate[row, column], days_remaining[row, column], now)
+        items.append({'printer_id': printer_ids[row], 'component': COMPONENTS[column], **item})
+    return jsonify({
+        'status': 'success',
+        'printers': len(printer_ids),
+        'due_count': int(len(rows)),
+        'items': items
+    })
+
+@app.route('/maintenance/plan', methods=['GET'])
+def fleet_maintenance_plan():
+    """Cost-aware maintenance plan for the fleet from open alerts and forecasts."""
+    try:
+        technicians = int(request.args.get('technicians', app.config['SCHEDULER_TECHNICIANS']))
+        hours_per_day = float(request.args.get('hours_per_day', app.config['SCHEDULER_HOURS_PER_DAY']))
+        horizon_days = int(request.args.get('horizon_days', app.config['SCHEDULER_HORIZON_DAYS']))
+        max_downtime_hours = float(request.args.get('max_downtime_hours',
+                                                    app.config['SCHEDULER_MAX_DOWNTIME_HOURS']))
+    except ValueError:
+        return jsonify({
+            'status': 'error',
+            'error': 'technicians, hours_per_day, horizon_days and max_downtime_hours must be numbers'
+        }), 400
+    if technicians < 1 or hours_per_day <= 0 or not 1 <= horizon_days <= 90 or max_downtime_hours <= 0:
+        return jsonify({
+            'status': 'error',
+            'error': 'technicians, hours_per_day, max_downtime_hours must be positive and horizon_days 1-90'
+        }), 400
+
+    now = time.time()
+    alerts = alert_store.open_alerts(now, max_age=app.config['SCHEDULER_ALERT_MAX_AGE'])
+    plan = maintenance_plan(alerts, forecaster.forecast(), now,
+                            technicians=technicians, hours_per_day=hours_per_day,
+                            horizon_days=horizon_days, max_downtime_hours=max_downtime_hours)
+    return jsonify({'status': 'success', 'plan': plan})
+
+def event_stream(subscription, heartbeat):
+    """Write a subscription's events as they arrive, with a keepalive comment when idle."""
+    try:
+        yield 'retry: 3000\n\n'
+        while not subscription.closed:
+            messages = subscription.get(heartbeat)
+            yield ''.join(messages) if messages else HEARTBEAT
+    finally:
+        # Runs when the client disconnects and the server closes the generator
+        push_hub.unsubscribe(subscription)
+
+@app.route('/stream', methods=['GET'])
+def stream():
+    """Server-Sent Events with new alerts and health deltas.
+
+    ?printers=a,b limits the stream to those printers; without it every
+    printer is followed. A `resync` event means events were dropped because
+    the client fell behind, and its state should be refetched.
+    """
+    printers = request.args.get('printers')
+    printer_ids = None
+    if printers is not None:
+        printer_ids = [p for p in printers.split(',') if p]
+        if not printer_ids or len(printer_ids) > app.config['PUSH_MAX_PRINTERS_PER_SUBSCRIBER']:
+            return jsonify({
+                'status': 'error',
+                'error': f"printers must list 1 to {app.config['PUSH_MAX_PRINTERS_PER_SUBSCRIBER']} printer IDs"
+            }), 400
+    subscription = push_hub.subscribe(printer_ids)
+    if subscription is None:
+        response = jsonify({'status': 'error', 'error': 'Too many stream subscribers'})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+    return Response(event_stream(subscription, app.config['PUSH_HEARTBEAT_SECONDS']),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/stream/stats', methods=['GET'])
+def stream_stats():
+    """Subscriber count and fan-out counters of the push hub."""
+    return jsonify({'status': 'ok', 'stats': push_hub.stats()})
+
+def printer_stores():
+    """Per-printer state that moves with a printer between shards, by name."""
+    return {'forecast': forecaster, 'anomaly': detector, 'alerts': alert_store, 'telemetry': telemetry_store}
+
+def shard_admin_allowed():
+    token = app.config['SHARD_ADMIN_TOKEN']
+    return not token or request.headers.get('X-Admin-Token') == token
+
+def shard_printer_ids(data):
+    """The printer_ids list of a /shard/export or /shard/drop body, or None if it is malformed."""
+    printer_ids = data.get('printer_ids') if isinstance(data, dict) else None
+    if not isinstance(printer_ids, list) or not all(isinstance(p, str) for p in printer_ids):
+        return None
+    return printer_ids
+
+@app.route('/shard/printers', methods=['GET'])
+def shard_printers():
+    """Every printer this process holds state for (used by the shard router to rebalance)."""
+    if not shard_admin_allowed():
+        return jsonify({'status': 'error', 'error': 'Forbidden'}), 403
+    printer_ids = set()
+    for store in printer_stores().values():
+        printer_ids.update(store.printer_ids())
+    return jsonify({'status': 'success', 'printer_ids': sorted(printer_ids)})
+
+@app.route('/shard/export', methods=['POST'])
+def shard_export():
+    """Wear ledger, detector state, alerts and telemetry history of the given printers."""
+    if not shard_admin_allowed():
+        return jsonify({'status': 'error', 'error': 'Forbidden'}), 403
+    printer_ids = shard_printer_ids(request.get_json(silent=True))
+    if printer_ids is None:
+        return jsonify({'status': 'error', 'error': 'Request must contain a "printer_ids" list'}), 400
+    stores = printer_stores()
+    printers = {
+        printer_id: {name: store.export_printer(printer_id) for name, store in stores.items()}
+        for printer_id in printer_ids
+    }
+    return jsonify({'status': 'success', 'printers': printers})
+
+@app.route('/shard/import', methods=['POST'])
+def shard_import():
+    """Load printer state produced by /shard/export on another process."""
+    if not shard_admin_allowed():
+        return jsonify({'status': 'error', 'error': 'Forbidden'}), 403
+    data = request.get_json(silent=True)
+    printers = data.get('printers') if isinstance(data, dict) else None
+    if not isinstance(printers, dict):
+        return jsonify({'status': 'error', 'error': 'Request must contain a "printers" object'}), 400
+    stores = printer_stores()
+    alert_ids = []
+    try:
+        for printer_id, state in printers.items():
+            for name, store in stores.items():
+                if state.get(name):
+                    renamed = store.import_printer(printer_id, state[name])
+                    if name == 'alerts':
+                        alert_ids.extend(renamed)
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        return jsonify({'status': 'error', 'error': f'Invalid printer state: {str(e)}'}), 400
+    logger.info("Imported state for %d printers", len(printers))
+    # Exported alert id -> id here, so the router can keep old alert ids working
+    return jsonify({'status': 'success', 'imported': len(printers), 'alert_ids': alert_ids})
+
+@app.route('/shard/drop', methods=['POST'])
+def shard_drop():
+    """Forget the given printers once their state has been imported elsewhere."""
+    if not shard_admin_allowed():
+        return jsonify({'status': 'error', 'error': 'Forbidden'}), 403
+    printer_ids = shard_printer_ids(request.get_json(silent=True))
+    if printer_ids is None:
+        return jsonify({'status': 'error', 'error': 'Request must contain a "printer_ids" list'}), 400
+    stores = printer_stores().values()
+    dropped = sum(any([store.drop_printer(printer_id) for store in stores]) for printer_id in printer_ids)
+    logger.info("Dropped state for %d printers", dropped)
+    return jsonify({'status': 'success', 'dropped': dropped})
+
+@app.route('/drift', methods=['GET'])
+def drift_report():
+    """PSI and KS scores of recent /predict inputs against the training distribution."""
+    if drift_monitor is None:
+        return jsonify({
+            'status': 'disabled',
+            'message': 'No drift reference is available for the model'
+        }), 404
+    return jsonify({'status': 'ok', **drift_monitor.report()})
+
+@app.route('/shadow/stats', methods=['GET'])
+def shadow_stats():
+    """Agreement and latency statistics for the shadow candidate model."""
+    if shadow is None:
+        return jsonify({
+            'status': 'disabled',
+            'message': 'Shadow evaluation is not configured'
+        }), 404
+    return jsonify({
+        'status': 'ok',
+        'stats': shadow.stats()
+    })
+
 @app.route('/test', methods=['GET'])
 def test():
     """Test endpoint to verify API is working."""
@@ -0,0 +1,450 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+COMPACT_FORMAT_VERSION = 1
+
+# Class-1 probability is decided by comparing with 0.5, as predict() does
+DECISION_THRESHOLD = 0.5
+
+
+def _final_step(transformer):
+    """The estimator doing the work in a transformer (the only step of a Pipeline).
+
+    Raises ValueError for a Pipeline of several steps: only the last one
+    would be folded into the export and the others silently lost.
+    """
+    steps = getattr(transformer, 'steps', None)
+    if not steps:
+        return transformer
+    if len(steps) > 1:
+        names = ', '.join(name for name, _ in steps)
+        raise ValueError(f"Unsupported preprocessing pipeline for export: {len(steps)} steps ({names})")
+    return steps[0][1]
+
+
+def _input_spec(preprocessor):
+    """Describe how each transformed column is derived from the raw inputs.
+
+    Returns (source column, one-hot level or None, scale, offset) per
+    transformed column, where numeric columns are x * scale + offset of the
+    raw value so the StandardScaler can be folded into the split
+    thresholds, and the full list of known levels per categorical column.
+    """
+    from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+    spec, categories = [], {}
+    for name, transformer, columns in preprocessor.transformers_:
+        if transformer == 'drop' or name == 'remainder':
+            continue
+        step = _final_step(transformer)
+        if isinstance(step, StandardScaler):
+            mean = step.mean_ if step.mean_ is not None else np.zeros(len(columns))
+            scale = step.scale_ if step.scale_ is not None else np.ones(len(columns))
+            spec.extend((column, None, float(s), float(m)) for column, m, s in zip(columns, mean, scale))
+        elif isinstance(step, OneHotEncoder):
+            drop = step.drop_idx_ if step.drop_idx_ is not None else [None] * len(columns)
+            for column, levels, dropped in zip(columns, step.categories_, drop):
+                categories[column] = [str(level) for level in levels]
+                spec.extend((column, str(level), 1.0, 0.0)
+                            for i, level in enumerate(levels) if i != dropped)
+        else:
+            raise ValueError(f"Unsupported preprocessing step for export: {type(step).__name__}")
+    return spec, categories
+
+
+def _tree_arrays(tree, leaf_value, prune_tolerance):
+    """Flatten one sklearn tree, collapsing splits whose leaves predict (almost) the same value.
+
+    Returns feature (-1 for leaves), threshold, left, right (tree-local
+    indices) and value arrays, in depth-first order. Internal nodes get the
+    training-weighted mean of the leaves below them, which path
+    attributions need; predictions only read leaf values.
+    """
+    left, right = tree.children_left, tree.children_right
+    weight = tree.weighted_n_node_samples
+
+    # Bottom-up (children always follow their parent in sklearn trees): a
+    # split whose children are both leaves with values within the
+    # tolerance carries no information and becomes a leaf itself
+    value = leaf_value.astype(np.float64).copy()
+    is_leaf = left == -1
+    for node in range(tree.node_count - 1, -1, -1):
+        if is_leaf[node]:
+            continue
+        l, r = left[node], right[node]
+        value[node] = (value[l] * weight[l] + value[r] * weight[r]) / (weight[l] + weight[r])
+        if is_leaf[l] and is_leaf[r] and abs(value[l] - value[r]) <= prune_tolerance:
+            is_leaf[node] = True
+
+    order, stack = [], [0]
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        if not is_leaf[node]:
+            stack.extend((right[node], left[node]))
+    position = {node: i for i, node in enumerate(order)}
+    order = np.array(order)
+    leaves = is_leaf[order]
+    return (
+        np.where(leaves, -1, tree.feature[order]),
+        np.where(leaves, 0.0, tree.threshold[order]),
+        np.array([-1 if is_leaf[n] else position[left[n]] for n in order]),
+        np.array([-1 if is_leaf[n] else position[right[n]] for n in order]),
+        value[order],
+    )
+
+
+def export_arrays(pipeline, quantize=False, prune_tolerance=0.0):
+    """Convert a fitted preprocessing + tree ensemble pipeline into flat arrays.
+
+    Supports RandomForestClassifier (average of leaf probabilities) and
+    GradientBoostingClassifier (sigmoid of the summed leaf values).
+    Returns (arrays, meta) ready for save().
+    """
+    from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+
+    preprocessor = pipeline.named_steps['preprocessor']
+    classifier = pipeline.steps[-1][1]
+    spec, categories = _input_spec(preprocessor)
+
+    if isinstance(classifier, RandomForestClassifier):
+        kind, init = 'forest', 0.0
+        trees = [estimator.tree_ for estimator in classifier.estimators_]
+        leaf_values = [t.value[:, 0, 1] / t.value[:, 0].sum(axis=1) for t in trees]
+    elif isinstance(classifier, GradientBoostingClassifier):
+        if classifier.n_classes_ != 2:
+            raise ValueError("Only binary gradient boosting models can be exported")
+        kind = 'boosting'
+        prior = classifier.init_.predict_proba(np.zeros((1, len(spec))))[0, 1]
+        prior = min(max(prior, 1e-12), 1 - 1e-12)
+        init = float(np.log(prior / (1 - prior)))
+        trees = [estimator.tree_ for estimator in classifier.estimators_[:, 0]]
+        leaf_values = [t.value[:, 0, 0] * classifier.learning_rate for t in trees]
+    else:
+        raise ValueError(f"Unsupported classifier for export: {type(classifier).__name__}")
+
+    parts = [_tree_arrays(tree, values, prune_tolerance) for tree, values in zip(trees, leaf_values)]
+    feature = np.concatenate([p[0] for p in parts])
+    threshold = np.concatenate([p[1] for p in parts])
+    left = np.concatenate([p[2] for p in parts])
+    right = np.concatenate([p[3] for p in parts])
+    value = np.concatenate([p[4] for p in parts])
+    sizes = np.array([len(p[0]) for p in parts])
+
+    # Fold the scaler into the thresholds: (x - mean) / scale <= t  <=>  x <= t * scale + mean
+    internal = feature >= 0
+    scale = np.array([s[2] for s in spec])
+    offset = np.array([s[3] for s in spec])
+    threshold[internal] = threshold[internal] * scale[feature[internal]] + offset[feature[internal]]
+
+    child_dtype = np.int16 if sizes.max() < np.iinfo(np.int16).max else np.int32
+    arrays = {
+        'tree_sizes': sizes.astype(np.int32),
+        'feature': feature.astype(np.int16),
+        'left': left.astype(child_dtype),
+        'right': right.astype(child_dtype),
+        'value': value.astype(np.float32),
+    }
+    if quantize:
+        # 16-bit codes on a per-feature grid between its smallest and largest threshold
+        n_features = len(spec)
+        low = np.zeros(n_features, dtype=np.float32)
+        high = np.zeros(n_features, dtype=np.float32)
+        codes = np.zeros(len(threshold), dtype=np.uint16)
+        for f in range(n_features):
+            mask = feature == f
+            if not mask.any():
+                continue
+            low[f], high[f] = threshold[mask].min(), threshold[mask].max()
+            span = float(high[f]) - float(low[f])
+            if span > 0:
+                codes[mask] = np.round((threshold[mask] - low[f]) / span * 65535)
+        arrays.update(threshold_codes=codes, threshold_low=low, threshold_high=high)
+    else:
+        arrays['threshold'] = threshold.astype(np.float32)
+
+    meta = {
+        'version': COMPACT_FORMAT_VERSION,
+        'kind': kind,
+        'init': init,
+        'feature_names_in': [str(name) for name in pipeline.feature_names_in_],
+        'inputs': [{'column': column, 'level': level} for column, level, _, _ in spec],
+        'categories': categories,
+        'node_values': True,
+        'quantized': bool(quantize),
+        'prune_tolerance': prune_tolerance,
+        'n_trees': len(parts),
+        'n_nodes': int(sizes.sum()),
+        'source_nodes': int(sum(tree.node_count for tree in trees)),
+    }
+    return arrays, meta
+
+
+class CompactTreeModel:
+    """Tree ensemble stored as contiguous arrays, with a predict_proba like the sklearn pipeline.
+
+    Raw inputs are turned into the model's feature matrix directly (the
+    scaler is folded into the thresholds, one-hot columns are equality
+    tests) and all trees are walked together, one level per step, so a
+    prediction costs max_depth vectorized gathers.
+    """
+
+    def __init__(self, arrays, meta):
+        self.meta = meta
+        self.kind = meta['kind']
+        self.init = meta['init']
+        self.feature_names_in_ = np.array(meta['feature_names_in'], dtype=object)
+        self.inputs = [(item['column'], item['level']) for item in meta['inputs']]
+        self.categories = meta['categories']
+
+        feature = arrays['feature'].astype(np.intp)
+        if 'threshold' in arrays:
+            threshold = arrays['threshold'].astype(np.float32)
+        else:
+            low, high = arrays['threshold_low'], arrays['threshold_high']
+            safe = np.maximum(feature, 0)
+            threshold = (low[safe] + arrays['threshold_codes'] * ((high[safe] - low[safe]) / 65535)).astype(np.float32)
+
+        sizes = arrays['tree_sizes']
+        offsets = np.repeat(np.r_[0, np.cumsum(sizes)[:-1]], sizes)
+        leaf = feature < 0
+        nodes = np.arange(len(feature))
+        # Leaves point at themselves with an always-false test so every
+        # tree can be stepped the same number of times; children are
+        # interleaved (left, right) so one gather picks the next node
+        self.feature = np.where(leaf, 0, feature).astype(np.int32)
+        self.threshold = np.where(leaf, np.inf, threshold).astype(np.float32)
+        self.children = np.empty(2 * len(feature), dtype=np.int32)
+        self.children[0::2] = np.where(leaf, nodes, arrays['left'].astype(np.intp) + offsets)
+        self.children[1::2] = np.where(leaf, nodes, arrays['right'].astype(np.intp) + offsets)
+        self.value = arrays['value'].astype(np.float64)
+        self.roots = np.r_[0, np.cumsum(sizes)[:-1]].astype(np.int32)
+        self.max_depth = self._max_depth(leaf)
+        self._paths = None
+
+    def _max_depth(self, leaf):
+        index = self.roots
+        depth = 0
+        while not leaf[index].all():
+            index = np.unique(np.concatenate([self.children[2 * index], self.children[2 * index + 1]]))
+            depth += 1
+        return depth
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {key: data[key] for key in data.files if key != 'meta'}
+            meta = json.loads(str(data['meta']))
+        if meta.get('version') != COMPACT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported compact model version: {meta.get('version')}")
+        return cls(arrays, meta)
+
+    def transform(self, X):
+        """Build the float32 feature matrix the trees were trained on from raw inputs."""
+        if not isinstance(X, pd.DataFrame):
+            X = pd.DataFrame(X, columns=self.feature_names_in_)
+        for column, levels in self.categories.items():
+            known = X[column].isin(levels)
+            if not known.all():
+                unknown = sorted(set(X[column][~known].astype(str)))
+                raise ValueError(f"Found unknown categories {unknown} in column '{column}'")
+        matrix = np.empty((len(X), len(self.inputs)), dtype=np.float32)
+        columns = {}
+        for j, (column, level) in enumerate(self.inputs):
+            if column not in columns:
+                columns[column] = X[column].to_numpy()
+            if level is None:
+                matrix[:, j] = columns[column]
+            else:
+                matrix[:, j] = columns[column] == level
+        return matrix
+
+    def _leaves(self, matrix):
+        """Leaf index reached in every tree, as a flat (row-major, then tree) array."""
+        n_rows, n_features = matrix.shape
+        n_trees = len(self.roots)
+        flat = matrix.ravel()
+        row_offset = np.repeat(np.arange(n_rows, dtype=np.int32) * n_features, n_trees)
+        index = np.tile(self.roots, n_rows)
+        for _ in range(self.max_depth):
+            go_right = np.take(flat, np.take(self.feature, index) + row_offset) > np.take(self.threshold, index)
+            index = np.take(self.children, 2 * index + go_right)
+        return index
+
+    def raw_scores(self, matrix):
+        """Per-row, per-tree leaf values for a transformed feature matrix."""
+        return self.value[self._leaves(matrix)].reshape(len(matrix), len(self.roots))
+
+    def _positive(self, leaf_values):
+        if self.kind == 'forest':
+            return leaf_values.mean(axis=1)
+        return 1.0 / (1.0 + np.exp(-(self.init + leaf_values.sum(axis=1))))
+
+    def predict_proba(self, X):
+        positive = self._positive(self.raw_scores(self.transform(X)))
+        return np.column_stack([1.0 - positive, positive])
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] > DECISION_THRESHOLD).astype(np.int64)
+
+    @property
+    def explanation_space(self):
+        """Units of explain() contributions: class-1 probability for forests, log-odds for boosting."""
+        return 'probability' if self.kind == 'forest' else 'log_odds'
+
+    def _path_contributions(self):
+        """Per raw input, the contribution accumulated on the path from the root to each node.
+
+        Each split moves the prediction from the parent's expected value to
+        the child's; the change is credited to the split's source column.
+        """
+        if self._paths is None:
+            if not self.meta.get('node_values'):
+                raise ValueError("This export has no internal node values; re-export it to explain predictions")
+            names = list(self.feature_names_in_)
+            source = np.array([names.index(column) for column, _ in self.inputs])[self.feature]
+            leaf = np.isinf(self.threshold)
+            paths = np.zeros((len(self.feature), len(names)))
+            # Roots first, then one level at a time: a child starts from its parent's path
+            frontier = self.roots[~leaf[self.roots]]
+            while len(frontier):
+                for side in (0, 1):
+                    child = self.children[2 * frontier + side]
+                    paths[child] = paths[frontier]
+                    paths[child, source[frontier]] += self.value[child] - self.value[frontier]
+                children = self.children[np.r_[2 * frontier, 2 * frontier + 1]]
+                frontier = children[~leaf[children]]
+            self._paths = np.ascontiguousarray(paths.T)
+        return self._paths
+
+    def explain(self, X):
+        """Class-1 probabilities with per-input path attributions.
+
+        The contributions of a row add up exactly to its prediction minus
+        the base value, the expected prediction over the training data: in
+        probability for forests and in log-odds for boosting (see
+        explanation_space). A leaf's path is fixed, so its contributions
+        are computed once per model and a row costs the same tree walk as
+        predict_proba() plus one gather per tree.
+
+        Returns (probabilities, base_value, contributions) where
+        contributions has one column per feature_names_in_.
+        """
+        paths = self._path_contributions()
+        matrix = self.transform(X)
+        n_rows, n_trees = len(matrix), len(self.roots)
+        index = self._leaves(matrix)
+        # Paths are stored one row per input, so the per-tree sum runs over contiguous memory
+        contributions = np.take(paths, index.reshape(n_rows, n_trees), axis=1).sum(axis=2).T
+        leaf_values = self.value[index].reshape(n_rows, n_trees)
+        base_value = self.value[self.roots].sum()
+        if self.kind == 'forest':
+            contributions /= n_trees
+            base_value /= n_trees
+        else:
+            base_value += self.init
+        return self._positive(leaf_values), float(base_value), contributions
+
+
+def save(path, arrays, meta):
+    np.savez(path, meta=np.array(json.dumps(meta)), **arrays)
+
+
+def evaluate_export(pipeline, compact, X, y=None):
+    """Compare a compact model with its source pipeline on the same inputs."""
+    reference = pipeline.predict_proba(X)[:, 1]
+    approximate = compact.predict_proba(X)[:, 1]
+    report = {
+        'rows': len(X),
+        'max_abs_probability_diff': float(np.abs(reference - approximate).max()),
+        'label_agreement': float(np.mean((reference > DECISION_THRESHOLD) == (approximate > DECISION_THRESHOLD))),
+    }
+    if y is not None:
+        y = np.asarray(y)
+        report['accuracy_source'] = float(np.mean((reference > DECISION_THRESHOLD) == y))
+        report['accuracy_compact'] = float(np.mean((approximate > DECISION_THRESHOLD) == y))
+        report['accuracy_delta'] = report['accuracy_compact'] - report['accuracy_source']
+    return report
+
+
+def export_model(pipeline, path, X, y=None, quantize=False, prune_tolerance=0.0, tolerance=0.005):
+    """Export a pipeline to `path` after checking the compact model against it.
+
+    Raises ValueError (and writes nothing) if the accuracy drops by more
+    than `tolerance`, or label agreement falls below 1 - tolerance when no
+    labels are given. Returns the evaluation report.
+    """
+    arrays, meta = export_arrays(pipeline, quantize=quantize, prune_tolerance=prune_tolerance)
+    compact = CompactTreeModel(arrays, meta)
+    report = evaluate_export(pipeline, compact, X, y)
+    loss = -report['accuracy_delta'] if y is not None else 1.0 - report['label_agreement']
+    if loss > tolerance:
+        raise ValueError(f"Compact model loses {loss:.4f} accuracy, above the tolerance of {tolerance}")
+    meta['evaluation'] = report
+    save(path, arrays, meta)
+    return report
+
+
+def explainer_for(model):
+    """A CompactTreeModel that can explain `model`'s predictions, or None if it cannot be converted."""
+    if isinstance(model, CompactTreeModel):
+        return model if model.meta.get('node_values') else None
+    try:
+        return CompactTreeModel(*export_arrays(model))
+    except (AttributeError, KeyError, ValueError):
+        return None
+
+
+def known_categories(model):
+    """Levels of each categorical input the model was trained on, as sets ({} if they cannot be read)."""
+    if isinstance(model, CompactTreeModel):
+        return {column: set(levels) for column, levels in model.categories.items()}
+    try:
+        _, categories = _input_spec(model.named_steps['preprocessor'])
+    except (AttributeError, KeyError, ValueError):
+        return {}
+    return {column: set(levels) for column, levels in categories.items()}
+
+
+def load_artifact(path):
+    """Load a model from a compact .npz export or a joblib pickle."""
+    if path.endswith('.npz'):
+        return CompactTreeModel.load(path)
+    import joblib
+
+    return joblib.load(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a pickled tree model to the compact .npz format.')
+    parser.add_argument('model_path')
+    parser.add_argument('output_path')
+    parser.add_argument('--data', default=os.path.join(os.path.dirname(__file__), '..', 'data', 'data.csv'),
+                        help='CSV used to check the export (with maintenance_needed labels if present)')
+    parser.add_argument('--quantize', action='store_true', help='store thresholds as 16-bit codes')
+    parser.add_argument('--prune-tolerance', type=float, default=0.0,
+                        help='collapse splits whose leaves differ by at most this much')
+    parser.add_argument('--tolerance', type=float, default=0.005, help='maximum allowed accuracy loss')
+    args = parser.parse_args()
+
+    import joblib
+
+    pipeline = joblib.load(args.model_path)
+    df = pd.read_csv(args.data)
+    X = df[list(pipeline.feature_names_in_)]
+    y = df['maintenance_needed'] if 'maintenance_needed' in df else None
+    report = export_model(pipeline, args.output_path, X, y, quantize=args.quantize,
+                          prune_tolerance=args.prune_tolerance, tolerance=args.tolerance)
+    meta = CompactTreeModel.load(args.output_path).meta
+    print(f"Exported {meta['n_trees']} trees, {meta['n_nodes']} nodes (from {meta['source_nodes']}) "
+          f"to {args.output_path} ({os.path.getsize(args.output_path) / 1024:.0f} KB)")
+    for key, value in report.items():
+        print(f"  {key}: {value}")
+
+
+if __name__ == '__main__':
+    main()
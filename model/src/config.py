@@ -1,9 +1,116 @@
+import os
+import tempfile
+
 class Config:
     DEBUG = False
     TESTING = False
     SECRET_KEY = 'your-secret-key'  # Change this to a secure key in production
     CORS_ORIGINS = ['https://your-frontend-domain']
-    MODEL_PATH = 'models/printer_model.pkl'
+    MODEL_PATH = os.environ.get('MODEL_PATH', 'models/printer_model.pkl')  # .pkl or compact .npz export
+    MAX_BATCH_SIZE = 1000
+
+    # 'exact' scores every job; 'surface' answers jobs inside the precomputed
+    # grid by interpolation (its measured error is stored with the surface)
+    PREDICTION_MODE = os.environ.get('PREDICTION_MODE', 'exact')
+    RESPONSE_SURFACE_PATH = os.environ.get('RESPONSE_SURFACE_PATH', 'models/response_surface.npz')
+    # Largest interpolation error (measured when the surface is built) a surface may have to be served
+    RESPONSE_SURFACE_MAX_ERROR = {'wear_factor': 0.06, 'thermal_stress': 0.01, 'maintenance_probability': 0.2}
+
+    # Remaining-useful-life forecasts per printer component
+    FORECAST_FORGETTING = 0.97  # per-job weight decay of the wear-rate fit
+    FORECAST_ALERT_HORIZON_DAYS = 7.0  # alert when a component is due within this many days
+    FORECAST_MAX_JOB_AGE = 30 * 86400  # seconds; older job timestamps are rejected
+
+    # Streaming anomaly / change-point detection on /telemetry
+    MAX_TELEMETRY_SAMPLES = 5000
+    ANOMALY_SPIKE_Z = 6.0  # robust z-score reported as a sudden change
+    ANOMALY_CUSUM_H = 12.0  # CUSUM limit reported as a drift
+    ANOMALY_WARMUP = 30  # samples per stream before alerting
+    ANOMALY_COOLDOWN = 120  # samples per stream between alerts
+
+    # Alert store: repeats of the same alert within the window roll up into one record
+    ALERT_DEDUP_WINDOW = 3600.0  # seconds
+    ALERT_STORE_MAX_RECORDS = 5_000_000
+
+    # Fleet maintenance scheduler defaults (overridable per request)
+    SCHEDULER_TECHNICIANS = 2
+    SCHEDULER_HOURS_PER_DAY = 8.0
+    SCHEDULER_HORIZON_DAYS = 7
+    SCHEDULER_MAX_DOWNTIME_HOURS = 4.0  # per printer over the horizon
+    SCHEDULER_ALERT_MAX_AGE = 7 * 86400  # seconds since an alert was last seen
+
+    # Input drift monitoring: reference sketch written by train_model.py next
+    # to the model; scores cover the current and previous window
+    DRIFT_REFERENCE_PATH = os.environ.get('DRIFT_REFERENCE_PATH', 'models/printer_model.drift.json')
+    DRIFT_WINDOW_SECONDS = 3600.0
+    DRIFT_QUEUE_SIZE = 1000  # requests waiting to be counted before new ones are dropped
+    DRIFT_MIN_SAMPLES = 200  # per material, before it is scored
+
+    # Telemetry history tiers (raw per-second, 1m, 1h, 1d): seconds kept per
+    # tier, how often buckets are rolled up, and how late a sample may arrive
+    TELEMETRY_RETENTION = {
+        'raw': 900,
+        '1m': 86400,
+        '1h': 90 * 86400,
+        '1d': 730 * 86400,
+    }
+    TELEMETRY_COMPACTION_INTERVAL = 10.0  # seconds
+    TELEMETRY_LATE_GRACE = 60.0  # seconds
+
+    # Server-Sent Events push (/stream): events queued per subscriber before
+    # the oldest are dropped, and seconds between keepalives on an idle stream
+    PUSH_QUEUE_SIZE = 256
+    PUSH_MAX_SUBSCRIBERS = 10000
+    PUSH_MAX_PRINTERS_PER_SUBSCRIBER = 1000
+    PUSH_HEARTBEAT_SECONDS = 15.0
+
+    # Sharding: backends behind router.py, as name=url pairs. Printers are
+    # placed on a consistent-hash ring with SHARD_VNODES points per shard;
+    # the /shard/* state transfer endpoints require SHARD_ADMIN_TOKEN if set
+    SHARD_BACKENDS = os.environ.get('SHARD_BACKENDS', '')
+    SHARD_VNODES = 160
+    SHARD_TIMEOUT = 30.0  # seconds per backend request
+    SHARD_MIGRATION_BATCH = 100  # printers moved per export/import round
+    SHARD_ADMIN_TOKEN = os.environ.get('SHARD_ADMIN_TOKEN')
+    # Proxies in front of this process whose X-Forwarded-For entries are trusted
+    # (1 behind router.py); 0 uses the connection's address
+    TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', '0'))
+
+    # Token-bucket rate limiting per configured API key / client address. The SQLite file is
+    # shared by every worker on the host; use 'memory://' for a single process.
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1') == '1'
+    RATE_LIMIT_STORAGE = os.environ.get(
+        'RATE_LIMIT_STORAGE',
+        'sqlite:///' + os.path.join(tempfile.gettempdir(), 'printer-api-ratelimit.db')
+    )
+    RATE_LIMIT_CAPACITY = MAX_BATCH_SIZE  # burst size in scored jobs; a full batch fits
+    RATE_LIMIT_REFILL_RATE = 10.0  # jobs per second
+    RATE_LIMIT_OVERRIDES = {}  # e.g. {'key:fleet-controller': (5000, 100.0)}
+    # X-API-Key values that get their own bucket (keys in RATE_LIMIT_OVERRIDES
+    # do too); requests with any other key are limited by remote address
+    RATE_LIMIT_API_KEYS = frozenset(k for k in os.environ.get('RATE_LIMIT_API_KEYS', '').split(',') if k)
+    # Each printer_id sent with a configured API key also has its own bucket under that key
+    RATE_LIMIT_PRINTER_CAPACITY = 300
+    RATE_LIMIT_PRINTER_REFILL_RATE = 5.0
+
+    # Shadow evaluation of a candidate model; disabled unless a path is set
+    SHADOW_MODEL_PATH = os.environ.get('SHADOW_MODEL_PATH')
+    SHADOW_WORKERS = 1
+    SHADOW_QUEUE_SIZE = 1024
+    SHADOW_BATCH_SIZE = 64
+    SHADOW_BATCH_LINGER = 0.05  # seconds to wait for a batch to fill
+    SHADOW_BUFFER_SIZE = 10000
+
+    # Opt-in profiling surface: per-request cProfile via the X-Profile header
+    # or ?profile=1 (with the admin token), and /admin/profile/sample for
+    # cross-worker stack sampling
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED') == '1'
+    PROFILING_DIR = os.environ.get(
+        'PROFILING_DIR', os.path.join(tempfile.gettempdir(), 'printer-api-profiles')
+    )
+    PROFILING_MAX_SECONDS = 60
+    PROFILING_MAX_PROFILES = 200  # newest per-request profiles kept in PROFILING_DIR
+    PROFILING_ADMIN_TOKEN = os.environ.get('PROFILING_ADMIN_TOKEN')
 
 class ProductionConfig(Config):
     SERVER_NAME = 'your-api-domain'
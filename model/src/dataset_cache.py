@@ -0,0 +1,202 @@
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+CACHE_FORMAT_VERSION = 1
+
+# Known category levels, in the order OneHotEncoder sorts them; levels seen
+# in a dataset but not listed here are appended
+CATEGORY_LEVELS = {
+    'material': ['ABS', 'PETG', 'PLA', 'TPU'],
+    'infill_pattern': ['grid', 'honeycomb', 'lines', 'triangles'],
+}
+
+# Integer columns with a small range (labels, flags) are stored as uint8
+LABEL_COLUMNS = ('maintenance_needed',)
+
+
+def default_cache_dir(csv_path):
+    stem, _ = os.path.splitext(os.path.abspath(csv_path))
+    return stem + '.cache'
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def encode_columns(df):
+    """Convert a DataFrame to compact column arrays and their schema.
+
+    Numerics become float32, categories uint8 codes and small integer
+    labels uint8.
+    """
+    arrays, schema = {}, []
+    for name in df.columns:
+        column = df[name]
+        if name in CATEGORY_LEVELS or not pd.api.types.is_numeric_dtype(column):
+            seen = sorted(set(column.dropna().astype(str)))
+            levels = list(CATEGORY_LEVELS.get(name, []))
+            levels += [level for level in seen if level not in levels]
+            if len(levels) > 127:
+                raise ValueError(f"Column '{name}' has too many categories to cache ({len(levels)})")
+            codes = pd.Categorical(column.astype(str), categories=levels).codes
+            if (codes < 0).any():
+                raise ValueError(f"Column '{name}' has missing values")
+            arrays[name] = codes.astype(np.uint8)
+            schema.append({'name': name, 'kind': 'category', 'dtype': 'uint8', 'categories': levels})
+        elif name in LABEL_COLUMNS:
+            arrays[name] = column.to_numpy().astype(np.uint8)
+            schema.append({'name': name, 'kind': 'label', 'dtype': 'uint8'})
+        else:
+            arrays[name] = column.to_numpy(dtype=np.float32)
+            schema.append({'name': name, 'kind': 'numeric', 'dtype': 'float32'})
+    return arrays, schema
+
+
+def save_dataset(df, cache_dir, source=None):
+    """Write a DataFrame as one .npy file per column plus a manifest.json.
+
+    `source` describes where the data came from (path, size, mtime and
+    sha256 of a CSV) so stale caches can be detected.
+    """
+    arrays, schema = encode_columns(df)
+    os.makedirs(cache_dir, exist_ok=True)
+    for name, values in arrays.items():
+        np.save(os.path.join(cache_dir, f'{name}.npy'), values)
+    manifest = {
+        'version': CACHE_FORMAT_VERSION,
+        'rows': len(df),
+        'columns': schema,
+        'source': source,
+    }
+    # Written last and atomically: a cache without a manifest is never used
+    path = os.path.join(cache_dir, 'manifest.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
+    return manifest
+
+
+def read_manifest(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('version') == CACHE_FORMAT_VERSION else None
+
+
+def source_info(csv_path):
+    stat = os.stat(csv_path)
+    return {
+        'path': os.path.abspath(csv_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': file_sha256(csv_path),
+    }
+
+
+def is_fresh(manifest, csv_path):
+    """Whether a cache still matches its CSV: same size and mtime, or else same content hash."""
+    source = (manifest or {}).get('source')
+    if not source:
+        return False
+    stat = os.stat(csv_path)
+    if stat.st_size != source['size']:
+        return False
+    if stat.st_mtime_ns == source['mtime_ns']:
+        return True
+    return file_sha256(csv_path) == source['sha256']
+
+
+def build_cache(csv_path, cache_dir=None, **read_csv_kwargs):
+    """Parse a CSV once and store it as a columnar cache; returns the manifest."""
+    cache_dir = cache_dir or default_cache_dir(csv_path)
+    df = pd.read_csv(csv_path, **read_csv_kwargs)
+    return save_dataset(df, cache_dir, source=source_info(csv_path))
+
+
+def load_columns(cache_dir, mmap=True):
+    """Load the raw cached column arrays (memory-mapped by default) and the manifest."""
+    manifest = read_manifest(cache_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No dataset cache in {cache_dir}")
+    mode = 'r' if mmap else None
+    arrays = {
+        column['name']: np.load(os.path.join(cache_dir, f"{column['name']}.npy"), mmap_mode=mode)
+        for column in manifest['columns']
+    }
+    return arrays, manifest
+
+
+def load_cached_frame(cache_dir, mmap=True):
+    """Load a cache as a DataFrame without copying the column data.
+
+    Category columns are pandas Categoricals over the cached codes, so
+    they behave like the original string columns in the preprocessing
+    pipeline.
+    """
+    arrays, manifest = load_columns(cache_dir, mmap)
+    data = {}
+    for column in manifest['columns']:
+        values = arrays[column['name']]
+        if column['kind'] == 'category':
+            values = pd.Categorical.from_codes(values.view(np.int8), categories=column['categories'],
+                                               validate=False)
+        data[column['name']] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def load_dataset(csv_path, cache_dir=None, mmap=True, **read_csv_kwargs):
+    """Load a CSV through its columnar cache, building or refreshing the cache when needed."""
+    cache_dir = cache_dir or default_cache_dir(csv_path)
+    if not is_fresh(read_manifest(cache_dir), csv_path):
+        build_cache(csv_path, cache_dir, **read_csv_kwargs)
+    return load_cached_frame(cache_dir, mmap)
+
+
+def score_dataset(model, csv_path, cache_dir=None, chunk_size=100_000):
+    """Maintenance probabilities for every row of a CSV, read through its cache in chunks."""
+    df = load_dataset(csv_path, cache_dir)
+    features = list(model.feature_names_in_)
+    probabilities = np.empty(len(df), dtype=np.float32)
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size][features]
+        probabilities[start:start + chunk_size] = model.predict_proba(chunk)[:, 1]
+    return probabilities
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build a columnar cache for a CSV, or score it in bulk.')
+    parser.add_argument('csv_path')
+    parser.add_argument('--cache-dir')
+    parser.add_argument('--score', metavar='MODEL_PATH', help='score every row with this model')
+    parser.add_argument('--output', help='where to write the scores (default: <csv>.scores.csv)')
+    args = parser.parse_args()
+
+    cache_dir = args.cache_dir or default_cache_dir(args.csv_path)
+    if args.score:
+        import joblib
+
+        probabilities = score_dataset(joblib.load(args.score), args.csv_path, cache_dir)
+        output = args.output or os.path.splitext(args.csv_path)[0] + '.scores.csv'
+        pd.DataFrame({'maintenance_probability': probabilities}).to_csv(output, index=False)
+        print(f"Scored {len(probabilities)} rows to {output}")
+        return
+
+    manifest = build_cache(args.csv_path, cache_dir)
+    print(f"Cached {manifest['rows']} rows to {cache_dir}")
+    for column in manifest['columns']:
+        print(f"  {column['name']:<20} {column['kind']:<9} {column['dtype']}")
+
+
+if __name__ == '__main__':
+    main()
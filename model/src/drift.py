@@ -0,0 +1,348 @@
+import argparse
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SKETCH_FORMAT_VERSION = 1
+
+NUMERIC_FEATURES = ('layer_height', 'wall_thickness', 'infill_density', 'nozzle_temperature',
+                    'bed_temperature', 'print_speed', 'fan_speed')
+CATEGORICAL_FEATURES = ('infill_pattern',)
+GROUP_COLUMN = 'material'
+
+# Quantile bins per (material, feature); values outside the training range
+# fall in the open-ended first and last bins
+DEFAULT_BINS = 20
+
+# Conventional PSI bands: below 0.1 stable, up to 0.25 moderate shift, above significant
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+# Bin proportions are floored at this value so empty bins do not make PSI infinite
+PSI_EPSILON = 1e-4
+
+
+class DriftSketch:
+    """Fixed-size histograms of the model inputs, one set per material.
+
+    Numeric features are counted in quantile bins of the training data for
+    that material, categorical features per level (plus one slot for
+    unknown levels). The size depends only on the number of materials,
+    features and bins, never on how many rows were added, and sketches
+    with the same bins merge by adding their counts.
+    """
+
+    def __init__(self, groups, edges, levels):
+        self.groups = list(groups)
+        self.edges = np.asarray(edges, dtype=np.float64)  # (groups, numeric features, bins - 1)
+        self.levels = {name: list(values) for name, values in levels.items()}
+        self._group_index = {group: i for i, group in enumerate(self.groups)}
+        n_groups, n_features, n_edges = self.edges.shape
+        self.numeric = np.zeros((n_groups, n_features, n_edges + 1))
+        self.categorical = {name: np.zeros((n_groups, len(values) + 1)) for name, values in self.levels.items()}
+        self.rows = np.zeros(n_groups)
+        self.unmatched = 0
+
+    @classmethod
+    def from_frame(cls, df, bins=DEFAULT_BINS):
+        """Build a sketch whose bins are the quantiles of `df`, with `df` counted in it."""
+        groups = sorted(df[GROUP_COLUMN].astype(str).unique())
+        quantiles = np.linspace(0, 1, bins + 1)[1:-1]
+        edges = np.full((len(groups), len(NUMERIC_FEATURES), bins - 1), np.inf)
+        for g, group in enumerate(groups):
+            rows = df[df[GROUP_COLUMN].astype(str) == group]
+            for f, feature in enumerate(NUMERIC_FEATURES):
+                # Repeated quantiles (clipped values) collapse; the spare edges stay at +inf
+                unique = np.unique(np.quantile(rows[feature].to_numpy(dtype=np.float64), quantiles))
+                edges[g, f, :len(unique)] = unique
+        levels = {name: sorted(df[name].astype(str).unique()) for name in CATEGORICAL_FEATURES}
+        sketch = cls(groups, edges, levels)
+        sketch.update(df)
+        return sketch
+
+    def empty_like(self):
+        return DriftSketch(self.groups, self.edges, self.levels)
+
+    @property
+    def nbytes(self):
+        return (self.edges.nbytes + self.numeric.nbytes + self.rows.nbytes
+                + sum(counts.nbytes for counts in self.categorical.values()))
+
+    def update(self, df):
+        """Count the rows of a DataFrame with (at least) the model's input columns."""
+        group = df[GROUP_COLUMN].astype(str).map(self._group_index)
+        known = group.notna().to_numpy()
+        self.unmatched += int((~known).sum())
+        if not known.any():
+            return
+        df = df[known]
+        group = group[known].to_numpy(dtype=np.intp)
+        n_groups = len(self.groups)
+        self.rows += np.bincount(group, minlength=n_groups)
+
+        n_bins = self.numeric.shape[2]
+        for f, feature in enumerate(NUMERIC_FEATURES):
+            values = df[feature].to_numpy(dtype=np.float64)
+            bins = np.empty(len(values), dtype=np.intp)
+            for g in np.unique(group):
+                mask = group == g
+                bins[mask] = np.searchsorted(self.edges[g, f], values[mask], side='right')
+            self.numeric[:, f] += np.bincount(group * n_bins + bins,
+                                              minlength=n_groups * n_bins).reshape(n_groups, n_bins)
+
+        for name, levels in self.levels.items():
+            index = {level: i for i, level in enumerate(levels)}
+            codes = df[name].astype(str).map(index).fillna(len(levels)).to_numpy(dtype=np.intp)
+            width = len(levels) + 1
+            self.categorical[name] += np.bincount(group * width + codes,
+                                                  minlength=n_groups * width).reshape(n_groups, width)
+
+    def merge(self, other):
+        """Add another sketch with the same bins into this one."""
+        if self.groups != other.groups or not np.array_equal(self.edges, other.edges):
+            raise ValueError("Only sketches with the same groups and bins can be merged")
+        self.numeric += other.numeric
+        for name in self.categorical:
+            self.categorical[name] += other.categorical[name]
+        self.rows += other.rows
+        self.unmatched += other.unmatched
+        return self
+
+    def copy(self):
+        return self.empty_like().merge(self)
+
+    def to_dict(self):
+        return {
+            'version': SKETCH_FORMAT_VERSION,
+            'groups': self.groups,
+            # JSON has no infinity; unused edges are stored as null
+            'edges': np.where(np.isinf(self.edges), np.nan, self.edges).tolist(),
+            'levels': self.levels,
+            'numeric': self.numeric.tolist(),
+            'categorical': {name: counts.tolist() for name, counts in self.categorical.items()},
+            'rows': self.rows.tolist(),
+            'unmatched': self.unmatched,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('version') != SKETCH_FORMAT_VERSION:
+            raise ValueError(f"Unsupported drift sketch version: {data.get('version')}")
+        edges = np.array(data['edges'], dtype=np.float64)
+        sketch = cls(data['groups'], np.where(np.isnan(edges), np.inf, edges), data['levels'])
+        sketch.numeric[:] = data['numeric']
+        for name, counts in data['categorical'].items():
+            sketch.categorical[name][:] = counts
+        sketch.rows[:] = data['rows']
+        sketch.unmatched = data['unmatched']
+        return sketch
+
+    def save(self, path):
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def psi(expected, actual):
+    """Population stability index between two histograms over the same bins."""
+    p = np.maximum(expected / max(expected.sum(), 1.0), PSI_EPSILON)
+    q = np.maximum(actual / max(actual.sum(), 1.0), PSI_EPSILON)
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+def binned_ks(expected, actual):
+    """Kolmogorov-Smirnov distance between two histograms, evaluated at the bin edges."""
+    p = np.cumsum(expected) / max(expected.sum(), 1.0)
+    q = np.cumsum(actual) / max(actual.sum(), 1.0)
+    return float(np.abs(p - q).max())
+
+
+def psi_status(value):
+    if value >= PSI_SIGNIFICANT:
+        return 'significant'
+    if value >= PSI_MODERATE:
+        return 'moderate'
+    return 'stable'
+
+
+def compare(reference, live, min_samples=200):
+    """PSI and KS of every feature per material, plus the material mix, as a JSON-ready dict."""
+    report = {
+        'samples': int(live.rows.sum()),
+        'unmatched': live.unmatched,
+        'material_mix': None,
+        'materials': {},
+        'drifted': [],
+    }
+    if live.rows.sum() >= min_samples:
+        value = psi(reference.rows, live.rows)
+        report['material_mix'] = {'psi': value, 'status': psi_status(value)}
+        if value >= PSI_MODERATE:
+            report['drifted'].append(GROUP_COLUMN)
+
+    for g, group in enumerate(reference.groups):
+        rows = int(live.rows[g])
+        entry = {'samples': rows, 'features': {}}
+        report['materials'][group] = entry
+        if rows < min_samples:
+            entry['status'] = 'insufficient_data'
+            continue
+        for f, feature in enumerate(NUMERIC_FEATURES):
+            value = psi(reference.numeric[g, f], live.numeric[g, f])
+            entry['features'][feature] = {
+                'psi': value,
+                'ks': binned_ks(reference.numeric[g, f], live.numeric[g, f]),
+                'status': psi_status(value),
+            }
+        for name in reference.categorical:
+            value = psi(reference.categorical[name][g], live.categorical[name][g])
+            entry['features'][name] = {'psi': value, 'ks': None, 'status': psi_status(value)}
+        drifted = [name for name, scores in entry['features'].items() if scores['status'] != 'stable']
+        entry['status'] = 'drift' if drifted else 'stable'
+        report['drifted'].extend(f'{group}/{name}' for name in drifted)
+    return report
+
+
+class DriftMonitor:
+    """Compare live /predict inputs with the training distribution in constant memory.
+
+    Requests only do a non-blocking put of their jobs onto a bounded queue
+    (dropped when full); a background thread drains it in batches into the
+    sketch of the current time window. Scores cover the current and the
+    previous window, merged, so memory is three sketches (reference and
+    two windows) however much traffic arrives.
+    """
+
+    def __init__(self, reference, window_seconds=3600.0, queue_size=1000, batch_size=2000,
+                 min_samples=200):
+        self.reference = reference
+        self.window_seconds = window_seconds
+        self.batch_size = batch_size
+        self.min_samples = min_samples
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._current = reference.empty_like()
+        self._previous = reference.empty_like()
+        self._window_start = time.time()
+        self.submitted = 0
+        self.dropped = 0
+        self._worker = threading.Thread(target=self._run, name='drift-monitor', daemon=True)
+        self._worker.start()
+
+    def submit(self, jobs):
+        """Queue a request's job dicts for the sketches; never blocks the caller."""
+        try:
+            self._queue.put_nowait(jobs)
+            self.submitted += len(jobs)
+        except queue.Full:
+            self.dropped += len(jobs)
+
+    def stop(self, timeout=5.0):
+        self._queue.put(None)
+        self._worker.join(timeout)
+
+    def drain(self, timeout=30.0):
+        """Wait until every queued job has been counted."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self._queue.unfinished_tasks
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            rows, taken = list(item), 1
+            while len(rows) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                taken += 1
+                if item is None:
+                    self._queue.put(None)
+                    break
+                rows.extend(item)
+            try:
+                frame = pd.DataFrame(rows)
+                with self._lock:
+                    self._rotate(time.time())
+                    self._current.update(frame)
+            except Exception as e:
+                logger.error("Drift sketch update failed: %s", str(e))
+            finally:
+                for _ in range(taken):
+                    self._queue.task_done()
+
+    def _rotate(self, now):
+        elapsed = now - self._window_start
+        if elapsed < self.window_seconds:
+            return
+        # After more than one idle window the previous window is empty too
+        self._previous = self._current if elapsed < 2 * self.window_seconds else self.reference.empty_like()
+        self._current = self.reference.empty_like()
+        self._window_start = now
+
+    def live_sketch(self):
+        """Merged sketch of the current and previous windows."""
+        with self._lock:
+            self._rotate(time.time())
+            return self._previous.copy().merge(self._current)
+
+    def report(self):
+        report = compare(self.reference, self.live_sketch(), self.min_samples)
+        report.update({
+            'window_seconds': self.window_seconds,
+            'submitted': self.submitted,
+            'dropped': self.dropped,
+            'sketch_bytes': 3 * self.reference.nbytes,
+        })
+        return report
+
+
+def reference_path(model_path):
+    """Where the reference sketch of a model is kept: next to it, as <name>.drift.json."""
+    return os.path.splitext(model_path)[0] + '.drift.json'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the drift reference sketch for a model from its training data.')
+    parser.add_argument('--data', help='training CSV, data/data.csv for the bundled model (default: regenerate the synthetic training data)')
+    default_model = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', 'models', 'printer_model.pkl'))
+    parser.add_argument('--output', default=reference_path(default_model))
+    parser.add_argument('--bins', type=int, default=DEFAULT_BINS)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.data:
+        df = pd.read_csv(args.data)
+    else:
+        import random
+
+        from train_model import generate_synthetic_data
+
+        random.seed(args.seed)
+        np.random.seed(args.seed)
+        df = generate_synthetic_data()
+    sketch = DriftSketch.from_frame(df, bins=args.bins)
+    sketch.save(args.output)
+    print(f"Saved drift reference of {int(sketch.rows.sum())} rows ({sketch.nbytes} bytes of counts) "
+          f"to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
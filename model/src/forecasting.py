@@ -0,0 +1,301 @@
+import datetime
+import threading
+import time
+
+import numpy as np
+
+from maintenance_rules import MATERIAL_PROPERTIES, calculate_wear_factor, maintenance_guides
+
+# Component groups from maintenance_guides, in column order
+COMPONENTS = ('nozzle', 'extruder', 'bed', 'mechanical')
+
+# Print hours at nominal stress before each component is due for maintenance
+COMPONENT_SERVICE_HOURS = np.array([400.0, 1200.0, 2500.0, 1500.0])
+
+# Checklist attached to forecast alerts for each component
+COMPONENT_MAINTENANCE_ITEMS = {
+    'nozzle': maintenance_guides['nozzle']['cleaning'],
+    'extruder': maintenance_guides['extruder']['maintenance'],
+    'bed': maintenance_guides['bed']['leveling'],
+    'mechanical': maintenance_guides['mechanical']['belts'],
+}
+
+SECONDS_PER_DAY = 86400.0
+
+# A wear rate is only estimated from at least two events this many days apart
+MIN_FIT_DAYS = 1.0
+
+
+def component_stress(params):
+    """Relative stress (about 0-1.5) a job puts on each component group."""
+    material_props = MATERIAL_PROPERTIES[params['material']]
+
+    nozzle = calculate_wear_factor(params)
+
+    # Extruder load grows with speed and with the volume pushed per layer
+    speed_ratio = params['print_speed'] / material_props['max_speed']
+    flow_ratio = params['layer_height'] / params.get('nozzle_diameter', 0.4)
+    extruder = min(1.5, speed_ratio * (0.5 + flow_ratio))
+
+    # Bed heater works harder the hotter and further from its optimal range
+    bed_min, bed_max = material_props['bed_temp_range']
+    bed_deviation = abs(params['bed_temperature'] - (bed_min + bed_max) / 2) / (bed_max - bed_min)
+    bed = min(1.5, params['bed_temperature'] / 110.0 + bed_deviation * 0.5)
+
+    # Belts and rails wear with absolute travel speed
+    mechanical = min(1.5, params['print_speed'] / 120.0)
+
+    return np.array([nozzle, extruder, bed, mechanical])
+
+
+def job_wear(params):
+    """Fraction of each component's service life consumed by one print job."""
+    hours = float(params.get('print_time', 1.0))
+    return (0.5 + component_stress(params)) * hours / COMPONENT_SERVICE_HOURS
+
+
+class ComponentForecaster:
+    """Remaining-useful-life forecaster for every printer and component.
+
+    Cumulative wear (1.0 = maintenance due) is tracked per printer and
+    component. The wear rate is an exponentially weighted least-squares fit
+    of wear against time, kept as five running sums so each event is an
+    O(1) update; the forgetting factor lets the rate follow changes in how
+    a printer is used. Until a component has two events at least
+    MIN_FIT_DAYS apart since it was last reset there is no rate and no
+    forecast. Fleet forecasts are computed from the sums for all printers
+    in one vectorized pass.
+    """
+
+    def __init__(self, forgetting=0.97, initial_capacity=1024):
+        self.forgetting = forgetting
+        self._index = {}
+        self._ids = []
+        self._lock = threading.Lock()
+        n = len(COMPONENTS)
+        self._origin = np.zeros(initial_capacity)
+        self._wear = np.zeros((initial_capacity, n))
+        # Timestamps of the first and latest event in each component's fit
+        self._first = np.full((initial_capacity, n), np.nan)
+        self._last = np.full((initial_capacity, n), np.nan)
+        # Weighted sums: weight, t, t*t, wear, t*wear (t in days since origin)
+        self._sums = np.zeros((5, initial_capacity, n))
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _slot(self, printer_id, timestamp):
+        slot = self._index.get(printer_id)
+        if slot is not None:
+            return slot
+        slot = len(self._ids)
+        if slot == len(self._origin):
+            self._grow()
+        self._index[printer_id] = slot
+        self._ids.append(printer_id)
+        self._origin[slot] = timestamp
+        return slot
+
+    def _grow(self):
+        capacity = len(self._origin) * 2
+        self._origin = np.resize(self._origin, capacity)
+        wear = np.zeros((capacity, len(COMPONENTS)))
+        for name in ('_first', '_last'):
+            times = np.full((capacity, len(COMPONENTS)), np.nan)
+            times[:len(self._wear)] = getattr(self, name)
+            setattr(self, name, times)
+        wear[:len(self._wear)] = self._wear
+        self._wear = wear
+        sums = np.zeros((5, capacity, len(COMPONENTS)))
+        sums[:, :self._sums.shape[1]] = self._sums
+        self._sums = sums
+
+    def observe(self, printer_id, params, timestamp=None):
+        """Record one print job for a printer."""
+        self.update(printer_id, job_wear(params), timestamp)
+
+    def update(self, printer_id, wear_increment, timestamp=None):
+        """Add a wear increment (one value per component) observed at `timestamp`."""
+        timestamp = time.time() if timestamp is None else float(timestamp)
+        with self._lock:
+            slot = self._slot(printer_id, timestamp)
+            self._apply(np.array([slot]), np.atleast_2d(wear_increment), np.array([timestamp]))
+
+    def update_batch(self, printer_ids, wear_increments, timestamps):
+        """Apply many events at once, in order; repeated printers are handled in rounds."""
+        wear_increments = np.asarray(wear_increments, dtype=np.float64)
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        with self._lock:
+            slots = np.array([self._slot(pid, ts) for pid, ts in zip(printer_ids, timestamps)])
+            remaining = np.arange(len(slots))
+            while len(remaining):
+                # The first occurrence of each printer goes in this round
+                _, first = np.unique(slots[remaining], return_index=True)
+                first.sort()
+                batch = remaining[first]
+                self._apply(slots[batch], wear_increments[batch], timestamps[batch])
+                remaining = np.delete(remaining, first)
+
+    def _apply(self, slots, increments, timestamps):
+        self._wear[slots] += increments
+        first = self._first[slots]
+        self._first[slots] = np.where(np.isnan(first), timestamps[:, None], first)
+        self._last[slots] = timestamps[:, None]
+        t = ((timestamps - self._origin[slots]) / SECONDS_PER_DAY)[:, None]
+        wear = self._wear[slots]
+        sums = self._sums[:, slots] * self.forgetting
+        sums[0] += 1.0
+        sums[1] += t
+        sums[2] += t * t
+        sums[3] += wear
+        sums[4] += t * wear
+        self._sums[:, slots] = sums
+
+    def reset(self, printer_id, component, timestamp=None):
+        """Mark maintenance done on one component: wear and its history restart at zero."""
+        column = COMPONENTS.index(component)
+        timestamp = time.time() if timestamp is None else float(timestamp)
+        with self._lock:
+            slot = self._slot(printer_id, timestamp)
+            self._wear[slot, column] = 0.0
+            self._first[slot, column] = self._last[slot, column] = np.nan
+            self._sums[:, slot, column] = 0.0
+
+    def printer_ids(self):
+        with self._lock:
+            return list(self._ids)
+
+    def export_printer(self, printer_id):
+        """A printer's wear ledger as plain lists (for moving it to another process), or None."""
+        with self._lock:
+            slot = self._index.get(printer_id)
+            if slot is None:
+                return None
+            return {
+                'origin': float(self._origin[slot]),
+                'wear': self._wear[slot].tolist(),
+                'first': self._first[slot].tolist(),
+                'last': self._last[slot].tolist(),
+                'sums': self._sums[:, slot].tolist(),
+            }
+
+    def import_printer(self, printer_id, state):
+        """Replace a printer's wear ledger with one produced by export_printer."""
+        with self._lock:
+            slot = self._slot(printer_id, state['origin'])
+            self._origin[slot] = state['origin']
+            self._wear[slot] = state['wear']
+            self._first[slot] = state['first']
+            self._last[slot] = state['last']
+            self._sums[:, slot] = state['sums']
+
+    def drop_printer(self, printer_id):
+        """Forget a printer; the last slot moves into its place so arrays stay dense."""
+        with self._lock:
+            slot = self._index.pop(printer_id, None)
+            if slot is None:
+                return False
+            last = len(self._ids) - 1
+            if slot != last:
+                moved = self._ids[last]
+                self._ids[slot] = moved
+                self._index[moved] = slot
+                self._origin[slot] = self._origin[last]
+                self._wear[slot] = self._wear[last]
+                self._first[slot] = self._first[last]
+                self._last[slot] = self._last[last]
+                self._sums[:, slot] = self._sums[:, last]
+            self._ids.pop()
+            self._wear[last] = 0.0
+            self._first[last] = self._last[last] = np.nan
+            self._sums[:, last] = 0.0
+            return True
+
+    def forecast(self):
+        """Forecast every printer at once.
+
+        Returns (printer_ids, wear, rate_per_day, days_remaining), with one
+        row per printer and one column per component. days_remaining is NaN
+        where there is not yet enough history to estimate a rate.
+        """
+        with self._lock:
+            n = len(self._ids)
+            ids = list(self._ids)
+            wear = self._wear[:n].copy()
+            sums = self._sums[:, :n].copy()
+            span = self._last[:n] - self._first[:n]
+
+        rate, days_remaining = _remaining_life(wear, sums, span)
+        return ids, wear, rate, days_remaining
+
+    def forecast_printer(self, printer_id, now=None):
+        """JSON-ready forecast for one printer, or None if it has never been seen."""
+        now = time.time() if now is None else float(now)
+        with self._lock:
+            slot = self._index.get(printer_id)
+            if slot is None:
+                return None
+            wear = self._wear[slot].copy()
+            sums = self._sums[:, slot].copy()
+            span = self._last[slot] - self._first[slot]
+
+        rate, days_remaining = _remaining_life(wear, sums, span)
+
+        return {
+            'printer_id': printer_id,
+            'components': {
+                component: component_forecast(wear[i], rate[i], days_remaining[i], now)
+                for i, component in enumerate(COMPONENTS)
+            }
+        }
+
+
+def _remaining_life(wear, sums, span):
+    """Wear rate per day and days until wear reaches 1.0, from the running sums.
+
+    `span` is the time in seconds between the first and latest event of
+    each fit; a fit spanning less than MIN_FIT_DAYS has no rate.
+    """
+    weight, st, stt, sw, stw = sums
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denominator = weight * stt - st * st
+        enough = (span >= MIN_FIT_DAYS * SECONDS_PER_DAY) & (denominator > 1e-12)
+        rate = np.where(enough, (weight * stw - st * sw) / denominator, np.nan)
+        rate = np.where(rate > 0, rate, np.nan)
+        days_remaining = np.maximum(0.0, 1.0 - wear) / rate
+    return rate, days_remaining
+
+
+def component_forecast(wear, rate, days_remaining, now):
+    """Format one component's forecast; unknown values become None."""
+    known = bool(np.isfinite(days_remaining))
+    due_date = None
+    if known:
+        due = now + min(days_remaining, 36500.0) * SECONDS_PER_DAY
+        due_date = datetime.datetime.fromtimestamp(due, datetime.timezone.utc).isoformat()
+    return {
+        'wear': float(wear),
+        'wear_rate_per_day': float(rate) if np.isfinite(rate) else None,
+        'days_remaining': float(days_remaining) if known else None,
+        'due_date': due_date,
+    }
+
+
+def forecast_alerts(forecast, horizon_days=7.0):
+    """Turn a printer forecast into alerts for components due within the horizon."""
+    alerts = []
+    for component, info in forecast['components'].items():
+        days = info['days_remaining']
+        if days is None or days > horizon_days:
+            continue
+        overdue = info['wear'] >= 1.0
+        alerts.append({
+            'type': 'critical' if overdue else 'warning',
+            'message': (f'{component.capitalize()} maintenance overdue' if overdue
+                        else f'{component.capitalize()} maintenance due in {days:.1f} days'),
+            'component': component.capitalize(),
+            'priority': 'critical' if overdue else 'medium',
+            'due_date': info['due_date'],
+            'maintenance_items': COMPONENT_MAINTENANCE_ITEMS[component]
+        })
+    return alerts
@@ -0,0 +1,238 @@
+import cProfile
+import glob
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from flask import Blueprint, Response, current_app, g, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+profiling_bp = Blueprint('profiling', __name__)
+
+# Threads that should not show up in sampled stacks (samplers, pollers, admin waits)
+_excluded_threads = set()
+
+
+def init_profiling(app):
+    """Register the profiling hooks and admin endpoints when PROFILING_ENABLED is set.
+
+    Nothing is registered otherwise, so a disabled profiling surface adds no
+    per-request work at all.
+    """
+    if not app.config.get('PROFILING_ENABLED'):
+        return False
+
+    profile_dir = app.config['PROFILING_DIR']
+    if not os.path.exists(profile_dir):
+        os.makedirs(profile_dir)
+
+    app.before_request(_start_request_profile)
+    app.after_request(_finish_request_profile)
+    app.teardown_request(_abort_request_profile)
+    app.register_blueprint(profiling_bp)
+    SampleRequestWatcher(profile_dir).start()
+    logger.warning("Profiling surface enabled; profiles are written to %s", profile_dir)
+    return True
+
+
+def _profile_requested():
+    """Whether to profile this request: asked for with the admin token, which must be configured."""
+    if request.headers.get('X-Profile') != '1' and request.args.get('profile') != '1':
+        return False
+    token = current_app.config.get('PROFILING_ADMIN_TOKEN')
+    return bool(token) and request.headers.get('X-Admin-Token') == token
+
+
+def _start_request_profile():
+    if _profile_requested():
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def _finish_request_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    profiler.disable()
+    profile_id = f'{int(time.time() * 1000)}-{os.getpid()}-{uuid.uuid4().hex[:8]}'
+    profile_dir = current_app.config['PROFILING_DIR']
+    profiler.dump_stats(os.path.join(profile_dir, f'{profile_id}.prof'))
+    prune_profiles(profile_dir, current_app.config['PROFILING_MAX_PROFILES'])
+    response.headers['X-Profile-Id'] = profile_id
+    return response
+
+
+def prune_profiles(profile_dir, keep):
+    """Delete all but the `keep` newest per-request profiles."""
+    paths = glob.glob(os.path.join(profile_dir, '*.prof'))
+    if len(paths) <= keep:
+        return 0
+    removed = 0
+    for path in sorted(paths, key=os.path.basename)[:len(paths) - keep]:
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass  # another worker pruned it first
+    return removed
+
+
+def _abort_request_profile(exc):
+    # after_request is skipped on unhandled errors; never leave a profiler running
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+
+
+def _admin_authorized():
+    token = current_app.config.get('PROFILING_ADMIN_TOKEN')
+    return not token or request.headers.get('X-Admin-Token') == token
+
+
+@profiling_bp.route('/admin/profiles/<profile_id>', methods=['GET'])
+def get_request_profile(profile_id):
+    """Return a captured per-request cProfile as text (or the raw .prof with ?format=raw)."""
+    if not _admin_authorized():
+        return jsonify({'status': 'error', 'error': 'Unauthorized'}), 401
+    path = os.path.join(current_app.config['PROFILING_DIR'], f'{os.path.basename(profile_id)}.prof')
+    if not os.path.exists(path):
+        return jsonify({'status': 'error', 'error': f'Unknown profile: {profile_id}'}), 404
+
+    if request.args.get('format') == 'raw':
+        with open(path, 'rb') as f:
+            return Response(f.read(), mimetype='application/octet-stream')
+
+    sort = request.args.get('sort', 'cumulative')
+    try:
+        limit = int(request.args.get('limit', 40))
+        if limit < 0 or sort not in pstats.Stats.sort_arg_dict_default:
+            raise ValueError(sort)
+    except ValueError:
+        return jsonify({
+            'status': 'error',
+            'error': f"limit must be a non-negative integer and sort one of: "
+                     f"{', '.join(sorted(pstats.Stats.sort_arg_dict_default))}"
+        }), 400
+
+    output = io.StringIO()
+    stats = pstats.Stats(path, stream=output)
+    stats.sort_stats(sort)
+    stats.print_stats(limit)
+    return Response(output.getvalue(), mimetype='text/plain')
+
+
+@profiling_bp.route('/admin/profile/sample', methods=['POST'])
+def sample_workers():
+    """Sample stacks in every worker for N seconds and return collapsed stacks.
+
+    The output is one `frame;frame;frame count` line per distinct stack,
+    ready for flamegraph.pl or speedscope.
+    """
+    if not _admin_authorized():
+        return jsonify({'status': 'error', 'error': 'Unauthorized'}), 401
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = float(request.args.get('interval', 0.005))
+    except ValueError:
+        return jsonify({'status': 'error', 'error': 'seconds and interval must be numbers'}), 400
+    seconds = max(0.1, min(seconds, current_app.config['PROFILING_MAX_SECONDS']))
+    interval = max(0.001, interval)
+
+    profile_dir = current_app.config['PROFILING_DIR']
+    capture_id = uuid.uuid4().hex
+    request_path = os.path.join(profile_dir, f'sample-{capture_id}.request')
+    with open(request_path + '.tmp', 'w') as f:
+        json.dump({'seconds': seconds, 'interval': interval}, f)
+    os.replace(request_path + '.tmp', request_path)
+
+    # Every worker's watcher (including this one's) picks up the request file
+    _excluded_threads.add(threading.get_ident())
+    try:
+        time.sleep(seconds + 2 * SampleRequestWatcher.poll_interval + 0.5)
+    finally:
+        _excluded_threads.discard(threading.get_ident())
+
+    merged = Counter()
+    partials = glob.glob(os.path.join(profile_dir, f'sample-{capture_id}.*.folded'))
+    for path in partials:
+        with open(path) as f:
+            for line in f:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack:
+                    merged[stack] += int(count)
+        os.remove(path)
+    os.remove(request_path)
+
+    body = ''.join(f'{stack} {count}\n' for stack, count in merged.most_common())
+    response = Response(body, mimetype='text/plain')
+    response.headers['X-Profile-Workers'] = str(len(partials))
+    return response
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+def sample_stacks(seconds, interval=0.005):
+    """Sample every other thread's Python stack and count collapsed stacks."""
+    counts = Counter()
+    own = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own or thread_id in _excluded_threads:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            counts[';'.join(reversed(stack))] += 1
+        time.sleep(interval)
+    return counts
+
+
+class SampleRequestWatcher(threading.Thread):
+    """Per-worker thread that runs sampling captures requested through PROFILING_DIR.
+
+    Any worker can receive the admin request, so the request is published as
+    a file; each worker samples itself and writes its own partial result.
+    """
+
+    poll_interval = 0.5
+
+    def __init__(self, profile_dir):
+        super().__init__(name='profile-sample-watcher', daemon=True)
+        self.profile_dir = profile_dir
+        self._handled = set()
+
+    def run(self):
+        _excluded_threads.add(threading.get_ident())
+        while True:
+            try:
+                self._poll()
+            except Exception as e:
+                logger.error("Sampling capture failed: %s", str(e))
+            time.sleep(self.poll_interval)
+
+    def _poll(self):
+        for path in glob.glob(os.path.join(self.profile_dir, 'sample-*.request')):
+            capture_id = os.path.basename(path)[len('sample-'):-len('.request')]
+            if capture_id in self._handled:
+                continue
+            self._handled.add(capture_id)
+            with open(path) as f:
+                spec = json.load(f)
+            counts = sample_stacks(spec['seconds'], spec['interval'])
+            partial = os.path.join(self.profile_dir, f'sample-{capture_id}.{os.getpid()}.folded')
+            with open(partial + '.tmp', 'w') as f:
+                f.writelines(f'{stack} {count}\n' for stack, count in counts.items())
+            os.replace(partial + '.tmp', partial)
@@ -0,0 +1,216 @@
+import json
+import threading
+import time
+from collections import deque
+
+# Sent first to a subscriber whose queue overflowed: events were dropped,
+# so the client should refetch its state over the REST endpoints
+RESYNC_EVENT = 'event: resync\ndata: {}\n\n'
+HEARTBEAT = ': keepalive\n\n'
+
+
+def format_event(event_id, event_type, data):
+    """Encode one Server-Sent Event."""
+    return f'id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+def health_snapshot(forecast):
+    """Health summary pushed to the dashboard from a forecaster.forecast_printer() result.
+
+    Values are rounded to what the dashboard displays so that small
+    changes do not produce a stream of deltas.
+    """
+    components = {}
+    worst = 0.0
+    for component, info in forecast['components'].items():
+        worst = max(worst, info['wear'])
+        days = info['days_remaining']
+        components[component] = {
+            'wear': round(info['wear'], 3),
+            'days_remaining': round(days, 1) if days is not None else None,
+            'due_date': info['due_date'][:10] if info['due_date'] else None,
+        }
+    return {
+        'health_score': round(100.0 * (1.0 - min(max(worst, 0.0), 1.0)), 1),
+        'components': components,
+    }
+
+
+def _changes(old, new):
+    """The parts of `new` that differ from `old`, recursing into nested dicts."""
+    delta = {}
+    for key, value in new.items():
+        previous = old.get(key)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            nested = _changes(previous, value)
+            if nested:
+                delta[key] = nested
+        elif value != previous:
+            delta[key] = value
+    return delta
+
+
+class Subscription:
+    """A subscriber's bounded event queue.
+
+    The hub never waits for a subscriber: when the queue is full the oldest
+    event is dropped and the subscriber gets a resync event before the rest.
+    """
+
+    def __init__(self, printer_ids, queue_size):
+        self.printer_ids = printer_ids
+        self.queue_size = queue_size
+        self.dropped = 0
+        self.closed = False
+        self._queue = deque()
+        self._lagged = False
+        self._condition = threading.Condition(threading.Lock())
+
+    def offer(self, message):
+        """Queue a message; returns whether an older one had to be dropped for it."""
+        with self._condition:
+            if self.closed:
+                return False
+            dropped = len(self._queue) >= self.queue_size
+            if dropped:
+                self._queue.popleft()
+                self.dropped += 1
+                self._lagged = True
+            self._queue.append(message)
+            self._condition.notify()
+        return dropped
+
+    def get(self, timeout=None):
+        """Wait up to `timeout` seconds for events and return everything queued (empty on timeout)."""
+        with self._condition:
+            if not self._queue and not self.closed:
+                self._condition.wait(timeout)
+            messages = list(self._queue)
+            self._queue.clear()
+            lagged, self._lagged = self._lagged, False
+        if lagged:
+            messages.insert(0, RESYNC_EVENT)
+        return messages
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify()
+
+
+class PushHub:
+    """Fan-out of alert and health events to streaming subscribers.
+
+    Subscribers follow a set of printers (or every printer). Each event is
+    encoded once and appended to the bounded queue of every interested
+    subscriber, so publishing costs O(subscribers of that printer) and never
+    blocks on a slow client. The hub also remembers the last health
+    snapshot of every printer: health updates are pushed as deltas, and a
+    new subscriber first receives the current snapshot of its printers.
+    """
+
+    def __init__(self, queue_size=256, max_subscribers=10000):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._by_printer = {}
+        self._everyone = set()
+        self._health = {}
+        self._count = 0
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self._count
+
+    def subscribe(self, printer_ids=None):
+        """Register a subscriber for `printer_ids` (None for all printers); None if the hub is full."""
+        printer_ids = frozenset(printer_ids) if printer_ids is not None else None
+        subscription = Subscription(printer_ids, self.queue_size)
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                return None
+            self._count += 1
+            if printer_ids is None:
+                self._everyone.add(subscription)
+            else:
+                for printer_id in printer_ids:
+                    self._by_printer.setdefault(printer_id, set()).add(subscription)
+                    health = self._health.get(printer_id)
+                    if health is not None:
+                        subscription.offer(self._encode('health', {'printer_id': printer_id, **health}))
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.close()
+        with self._lock:
+            if subscription.printer_ids is None:
+                if subscription not in self._everyone:
+                    return
+                self._everyone.discard(subscription)
+            else:
+                found = False
+                for printer_id in subscription.printer_ids:
+                    subscribers = self._by_printer.get(printer_id)
+                    if subscribers is not None and subscription in subscribers:
+                        found = True
+                        subscribers.discard(subscription)
+                        if not subscribers:
+                            del self._by_printer[printer_id]
+                if not found:
+                    return
+            self._count -= 1
+
+    def _encode(self, event_type, data):
+        self._next_id += 1
+        return format_event(self._next_id, event_type, data)
+
+    def _fan_out(self, printer_id, event_type, data):
+        # Called with the lock held, which keeps every subscriber's events in publish order
+        subscribers = self._by_printer.get(printer_id, ())
+        if not subscribers and not self._everyone:
+            return 0
+        message = self._encode(event_type, data)
+        for subscription in subscribers:
+            self.dropped += subscription.offer(message)
+        for subscription in self._everyone:
+            self.dropped += subscription.offer(message)
+        self.published += 1
+        self.delivered += len(subscribers) + len(self._everyone)
+        return len(subscribers) + len(self._everyone)
+
+    def publish(self, printer_id, event_type, data):
+        """Push an event about a printer; returns the number of subscribers it was queued for."""
+        data = {'printer_id': printer_id, 'published_at': time.time(), **data}
+        with self._lock:
+            return self._fan_out(printer_id, event_type, data)
+
+    def publish_alerts(self, printer_id, alerts):
+        """Push alert dicts (new, repeated or updated) as `alert` events."""
+        with self._lock:
+            for alert in alerts:
+                self._fan_out(printer_id, 'alert', {'published_at': time.time(), **alert})
+
+    def publish_health(self, printer_id, health):
+        """Record a printer's health snapshot and push what changed since the last one."""
+        with self._lock:
+            previous = self._health.get(printer_id)
+            self._health[printer_id] = health
+            delta = health if previous is None else _changes(previous, health)
+            if not delta:
+                return 0
+            return self._fan_out(printer_id, 'health', {
+                'printer_id': printer_id, 'published_at': time.time(), **delta
+            })
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': self._count,
+                'printers_followed': len(self._by_printer),
+                'published': self.published,
+                'delivered': self.delivered,
+                'dropped': self.dropped,
+            }
@@ -0,0 +1,154 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class MemoryBucketStorage:
+    """Token buckets held in this process only; fastest, but not shared between workers."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, cost, capacity, refill_rate, now):
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+        return allowed, tokens
+
+    def expire(self, before):
+        """Drop buckets last used before `before`; returns how many were dropped."""
+        with self._lock:
+            stale = [key for key, (_, updated) in self._buckets.items() if updated < before]
+            for key in stale:
+                del self._buckets[key]
+        return len(stale)
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteBucketStorage:
+    """Token buckets in a SQLite file shared by every worker on the host.
+
+    Each consume is one short write transaction; WAL mode with relaxed
+    syncing keeps that in the tens of microseconds. Losing bucket state on
+    a crash only means clients get a fresh burst, so durability is not
+    needed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS buckets ('
+            'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+        )
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            self._local.connection = connection
+        return connection
+
+    def consume(self, key, cost, capacity, refill_rate, now):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT tokens, updated FROM buckets WHERE key = ?', (key,)
+            ).fetchone()
+            tokens, updated = row if row is not None else (capacity, now)
+            tokens = min(capacity, tokens + max(0.0, now - updated) * refill_rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            connection.execute(
+                'INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated',
+                (key, tokens, now)
+            )
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return allowed, tokens
+
+    def expire(self, before):
+        """Drop buckets last used before `before`; returns how many were dropped."""
+        return self._connection().execute('DELETE FROM buckets WHERE updated < ?', (before,)).rowcount
+
+    def reset(self):
+        self._connection().execute('DELETE FROM buckets')
+
+
+def create_storage(uri):
+    """Create bucket storage from a URI: 'memory://' or 'sqlite:///path/to/file.db'."""
+    if uri == 'memory://':
+        return MemoryBucketStorage()
+    if uri.startswith('sqlite:///'):
+        path = uri[len('sqlite:///'):]
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        return SQLiteBucketStorage(path)
+    raise ValueError(f"Unsupported rate limit storage: {uri}")
+
+
+class TokenBucketLimiter:
+    """Token-bucket rate limiter keyed on API key or client address.
+
+    Every key gets a bucket of `capacity` tokens refilled at `refill_rate`
+    tokens per second; a request consumes one token per scored row, at
+    most a full bucket. `overrides` maps individual keys to their own
+    (capacity, refill_rate) and `printer_limit` is the (capacity,
+    refill_rate) of per-printer buckets, passed to consume() as `limit`.
+    A bucket left idle long enough to refill completely is the same as a
+    new one, so such buckets are deleted every `expire_interval` seconds.
+    """
+
+    def __init__(self, storage, capacity, refill_rate, overrides=None, printer_limit=None, expire_interval=60.0):
+        self.storage = storage
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.overrides = overrides or {}
+        self.printer_limit = printer_limit
+        self.expire_interval = expire_interval
+        limits = [(capacity, refill_rate), *self.overrides.values()]
+        if printer_limit is not None:
+            limits.append(printer_limit)
+        self.idle_seconds = max(c / r if r > 0 else float('inf') for c, r in limits)
+        self._next_expiry = time.time() + expire_interval
+
+    def consume(self, key, cost=1, limit=None):
+        """Try to take `cost` tokens from the bucket for `key`.
+
+        `limit` is the bucket's (capacity, refill_rate) if not the default
+        or an override. A cost above the capacity is charged as a full
+        bucket, so any request can pass once the bucket has refilled.
+        Returns (allowed, remaining, retry_after) where retry_after is the
+        number of seconds until enough tokens are available, or None when
+        the bucket never refills.
+        """
+        now = time.time()
+        if now >= self._next_expiry and self.idle_seconds != float('inf'):
+            self._next_expiry = now + self.expire_interval
+            self.storage.expire(now - self.idle_seconds)
+        capacity, refill_rate = limit or self.overrides.get(key, (self.capacity, self.refill_rate))
+        cost = min(cost, capacity)
+        allowed, remaining = self.storage.consume(key, cost, capacity, refill_rate, now)
+        if allowed:
+            return True, remaining, 0.0
+        if refill_rate <= 0:
+            return False, remaining, None
+        return False, remaining, (cost - remaining) / refill_rate
@@ -0,0 +1,319 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from dataset_cache import file_sha256
+from maintenance_rules import MATERIAL_PROPERTIES, analyze_thermal_stress, calculate_wear_factor
+
+SURFACE_FORMAT_VERSION = 1
+
+MATERIALS = ('ABS', 'PETG', 'PLA', 'TPU')
+INFILL_PATTERNS = ('grid', 'honeycomb', 'lines', 'triangles')
+
+# Numeric inputs in grid order, with the default number of evenly spread
+# grid points per axis (rule breakpoints add more). Layer height and print
+# speed get the most: they account for most of the interpolation error, and
+# tripling any other axis barely moves it
+AXES = ('layer_height', 'wall_thickness', 'infill_density', 'nozzle_temperature',
+        'bed_temperature', 'print_speed', 'fan_speed')
+DEFAULT_POINTS = (6, 2, 2, 5, 3, 12, 2)
+
+# Values stored at every grid point
+OUTPUTS = ('wear_factor', 'thermal_stress', 'maintenance_probability')
+
+# How a rule changes at a breakpoint: a penalty below it (x < b), above it
+# (x > b), or a change of slope
+BELOW, ABOVE, KINK = 'below', 'above', 'kink'
+
+
+def axis_bounds(material):
+    """Grid bounds for each axis: the ranges the model was trained on for this material."""
+    props = MATERIAL_PROPERTIES[material]
+    return [
+        (0.1, 0.4),
+        (0.4, 2.0),
+        (0.0, 100.0),
+        tuple(props['temp_range']),
+        tuple(props['bed_temp_range']),
+        (10.0, props['max_speed'] * 1.2),
+        (0.0, 100.0),
+    ]
+
+
+def rule_breakpoints(material):
+    """Where calculate_wear_factor and analyze_thermal_stress jump or change slope, per axis."""
+    props = MATERIAL_PROPERTIES[material]
+    temp_min, temp_max = props['temp_range']
+    bed_min, bed_max = props['bed_temp_range']
+    layer_min, layer_max = props['typical_layer_height']
+    wall_min, wall_max = props['optimal_wall_thickness']
+    fan_min, fan_max = props['fan_speed_range']
+    return [
+        [(layer_min, BELOW), (layer_max, ABOVE)],
+        [(wall_min, BELOW), (wall_max, ABOVE)],
+        [(15.0, BELOW), (80.0, ABOVE)],
+        [((temp_min + temp_max) / 2, KINK)],
+        [((bed_min + bed_max) / 2, KINK)],
+        [(props['max_speed'] / 1.2, KINK), (0.9 * props['max_speed'], ABOVE)],
+        [(fan_min, BELOW), (fan_max, ABOVE)],
+    ]
+
+
+def axis_knots(material, points):
+    """Sorted grid coordinates per axis: bounds, evenly spread points and rule breakpoints.
+
+    A jump gets a second knot just on its penalized side, so interpolation
+    only blurs it over a negligible width.
+    """
+    knots = []
+    for (low, high), breaks, count in zip(axis_bounds(material), rule_breakpoints(material), points):
+        epsilon = (high - low) * 1e-6
+        values = set(np.linspace(low, high, max(count, 2)).tolist())
+        for b, kind in breaks:
+            if low < b < high:
+                values.add(b)
+                if kind == BELOW:
+                    values.add(b - epsilon)
+                elif kind == ABOVE:
+                    values.add(b + epsilon)
+        knots.append(np.array(sorted(values)))
+    return knots
+
+
+def _pad_knots(knots, count):
+    """Add points in the widest gaps until an axis has `count` knots."""
+    knots = list(knots)
+    while len(knots) < count:
+        gaps = np.diff(knots)
+        i = int(np.argmax(gaps))
+        knots.insert(i + 1, knots[i] + gaps[i] / 2)
+    return np.array(knots)
+
+
+def exact_scores(model, frame):
+    """Rule scores and model probability for every row of a DataFrame of jobs."""
+    records = frame.to_dict(orient='records')
+    scores = np.empty((len(frame), len(OUTPUTS)))
+    scores[:, 0] = [calculate_wear_factor(job) for job in records]
+    scores[:, 1] = [analyze_thermal_stress(job, MATERIAL_PROPERTIES[job['material']]) for job in records]
+    scores[:, 2] = model.predict_proba(frame[list(model.feature_names_in_)])[:, 1]
+    return scores
+
+
+def build_surface(model, points=DEFAULT_POINTS, error_samples=20000, seed=42):
+    """Evaluate the rules and the model on a dense grid per material and infill pattern.
+
+    Returns (table, knots, meta). The table has shape
+    (materials, patterns, *points, outputs); knots[a] holds the grid
+    coordinates of axis a for each material, shape (materials, points[a]).
+    The interpolation error is measured on random jobs inside the grid and
+    stored in meta.
+    """
+    per_material = [axis_knots(material, points) for material in MATERIALS]
+    counts = [max(len(k[a]) for k in per_material) for a in range(len(AXES))]
+    knots = [np.array([_pad_knots(k[a], counts[a]) for k in per_material]) for a in range(len(AXES))]
+    table = np.empty((len(MATERIALS), len(INFILL_PATTERNS)) + tuple(counts) + (len(OUTPUTS),),
+                     dtype=np.float32)
+
+    for m, material in enumerate(MATERIALS):
+        grid = np.array(list(itertools.product(*(axis[m] for axis in knots))))
+        for p, pattern in enumerate(INFILL_PATTERNS):
+            frame = pd.DataFrame(grid, columns=AXES)
+            frame['material'] = material
+            frame['infill_pattern'] = pattern
+            table[m, p] = exact_scores(model, frame).reshape(tuple(counts) + (len(OUTPUTS),))
+
+    meta = {
+        'version': SURFACE_FORMAT_VERSION,
+        'materials': list(MATERIALS),
+        'infill_patterns': list(INFILL_PATTERNS),
+        'axes': list(AXES),
+        'points': counts,
+        'outputs': list(OUTPUTS),
+    }
+    surface = ResponseSurface(table, knots, meta)
+    meta['error'] = surface.measure_error(model, error_samples, seed)
+    return table, knots, meta
+
+
+class ResponseSurface:
+    """Precomputed rule scores and model probabilities, answered by multilinear interpolation.
+
+    Each lookup reads the 2**7 grid corners around a job and blends them,
+    so its cost does not depend on the model. Jobs outside the grid
+    (unknown material or pattern, or a value outside the bounds) are
+    reported as such for the caller to score exactly. The error measured
+    against exact scoring when the surface was built is kept in
+    meta['error']; tree models are step functions, so the probability
+    error is largest next to their splits.
+    """
+
+    def __init__(self, table, knots, meta):
+        self.table = table
+        self.knots = knots
+        self.meta = meta
+        self.points = np.array(meta['points'])
+        self.material_index = {name: i for i, name in enumerate(meta['materials'])}
+        self.pattern_index = {name: i for i, name in enumerate(meta['infill_patterns'])}
+
+        n_outputs = table.shape[-1]
+        shape = table.shape[:-1]
+        # One contiguous array per output: gathering from these is much
+        # faster than gathering rows of the interleaved table
+        self._columns = [np.ascontiguousarray(table[..., k]).ravel() for k in range(n_outputs)]
+        # Element strides of (material, pattern, axis...) in the flattened table
+        strides = np.cumprod((1,) + shape[::-1])[::-1][1:]
+        self._block = strides[1]
+        self._material_stride = strides[0]
+        self._axis_strides = strides[2:]
+        self._corners = np.array(list(itertools.product((0, 1), repeat=len(self.points))), dtype=bool)
+        self._corner_offsets = self._corners.astype(np.int64) @ self._axis_strides
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            if meta.get('version') != SURFACE_FORMAT_VERSION:
+                raise ValueError(f"Unsupported response surface version: {meta.get('version')}")
+            knots = [data[f'knots_{axis}'] for axis in meta['axes']]
+            return cls(data['table'], knots, meta)
+
+    def save(self, path):
+        knots = {f'knots_{axis}': values for axis, values in zip(self.meta['axes'], self.knots)}
+        np.savez(path, table=self.table, meta=np.array(json.dumps(self.meta)), **knots)
+
+    @property
+    def max_error(self):
+        return {name: stats['max'] for name, stats in self.meta.get('error', {}).items()}
+
+    def check(self, model_sha256, max_error):
+        """Raise ValueError unless the surface was built from this model and is within the error budget.
+
+        `max_error` maps outputs to the largest measured error allowed.
+        """
+        if self.meta.get('model_sha256') != model_sha256:
+            raise ValueError(f"Response surface was built from a different model ({self.meta.get('model')})")
+        measured = self.max_error
+        over = [name for name, budget in max_error.items() if measured.get(name, np.inf) > budget]
+        if over:
+            raise ValueError('Response surface error over budget: ' + ', '.join(
+                f'{name} {measured.get(name)} > {max_error[name]}' for name in over))
+
+    def interpolate(self, materials, patterns, values):
+        """Interpolate outputs for arrays of material index, pattern index and axis values.
+
+        Returns (outputs, inside); rows where `inside` is False hold NaN.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        n = len(values)
+        base = np.zeros((n, len(self.knots)), dtype=np.int64)
+        fraction = np.zeros((n, len(self.knots)))
+        inside = np.ones(n, dtype=bool)
+        for a, knots in enumerate(self.knots):
+            for m in np.unique(materials):
+                rows = np.flatnonzero(materials == m)
+                axis = knots[m]
+                x = values[rows, a]
+                inside[rows] &= (x >= axis[0]) & (x <= axis[-1])
+                i = np.clip(np.searchsorted(axis, x, side='right') - 1, 0, len(axis) - 2)
+                base[rows, a] = i
+                fraction[rows, a] = np.clip((x - axis[i]) / (axis[i + 1] - axis[i]), 0.0, 1.0)
+
+        start = (materials * self._material_stride + patterns * self._block
+                 + base @ self._axis_strides)
+        # Corner weights, built one axis at a time in the same order as the corner offsets
+        weights = np.ones((n, 1))
+        for a in range(fraction.shape[1]):
+            f = fraction[:, a:a + 1]
+            weights = np.stack([weights * (1.0 - f), weights * f], axis=2).reshape(n, -1)
+        corners = start[:, None] + self._corner_offsets[None, :]
+        outputs = np.column_stack([(weights * np.take(column, corners)).sum(axis=1) for column in self._columns])
+        outputs[~inside] = np.nan
+        return outputs, inside
+
+    def lookup(self, jobs):
+        """Interpolated (wear_factor, thermal_stress, maintenance_probability) for a list of job dicts."""
+        n = len(jobs)
+        materials = np.zeros(n, dtype=np.int64)
+        patterns = np.zeros(n, dtype=np.int64)
+        known = np.ones(n, dtype=bool)
+        values = np.zeros((n, len(AXES)))
+        for i, job in enumerate(jobs):
+            material = self.material_index.get(job.get('material'))
+            pattern = self.pattern_index.get(job.get('infill_pattern'))
+            try:
+                values[i] = [float(job[axis]) for axis in AXES]
+            except (KeyError, TypeError, ValueError):
+                material = None
+            if material is None or pattern is None:
+                known[i] = False
+                continue
+            materials[i], patterns[i] = material, pattern
+
+        outputs, inside = self.interpolate(materials, patterns, values)
+        inside &= known
+        outputs[~inside] = np.nan
+        return outputs, inside
+
+    def measure_error(self, model, samples=20000, seed=42):
+        """Interpolation error against exact scoring on random jobs inside the grid, per output."""
+        rng = np.random.default_rng(seed)
+        materials = rng.integers(0, len(self.material_index), samples)
+        patterns = rng.integers(0, len(self.pattern_index), samples)
+        low = np.column_stack([knots[materials, 0] for knots in self.knots])
+        high = np.column_stack([knots[materials, -1] for knots in self.knots])
+        values = low + rng.random((samples, len(AXES))) * (high - low)
+        approximate, _ = self.interpolate(materials, patterns, values)
+
+        frame = pd.DataFrame(values, columns=AXES)
+        frame['material'] = np.array(self.meta['materials'])[materials]
+        frame['infill_pattern'] = np.array(self.meta['infill_patterns'])[patterns]
+        error = np.abs(approximate - exact_scores(model, frame))
+        return {
+            name: {
+                'max': float(error[:, i].max()),
+                'p99': float(np.percentile(error[:, i], 99)),
+                'mean': float(error[:, i].mean()),
+            }
+            for i, name in enumerate(self.meta['outputs'])
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute the response surface used by PREDICTION_MODE=surface.')
+    parser.add_argument('--model', default=os.path.join(os.path.dirname(__file__), '..', 'models', 'printer_model.pkl'))
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(__file__), '..', 'models', 'response_surface.npz'))
+    parser.add_argument('--points', type=int, nargs=len(AXES), default=DEFAULT_POINTS, metavar='N',
+                        help=f"minimum grid points per axis ({', '.join(AXES)})")
+    parser.add_argument('--error-samples', type=int, default=20000)
+    args = parser.parse_args()
+
+    from compact_model import load_artifact
+    from config import Config
+
+    model = load_artifact(args.model)
+    table, knots, meta = build_surface(model, args.points, args.error_samples)
+    # The API only serves a surface built from the model file it loaded
+    meta['model'] = os.path.basename(args.model)
+    meta['model_sha256'] = file_sha256(args.model)
+    surface = ResponseSurface(table, knots, meta)
+    for name, stats in meta['error'].items():
+        print(f"  {name:<24} max error {stats['max']:.4f}  p99 {stats['p99']:.4f}  mean {stats['mean']:.4f}")
+    try:
+        surface.check(meta['model_sha256'], Config.RESPONSE_SURFACE_MAX_ERROR)
+    except ValueError as e:
+        print(f"Not saved: {e}; use more --points")
+        return 1
+    surface.save(args.output)
+    print(f"Saved {table.size // len(OUTPUTS)} grid points to {args.output} "
+          f"({os.path.getsize(args.output) / 1e6:.1f} MB)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,428 @@
+from flask import Flask, Response, request, jsonify
+from flask_cors import CORS
+import heapq
+import http.client
+import itertools
+import json
+import math
+import logging
+import re
+import traceback
+import urllib.parse
+from config import Config
+from sharding import ShardCluster, ShardError
+
+# Thin routing layer in front of several API processes (shards), each holding
+# the per-printer state (wear ledgers, alerts, telemetry) of the printers the
+# consistent-hash ring assigns to it. Run with SHARD_BACKENDS set, e.g.
+#   SHARD_BACKENDS=shard-0=http://127.0.0.1:5101,shard-1=http://127.0.0.1:5102 \
+#       gunicorn -w 1 --threads 64 router:app
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+app = Flask(__name__)
+app.config.from_object(Config)
+CORS(app, resources={r"/*": {"origins": "*"}})
+
+# Request headers passed on to the shards
+FORWARDED_HEADERS = ('Content-Type', 'Accept', 'X-API-Key')
+
+def parse_backends(value):
+    """SHARD_BACKENDS as {name: url}; entries are name=url or a bare url (named shard-<i>)."""
+    backends = {}
+    for i, entry in enumerate(e.strip() for e in value.split(',') if e.strip()):
+        name, _, url = entry.rpartition('=') if '=' in entry else ('', '', entry)
+        backends[name or f'shard-{i}'] = url
+    return backends
+
+cluster = ShardCluster(
+    parse_backends(app.config['SHARD_BACKENDS']),
+    vnodes=app.config['SHARD_VNODES'],
+    timeout=app.config['SHARD_TIMEOUT'],
+    admin_token=app.config['SHARD_ADMIN_TOKEN'],
+    batch_size=app.config['SHARD_MIGRATION_BATCH']
+)
+logger.info("Routing to %d shards: %s", len(cluster.ring), ', '.join(cluster.ring.nodes))
+
+def shard_unavailable(node, error):
+    logger.error("Shard %s unavailable: %s", node, str(error))
+    return jsonify({'status': 'error', 'error': f'Shard {node} unavailable'}), 502
+
+def forwarded_path():
+    path = urllib.parse.quote(request.path)
+    query = request.query_string.decode()
+    return f'{path}?{query}' if query else path
+
+def forward_headers():
+    """Headers for a shard request made on behalf of the current request."""
+    headers = {name: request.headers[name] for name in FORWARDED_HEADERS if name in request.headers}
+    # Append the client address; shards with TRUSTED_PROXY_HOPS=1 read the last entry
+    chain = request.headers.get('X-Forwarded-For')
+    client = request.remote_addr or ''
+    headers['X-Forwarded-For'] = f'{chain}, {client}' if chain else client
+    return headers
+
+def send(node, path=None, body=None):
+    """Send the current request (or `body` instead of its own) to a shard; returns (status, headers, body)."""
+    data = request.get_data() if body is None else body
+    return cluster.clients[node].request(request.method, path or forwarded_path(), data or None, forward_headers())
+
+def relay(status, headers, body):
+    response = Response(body, status)
+    for name, value in headers:
+        if name.lower() in ('content-type', 'retry-after'):
+            response.headers[name] = value
+    return response
+
+def forward(node):
+    """Relay the current request to a shard unchanged."""
+    try:
+        return relay(*send(node))
+    except (OSError, http.client.HTTPException) as e:
+        return shard_unavailable(node, e)
+
+def request_printer_id():
+    """The request body's printer_id; ValueError if it is present but not a string."""
+    data = request.get_json(silent=True)
+    printer_id = data.get('printer_id') if isinstance(data, dict) else None
+    if printer_id is not None and not isinstance(printer_id, str):
+        raise ValueError("printer_id must be a string")
+    return printer_id
+
+def forward_for_printer(printer_id):
+    """Forward to the printer's shard (any shard without a printer ID) while holding its lease."""
+    printer_ids = [printer_id] if printer_id is not None else []
+    with cluster.lease(printer_ids) as owners:
+        return forward(owners[printer_id] if printer_id is not None else cluster.any_shard())
+
+def globalize_alert(node, alert):
+    return {**alert, 'id': cluster.global_alert_id(node, alert['id'])} if 'id' in alert else alert
+
+@app.route('/predict', methods=['POST'])
+@app.route('/telemetry', methods=['POST'])
+def route_printer_request():
+    """Single-printer writes go to the shard that owns the printer."""
+    try:
+        printer_id = request_printer_id()
+    except ValueError as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 400
+    return forward_for_printer(printer_id)
+
+@app.route('/predict/batch', methods=['POST'])
+def route_batch():
+    """Split a batch by owning shard, score the parts in parallel and reassemble in order."""
+    data = request.get_json(silent=True)
+    jobs = data.get('jobs') if isinstance(data, dict) else None
+    if not isinstance(jobs, list) or not jobs:
+        return forward(cluster.any_shard())
+    if len(jobs) > app.config['MAX_BATCH_SIZE']:
+        return jsonify({
+            'status': 'error',
+            'error': f"Batch too large: at most {app.config['MAX_BATCH_SIZE']} jobs per request"
+        }), 413
+
+    printer_ids = [job.get('printer_id') if isinstance(job, dict) else None for job in jobs]
+    for index, printer_id in enumerate(printer_ids):
+        if printer_id is not None and not isinstance(printer_id, str):
+            return jsonify({'status': 'error', 'error': f'Job {index}: printer_id must be a string'}), 400
+    keyed = {p for p in printer_ids if p is not None}
+    with cluster.lease(keyed) as owners:
+        groups = {}
+        for index, printer_id in enumerate(printer_ids):
+            node = owners[printer_id] if printer_id in owners else cluster.any_shard()
+            groups.setdefault(node, []).append(index)
+        if len(groups) == 1:
+            return forward(next(iter(groups)))
+
+        path = forwarded_path()
+        bodies = {node: json.dumps({**data, 'jobs': [jobs[i] for i in indexes]}).encode()
+                  for node, indexes in groups.items()}
+        headers = {**forward_headers(), 'Content-Type': 'application/json'}
+        futures = {node: cluster.pool.submit(cluster.clients[node].request, 'POST', path, body, headers)
+                   for node, body in bodies.items()}
+        # Wait for every part: the ones that succeed have been scored (and
+        # recorded) whatever happened to the others
+        replies = {}
+        for node, future in futures.items():
+            try:
+                replies[node] = future.result()
+            except (OSError, http.client.HTTPException) as e:
+                logger.error("Shard %s unavailable: %s", node, str(e))
+                replies[node] = (502, [('Content-Type', 'application/json')], json.dumps({'status': 'error', 'error': f'Shard {node} unavailable'}))
+
+    results = [None] * len(jobs)
+    failed, error = [], None
+    for node, (status, headers, body) in replies.items():
+        if status == 200:
+            for index, result in zip(groups[node], json.loads(body)['results']):
+                results[index] = result
+            continue
+        failed.extend(groups[node])
+        if error is None:
+            try:
+                reply = json.loads(body)
+            except ValueError:
+                reply = {'status': 'error', 'error': f'Shard {node} returned status {status}'}
+            # Report the failing job by its position in the original batch
+            message = reply.get('error', '')
+            match = re.match(r'Job (\d+):', message)
+            if match:
+                reply['error'] = f'Job {groups[node][int(match.group(1))]}:' + message[match.end():]
+            error = (status, headers, reply)
+    if error is not None:
+        # Other shards may have scored their part: return those results and
+        # the jobs to resubmit, so a retry does not record jobs twice
+        status, headers, reply = error
+        reply.update(results=results, failed=sorted(failed))
+        return relay(status, headers, json.dumps(reply))
+    return jsonify({'status': 'success', 'count': len(results), 'results': results})
+
+@app.route('/printers/<printer_id>/alerts', methods=['GET'])
+def route_printer_alerts(printer_id):
+    """A printer's alerts from its shard, with router alert ids."""
+    with cluster.lease([printer_id]) as owners:
+        node = owners[printer_id]
+        args = request.args.to_dict()
+        if args.get('cursor'):
+            try:
+                _, args['cursor'] = cluster.local_alert_id(int(args['cursor']))
+            except ValueError:
+                return jsonify({'status': 'error', 'error': 'limit and cursor must be integers'}), 400
+        try:
+            status, page = cluster.clients[node].call(
+                'GET', f"/printers/{urllib.parse.quote(printer_id, safe='')}/alerts?{urllib.parse.urlencode(args)}")
+        except (OSError, http.client.HTTPException) as e:
+            return shard_unavailable(node, e)
+    if status == 200:
+        page['items'] = [globalize_alert(node, item) for item in page['items']]
+        if page['next_cursor'] is not None:
+            page['next_cursor'] = cluster.global_alert_id(node, page['next_cursor'])
+    return jsonify(page), status
+
+@app.route('/printers/<printer_id>/<path:rest>', methods=['GET', 'POST'])
+def route_printer_path(printer_id, rest):
+    """Forecast, maintenance and telemetry history of one printer, from its shard."""
+    with cluster.lease([printer_id]) as owners:
+        return forward(owners[printer_id])
+
+@app.route('/alerts', methods=['GET'])
+def route_alerts():
+    """Fleet alert listing merged across shards, newest first.
+
+    The cursor is a list of shard=cursor pairs, one per shard that may
+    still have older alerts.
+    """
+    if request.args.get('printer_id'):
+        return route_printer_alerts(request.args['printer_id'])
+    try:
+        limit = min(max(1, int(request.args.get('limit', 50))), 500)
+        cursor = request.args.get('cursor')
+        positions = {node: '' for node in cluster.ring.nodes}
+        if cursor is not None:
+            positions = dict(pair.split('=', 1) for pair in cursor.split(',') if pair)
+    except ValueError:
+        return jsonify({'status': 'error', 'error': 'limit must be an integer and cursor come from next_cursor'}), 400
+    query = {'limit': limit}
+    if request.args.get('status'):
+        query['status'] = request.args['status']
+
+    def fetch(node):
+        params = dict(query, cursor=positions[node]) if positions[node] else query
+        return cluster.clients[node].call('GET', '/alerts?' + urllib.parse.urlencode(params))
+
+    futures = [(node, cluster.pool.submit(fetch, node)) for node in positions if node in cluster.clients]
+    pages = {}
+    for node, future in futures:
+        try:
+            status, page = future.result()
+        except (OSError, http.client.HTTPException) as e:
+            return shard_unavailable(node, e)
+        if status != 200:
+            return jsonify(page), status
+        pages[node] = page
+
+    # Shards page by id (arrival order), in which first_seen is not monotone:
+    # moved and backfilled alerts arrive late with an older first_seen. Each
+    # item is therefore merged by the smallest first_seen up to it in its
+    # page, which is ordered as heapq.merge needs; each shard's own order is
+    # kept, so what is taken from a shard is a prefix of its page
+    def ordered(node, items):
+        floor = math.inf
+        for item in items:
+            floor = min(floor, item['first_seen'])
+            yield floor, node, item
+
+    merged = [(node, item) for _, node, item in itertools.islice(heapq.merge(
+        *(ordered(node, page['items']) for node, page in pages.items()),
+        key=lambda entry: entry[0], reverse=True), limit)]
+    taken = {}
+    for node, item in merged:
+        taken[node] = item['id']
+    remaining = []
+    for node, page in pages.items():
+        items = page['items']
+        if items and taken.get(node) != items[-1]['id']:
+            position = taken.get(node, positions[node])
+        else:
+            position = page['next_cursor']
+        if position is not None:
+            remaining.append(f'{node}={position}')
+    return jsonify({
+        'status': 'success',
+        'items': [globalize_alert(node, item) for node, item in merged],
+        'next_cursor': ','.join(remaining) or None
+    })
+
+@app.route('/alerts/<int:alert_id>/acknowledge', methods=['POST'])
+@app.route('/alerts/<int:alert_id>/snooze', methods=['POST'])
+def route_alert_update(alert_id):
+    """Acknowledge or snooze an alert on the shard that issued it."""
+    node, local_id = cluster.local_alert_id(cluster.resolve_alert_id(alert_id))
+    if node is None:
+        return jsonify({'status': 'error', 'error': f'Unknown alert: {alert_id}'}), 404
+    action = request.path.rsplit('/', 1)[1]
+    try:
+        status, headers, body = send(node, f'/alerts/{local_id}/{action}')
+    except (OSError, http.client.HTTPException) as e:
+        return shard_unavailable(node, e)
+    reply = json.loads(body)
+    if status == 200:
+        reply['alert'] = globalize_alert(node, reply['alert'])
+    elif status == 404:
+        reply['error'] = f'Unknown alert: {alert_id}'
+    return jsonify(reply), status
+
+@app.route('/forecast', methods=['GET'])
+def route_fleet_forecast():
+    """Components due soonest across all shards."""
+    try:
+        limit = int(request.args.get('limit', 100))
+    except ValueError:
+        return jsonify({'status': 'error', 'error': 'due_within_days and limit must be numbers'}), 400
+    replies = cluster.fan_out('GET', forwarded_path())
+    for status, reply in replies.values():
+        if status != 200:
+            return jsonify(reply), status
+    items = [item for _, reply in replies.values() for item in reply['items']]
+    items.sort(key=lambda item: item['days_remaining'])
+    return jsonify({
+        'status': 'success',
+        'printers': sum(reply['printers'] for _, reply in replies.values()),
+        'due_count': sum(reply['due_count'] for _, reply in replies.values()),
+        'items': items[:limit]
+    })
+
+@app.route('/telemetry/stats', methods=['GET'])
+@app.route('/stream/stats', methods=['GET'])
+@app.route('/drift', methods=['GET'])
+@app.route('/shadow/stats', methods=['GET'])
+def route_shard_reports():
+    """Per-process reports, collected from every shard."""
+    replies = cluster.fan_out('GET', forwarded_path())
+    return jsonify({'status': 'ok', 'shards': {node: reply for node, (_, reply) in replies.items()}})
+
+def relay_stream(node, response, connection):
+    """Copy a shard's event stream, giving alert events router alert ids."""
+    event, lines = None, []
+    try:
+        for line in iter(response.readline, b''):
+            line = line.decode()
+            if line.startswith('event: '):
+                event = line[7:].strip()
+            elif line.startswith('data: ') and event == 'alert':
+                line = f"data: {json.dumps(globalize_alert(node, json.loads(line[6:])), separators=(',', ':'))}\n"
+            lines.append(line)
+            if line == '\n':
+                # One write per complete event (or keepalive)
+                yield ''.join(lines)
+                event, lines = None, []
+    finally:
+        connection.close()
+
+@app.route('/stream', methods=['GET'])
+def route_stream():
+    """Proxy an event stream for printers that all live on one shard."""
+    printers = [p for p in request.args.get('printers', '').split(',') if p]
+    if not printers:
+        return jsonify({
+            'status': 'error',
+            'error': 'printers is required; open one stream per shard (see GET /shards/lookup)'
+        }), 400
+    with cluster.lease(printers) as owners:
+        nodes = set(owners.values())
+    if len(nodes) > 1:
+        return jsonify({
+            'status': 'error',
+            'error': 'printers belong to several shards; open one stream per shard (see GET /shards/lookup)'
+        }), 400
+    node = nodes.pop()
+    connection = cluster.clients[node].connect(timeout=app.config['PUSH_HEARTBEAT_SECONDS'] * 4)
+    try:
+        connection.request('GET', forwarded_path(), headers={'Accept': 'text/event-stream'})
+        response = connection.getresponse()
+    except (OSError, http.client.HTTPException) as e:
+        connection.close()
+        return shard_unavailable(node, e)
+    if response.status != 200:
+        body = response.read()
+        connection.close()
+        return relay(response.status, response.getheaders(), body)
+    return Response(relay_stream(node, response, connection), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def admin_allowed():
+    token = app.config['SHARD_ADMIN_TOKEN']
+    return not token or request.headers.get('X-Admin-Token') == token
+
+@app.route('/shards', methods=['GET'])
+def list_shards():
+    """Ring membership and rebalancing counters."""
+    return jsonify({'status': 'ok', **cluster.stats()})
+
+@app.route('/shards/lookup', methods=['GET'])
+def lookup_shards():
+    """Owning shard of each printer in ?printers=a,b."""
+    printers = [p for p in request.args.get('printers', '').split(',') if p]
+    return jsonify({'status': 'success', 'shards': {p: cluster.owner(p) for p in printers}})
+
+@app.route('/shards', methods=['POST'])
+def add_shard():
+    """Add a backend ({"name", "url"}) and move the printers it takes over onto it."""
+    if not admin_allowed():
+        return jsonify({'status': 'error', 'error': 'Forbidden'}), 403
+    data = request.get_json(silent=True) or {}
+    name, url = data.get('name'), data.get('url')
+    if not isinstance(name, str) or not isinstance(url, str) or not name or '=' in name or ',' in name:
+        return jsonify({'status': 'error', 'error': 'Request must contain a shard "name" and "url"'}), 400
+    try:
+        summary = cluster.add_shard(name, url)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 409
+    except (OSError, http.client.HTTPException, ShardError) as e:
+        logger.error("Rebalance onto %s failed: %s", name, traceback.format_exc())
+        return jsonify({'status': 'error', 'error': f'Rebalance failed: {str(e)}'}), 502
+    return jsonify({'status': 'success', **summary})
+
+@app.route('/shards/rebalance', methods=['POST'])
+def resume_rebalance():
+    """Finish moving the printers a failed POST /shards left on their old shard."""
+    if not admin_allowed():
+        return jsonify({'status': 'error', 'error': 'Forbidden'}), 403
+    try:
+        moved = cluster.resume_rebalance()
+    except (OSError, http.client.HTTPException, ShardError) as e:
+        logger.error("Resuming rebalance failed: %s", traceback.format_exc())
+        return jsonify({'status': 'error', 'error': f'Rebalance failed: {str(e)}'}), 502
+    return jsonify({'status': 'success', 'moved': moved, **cluster.stats()})
+
+@app.route('/test', methods=['GET'])
+def test():
+    """Test endpoint to verify the router is up."""
+    return jsonify({'status': 'ok', 'message': 'Router is working', 'shards': cluster.ring.nodes})
+
+if __name__ == '__main__':
+    app.run(host='127.0.0.1', port=5000, threaded=True)
@@ -0,0 +1,340 @@
+import datetime
+import heapq
+import itertools
+
+import numpy as np
+
+from forecasting import COMPONENTS, COMPONENT_MAINTENANCE_ITEMS, SECONDS_PER_DAY
+
+# Dollar values from the dashboard's cost-benefit model (costBenefitService.ts)
+UPTIME_VALUE_PER_HOUR = 50.0
+QUALITY_VALUE_PER_POINT = 100.0
+QUALITY_GAIN = {'Extruder': 15, 'Mechanical': 10}
+DEFAULT_QUALITY_GAIN = 5
+
+# Technician hours (the printer is down for the same time) and parts cost per task
+TASK_HOURS = {
+    'Nozzle': 0.5,
+    'Extruder': 1.5,
+    'Bed': 1.0,
+    'Mechanical': 1.5,
+    'Temperature Control': 1.0,
+    'Power': 1.5,
+}
+DEFAULT_TASK_HOURS = 1.0
+PARTS_COST = {
+    'Nozzle': 15.0,
+    'Extruder': 40.0,
+    'Bed': 25.0,
+    'Mechanical': 30.0,
+    'Temperature Control': 20.0,
+    'Power': 60.0,
+}
+DEFAULT_PARTS_COST = 25.0
+
+# Hours a printer is out of service after an unplanned failure
+FAILURE_DOWNTIME_HOURS = 8.0
+
+# Chance that an alert of each priority turns into a failure if left alone,
+# and how soon (in days) it should be handled
+PRIORITY_RISK = {'critical': 1.0, 'high': 0.7, 'medium': 0.4, 'low': 0.2}
+PRIORITY_DUE_DAYS = {'critical': 0.0, 'high': 2.0, 'medium': 5.0, 'low': 7.0}
+
+
+def reactive_cost(health_score):
+    """Cost of a reactive repair by printer health, as in costBenefitService.ts."""
+    return np.select(
+        [health_score > 80, health_score > 60, health_score > 40],
+        [50.0, 150.0, 300.0],
+        500.0
+    )
+
+
+def risk_priority(risk):
+    if risk >= 0.9:
+        return 'critical'
+    if risk >= 0.6:
+        return 'high'
+    if risk >= 0.3:
+        return 'medium'
+    return 'low'
+
+
+def build_candidates(alerts, forecast, horizon_days=7.0):
+    """Merge open alerts and component forecasts into one candidate task per printer and component.
+
+    `alerts` are open AlertRecords (only those carrying maintenance_items
+    describe maintenance work) and `forecast` is the
+    (printer_ids, wear, rate, days_remaining) tuple from
+    ComponentForecaster.forecast(). A component due within the horizon has
+    risk 1.0, one due later a proportionally smaller risk. Several signals
+    for the same printer and component combine as independent risks.
+
+    Returns a dict of equally long columns.
+    """
+    printer_ids, wear, _, days_remaining = forecast
+    tasks = {}
+
+    def add(printer_id, component, risk, due_days, alert_id=None):
+        key = (printer_id, component)
+        task = tasks.get(key)
+        if task is None:
+            task = tasks[key] = [0.0, due_days, []]
+        task[0] = 1.0 - (1.0 - task[0]) * (1.0 - risk)
+        task[1] = min(task[1], due_days)
+        if alert_id is not None:
+            task[2].append(alert_id)
+
+    for record in alerts:
+        if 'maintenance_items' not in record.details:
+            continue
+        add(record.printer_id, record.component, PRIORITY_RISK.get(record.priority, 0.2),
+            PRIORITY_DUE_DAYS.get(record.priority, horizon_days), record.id)
+
+    # Forecast components due within a few horizons are worth considering early
+    rows, columns = np.nonzero(days_remaining <= horizon_days * 4)
+    due = days_remaining[rows, columns]
+    risk = np.minimum(1.0, horizon_days / np.maximum(due, 1e-9))
+    names = [component.capitalize() for component in COMPONENTS]
+    for row, column, days, r in zip(rows.tolist(), columns.tolist(), due.tolist(), risk.tolist()):
+        add(printer_ids[row], names[column], r, days)
+
+    # Health score per printer from its most worn component (100 = new)
+    health = dict(zip(printer_ids, (100.0 * (1.0 - np.clip(wear.max(axis=1), 0.0, 1.0))).tolist()))
+
+    keys = list(tasks)
+    values = list(tasks.values())
+    components = [component for _, component in keys]
+    return {
+        'printer_id': [printer_id for printer_id, _ in keys],
+        'component': components,
+        'risk': np.array([task[0] for task in values]),
+        'due_days': np.array([task[1] for task in values]),
+        'alert_ids': [task[2] for task in values],
+        'health': np.array([health.get(printer_id, 100.0) for printer_id, _ in keys]),
+        'hours': np.array([TASK_HOURS.get(c, DEFAULT_TASK_HOURS) for c in components]),
+        'parts_cost': np.array([PARTS_COST.get(c, DEFAULT_PARTS_COST) for c in components]),
+        'quality_gain': np.array([QUALITY_GAIN.get(c, DEFAULT_QUALITY_GAIN) for c in components],
+                                 dtype=np.float64),
+    }
+
+
+def task_value(candidates):
+    """Expected saving of doing each task now, net of its own cost.
+
+    Doing the work avoids, with probability `risk`, a reactive repair, the
+    downtime of an unplanned failure and the quality loss; it costs parts
+    and the planned downtime of the task itself.
+    """
+    avoided = (reactive_cost(candidates['health'])
+               + FAILURE_DOWNTIME_HOURS * UPTIME_VALUE_PER_HOUR
+               + candidates['quality_gain'] * QUALITY_VALUE_PER_POINT)
+    cost = candidates['parts_cost'] + candidates['hours'] * UPTIME_VALUE_PER_HOUR
+    return candidates['risk'] * avoided, cost
+
+
+def select_tasks(printers, hours, value, day_capacity, days, max_downtime_hours, max_swaps=20000):
+    """Choose tasks and their days, maximizing total value under the daily technician hours and per-printer downtime.
+
+    A greedy pass takes tasks by value per technician hour from a heap and
+    puts each on the first day with room. It is optimal when it fills the
+    hours exactly in that order; where days end with spare hours too short
+    for the next task, a local search swaps a selected task for the most
+    valuable unselected ones fitting in its hours plus the spare ones, and
+    a last pass fills any hours left. Every selected task has a day, so the
+    plan never drops any.
+    Returns the day of each task, -1 where it is not selected.
+    """
+    n = len(value)
+    day = np.full(n, -1, dtype=np.int64)
+    if not n or days <= 0:
+        return day
+    downtime = np.zeros(int(printers.max()) + 1)
+    left = [float(day_capacity)] * days
+    min_hours = float(hours.min())
+    epsilon = 1e-9
+
+    ratio = value / hours
+    hours_list = hours.tolist()
+    printers_list = printers.tolist()
+    value_list = value.tolist()
+    sizes = sorted(set(hours_list))
+    # Selected tasks by (day, hours), cheapest first; entries of tasks since
+    # dropped are skipped when they come up
+    on_day = {}
+
+    def room(i, freed=0.0):
+        return downtime[printers_list[i]] - freed + hours_list[i] <= max_downtime_hours + epsilon
+
+    def first_day(i):
+        for d in range(days):
+            if left[d] + epsilon >= hours_list[i]:
+                return d
+        return -1
+
+    def take(i, d):
+        day[i] = d
+        left[d] -= hours_list[i]
+        downtime[printers_list[i]] += hours_list[i]
+        heapq.heappush(on_day.setdefault((d, hours_list[i]), []), (value_list[i], i))
+
+    def drop(i):
+        left[day[i]] += hours_list[i]
+        downtime[printers_list[i]] -= hours_list[i]
+        day[i] = -1
+
+    def cheapest(d, size):
+        heap = on_day.get((d, size))
+        while heap and day[heap[0][1]] != d:
+            heapq.heappop(heap)
+        return heap[0][1] if heap else None
+
+    def fill(candidates):
+        for i in candidates:
+            if max(left) + epsilon < min_hours:
+                break
+            if day[i] < 0 and room(i):
+                d = first_day(i)
+                if d >= 0:
+                    take(i, d)
+
+    heap = [(-r, i) for i, r in enumerate(ratio.tolist()) if r > 0]
+    heapq.heapify(heap)
+    fill(heapq.heappop(heap)[1] for _ in range(len(heap)))
+
+    # Local search: on each day, eject the cheapest selected task of some
+    # length and refill the freed hours (plus the day's spare ones) with the
+    # most valuable mix of unselected tasks, whenever that is worth more;
+    # e.g. two 1 h tasks in place of a 1.5 h one next to half an hour spare
+    by_size = {}
+    for i in np.flatnonzero(value > 0)[np.argsort(-value[value > 0], kind='stable')].tolist():
+        by_size.setdefault(hours_list[i], []).append(i)
+    longest = sizes[-1]
+
+    def refill(free, ejected):
+        """The most valuable set of unselected tasks fitting in `free` hours, and its value."""
+        tops = []
+        for size in sizes:
+            count = int((free + epsilon) // size)
+            top = []
+            for i in by_size.get(size, ()):
+                if len(top) == count:
+                    break
+                if day[i] < 0 and i != ejected:
+                    freed = hours_list[ejected] if ejected is not None \
+                        and printers_list[ejected] == printers_list[i] else 0.0
+                    if room(i, freed):
+                        top.append(i)
+            tops.append(top)
+        best, best_value = [], 0.0
+        for counts in itertools.product(*(range(len(top) + 1) for top in tops)):
+            if sum(c * size for c, size in zip(counts, sizes)) > free + epsilon:
+                continue
+            picked = [i for c, top in zip(counts, tops) for i in top[:c]]
+            total = sum(value_list[i] for i in picked)
+            if total > best_value:
+                best, best_value = picked, total
+        return best, best_value
+
+    swaps = 0
+    improved = True
+    while improved and swaps < max_swaps:
+        improved = False
+        for d in range(days):
+            if left[d] >= longest:
+                continue  # nothing left to fit here, or only tasks over their printer's downtime
+            for size in sizes:
+                j = cheapest(d, size)
+                if j is None:
+                    continue
+                picked, gain = refill(left[d] + hours_list[j], j)
+                printer_hours = {}
+                for i in picked:
+                    printer_hours[printers_list[i]] = printer_hours.get(printers_list[i], 0.0) + hours_list[i]
+                if printers_list[j] in printer_hours:
+                    printer_hours[printers_list[j]] -= hours_list[j]
+                if gain <= value_list[j] + epsilon or any(
+                        downtime[p] + h > max_downtime_hours + epsilon for p, h in printer_hours.items()):
+                    continue
+                drop(j)
+                for i in picked:
+                    take(i, d)
+                swaps += 1
+                improved = True
+
+    # Fill whatever hours the swaps left free
+    rest = np.flatnonzero((day < 0) & (value > 0))
+    fill(rest[np.argsort(-ratio[rest], kind='stable')].tolist())
+    return day
+
+
+def assign_days(order, hours, day):
+    """Move the more urgent of the chosen tasks (`order`, most urgent first) to earlier days.
+
+    Tasks of equal hours swap days, so every day keeps the load
+    select_tasks packed into it. Returns the day of each task in `order`.
+    """
+    slots = {}
+    for i in order:
+        slots.setdefault(hours[i], []).append(day[i])
+    for size in slots:
+        slots[size] = iter(sorted(slots[size]))
+    return [int(next(slots[hours[i]])) for i in order]
+
+
+def maintenance_plan(alerts, forecast, now, technicians=2, hours_per_day=8.0, horizon_days=7,
+                     max_downtime_hours=4.0):
+    """Build a fleet maintenance plan for the next `horizon_days` days.
+
+    Returns a JSON-ready dict with the scheduled tasks (by day, most urgent
+    first) and a cost-benefit summary in the dashboard's terms.
+    """
+    horizon_days = int(horizon_days)
+    candidates = build_candidates(alerts, forecast, horizon_days)
+    benefit, cost = task_value(candidates)
+    value = benefit - cost
+    printer_codes = {}
+    printers = np.array([printer_codes.setdefault(p, len(printer_codes)) for p in candidates['printer_id']],
+                        dtype=np.int64)
+    hours = candidates['hours']
+    available = technicians * hours_per_day * horizon_days
+
+    packed = select_tasks(printers, hours, value, technicians * hours_per_day, horizon_days, max_downtime_hours)
+    chosen = np.flatnonzero(packed >= 0)
+    chosen = chosen[np.lexsort((-value[chosen], candidates['due_days'][chosen]))].tolist()
+    days = assign_days(chosen, hours.tolist(), packed)
+
+    tasks = []
+    for i, day in zip(chosen, days):
+        component = candidates['component'][i]
+        date = datetime.datetime.fromtimestamp(now + day * SECONDS_PER_DAY, datetime.timezone.utc)
+        task = {
+            'printer_id': candidates['printer_id'][i],
+            'component': component,
+            'priority': risk_priority(candidates['risk'][i]),
+            'day': day,
+            'scheduled_date': date.date().isoformat(),
+            'technician_hours': float(hours[i]),
+            'estimated_cost': float(candidates['parts_cost'][i]),
+            'expected_benefit': float(value[i]),
+            'alert_ids': candidates['alert_ids'][i],
+        }
+        if component.lower() in COMPONENT_MAINTENANCE_ITEMS:
+            task['maintenance_items'] = COMPONENT_MAINTENANCE_ITEMS[component.lower()]
+        tasks.append(task)
+
+    preventive_cost = float(candidates['parts_cost'][chosen].sum())
+    savings = float(benefit[chosen].sum())
+    return {
+        'horizon_days': horizon_days,
+        'candidates': len(value),
+        'scheduled': len(tasks),
+        'deferred': len(value) - len(tasks),
+        'technician_hours_available': float(available),
+        'technician_hours_used': float(hours[chosen].sum()),
+        'preventive_cost': preventive_cost,
+        'expected_savings': savings,
+        'net_benefit': float(value[chosen].sum()),
+        'roi': savings / preventive_cost * 100 if preventive_cost > 0 else 0,
+        'tasks': tasks,
+    }
@@ -0,0 +1,217 @@
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class ShadowEvaluator:
+    """Score live traffic with a candidate model off the request path.
+
+    The request thread only does a non-blocking put onto a bounded queue.
+    Worker processes load the candidate model, drain the queue in
+    micro-batches (waiting up to `linger` seconds to fill one) and send back the candidate probabilities; a collector
+    thread records them next to the production result in a fixed-size ring
+    buffer. Scoring runs in separate, lowest-priority processes so it never
+    competes with request handling for the GIL or the CPU. When the queue
+    is full the sample is dropped rather than slowing down the request. A
+    worker that cannot load the candidate is counted in `worker_errors` and
+    fails the samples it takes.
+    """
+
+    def __init__(self, candidate_path, feature_names, workers=1, queue_size=1024,
+                 batch_size=64, linger=0.05, buffer_size=10000, threshold=0.5):
+        self.candidate_path = candidate_path
+        self.feature_names = list(feature_names)
+        self.threshold = threshold
+
+        context = multiprocessing.get_context('spawn')
+        self._tasks = context.Queue(maxsize=queue_size)
+        self._results = context.Queue()
+        self._lock = threading.Lock()
+
+        # Ring buffer columns: primary probability, candidate probability,
+        # primary latency (ms), candidate latency per row (ms)
+        self._buffer = np.zeros((buffer_size, 4), dtype=np.float64)
+        self._cursor = 0
+        self._filled = 0
+
+        self.submitted = 0
+        self.scored = 0
+        self.dropped = 0
+        self.errors = 0
+        self.worker_errors = 0
+
+        self._workers = [
+            context.Process(
+                target=_score_worker,
+                args=(candidate_path, self.feature_names, batch_size, linger,
+                      self._tasks, self._results),
+                name=f'shadow-worker-{i}',
+                daemon=True
+            )
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+        self._collector = threading.Thread(target=self._collect, name='shadow-collector', daemon=True)
+        self._collector.start()
+
+    def submit(self, features, primary_probability, primary_latency_ms):
+        """Queue one request for shadow scoring; never blocks the caller."""
+        try:
+            self._tasks.put_nowait((features, primary_probability, primary_latency_ms))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return
+        with self._lock:
+            self.submitted += 1
+
+    def drain(self, timeout=30.0):
+        """Wait until every submitted sample has been scored or has failed."""
+        deadline = time.monotonic() + timeout
+        while self.scored + self.errors < self.submitted and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.scored + self.errors >= self.submitted
+
+    def stop(self, timeout=5.0):
+        """Stop the worker processes and the collector thread.
+
+        Workers that do not get the stop signal (the queue is full) or do
+        not finish within `timeout` are terminated.
+        """
+        for _ in self._workers:
+            try:
+                self._tasks.put_nowait(None)
+            except queue.Full:
+                break
+        for worker in self._workers:
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join(timeout)
+        self._results.put(None)
+        self._collector.join(timeout)
+
+    def _collect(self):
+        while True:
+            result = self._results.get()
+            if result is None:
+                return
+            rows, error = result
+            if rows is None:
+                logger.error("Shadow worker failed: %s", error)
+                with self._lock:
+                    self.worker_errors += 1
+                continue
+            if error is not None:
+                logger.error("Shadow scoring failed: %s", error)
+                with self._lock:
+                    self.errors += rows
+                continue
+            self._record(rows)
+
+    def _record(self, rows):
+        size = len(self._buffer)
+        rows = rows[-size:]
+        with self._lock:
+            positions = (self._cursor + np.arange(len(rows))) % size
+            self._buffer[positions] = rows
+            self._cursor = (self._cursor + len(rows)) % size
+            self._filled = min(size, self._filled + len(rows))
+            self.scored += len(rows)
+
+    def stats(self):
+        """Summarise agreement and latency over the samples in the buffer."""
+        with self._lock:
+            window = self._buffer[:self._filled].copy()
+            stats = {
+                'candidate_model': self.candidate_path,
+                'submitted': self.submitted,
+                'scored': self.scored,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'worker_errors': self.worker_errors,
+                'window': len(window),
+            }
+        stats['workers_alive'] = sum(worker.is_alive() for worker in self._workers)
+        if not len(window):
+            return stats
+
+        primary, candidate = window[:, 0], window[:, 1]
+        agree = (primary >= self.threshold) == (candidate >= self.threshold)
+        stats.update({
+            'agreement_rate': float(agree.mean()),
+            'mean_abs_diff': float(np.abs(primary - candidate).mean()),
+            'max_abs_diff': float(np.abs(primary - candidate).max()),
+            'primary_positive_rate': float((primary >= self.threshold).mean()),
+            'candidate_positive_rate': float((candidate >= self.threshold).mean()),
+            'primary_latency_ms': _latency_summary(window[:, 2]),
+            'candidate_latency_ms': _latency_summary(window[:, 3]),
+        })
+        return stats
+
+
+def _latency_summary(values):
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        'mean': float(values.mean()),
+        'p50': float(p50),
+        'p95': float(p95),
+        'p99': float(p99),
+    }
+
+
+def _score_worker(candidate_path, feature_names, batch_size, linger, tasks, results):
+    """Worker process: score queued samples with the candidate in micro-batches."""
+    import pandas as pd
+
+    from compact_model import load_artifact
+
+    # Yield the CPU to request handling whenever both want it
+    if hasattr(os, 'nice'):
+        os.nice(19)
+    candidate, load_error = None, None
+    try:
+        candidate = load_artifact(candidate_path)
+    except Exception as e:
+        # Keep taking samples so they are counted as errors instead of piling up
+        load_error = f'Candidate model failed to load: {e}'
+        results.put((None, load_error))
+    while True:
+        item = tasks.get()
+        if item is None:
+            return
+        batch = [item]
+        deadline = time.monotonic() + linger
+        while len(batch) < batch_size:
+            try:
+                item = tasks.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is None:
+                tasks.put(None)
+                break
+            batch.append(item)
+
+        try:
+            if candidate is None:
+                raise RuntimeError(load_error)
+            frame = pd.DataFrame([entry[0] for entry in batch], columns=feature_names)
+            start = time.perf_counter()
+            probabilities = candidate.predict_proba(frame)[:, 1]
+            per_row_ms = (time.perf_counter() - start) * 1000.0 / len(batch)
+            rows = np.empty((len(batch), 4), dtype=np.float64)
+            rows[:, 0] = [entry[1] for entry in batch]
+            rows[:, 1] = probabilities
+            rows[:, 2] = [entry[2] for entry in batch]
+            rows[:, 3] = per_row_ms
+            results.put((rows, None))
+        except Exception as e:
+            results.put((len(batch), str(e)))
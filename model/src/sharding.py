@@ -0,0 +1,369 @@
+import bisect
+import hashlib
+import http.client
+import itertools
+import json
+import logging
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Alert ids are per process; through the router they become
+# local id * MAX_SHARDS + shard number so they stay unique across shards
+MAX_SHARDS = 256
+
+
+class ShardError(RuntimeError):
+    """A backend refused or failed a state transfer request."""
+
+
+def stable_hash(key):
+    """64-bit hash of a string that is the same in every process (unlike hash())."""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Consistent hashing of printer IDs onto shards.
+
+    Each shard owns `vnodes` points on a 64-bit ring and a key belongs to
+    the first point at or after its hash. Adding a shard only takes over
+    the arcs in front of its own points, so about 1/n of the keys move and
+    they all move to the new shard; with enough points per shard the load
+    stays within a few percent of even.
+    """
+
+    def __init__(self, nodes=(), vnodes=160):
+        self.vnodes = vnodes
+        self.nodes = []
+        self._points = []
+        self._owners = []
+        for node in nodes:
+            self.add(node)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def copy(self):
+        ring = HashRing(vnodes=self.vnodes)
+        ring.nodes = list(self.nodes)
+        ring._points = list(self._points)
+        ring._owners = list(self._owners)
+        return ring
+
+    def add(self, node):
+        if node in self.nodes:
+            raise ValueError(f"Shard {node} is already on the ring")
+        self.nodes.append(node)
+        for i in range(self.vnodes):
+            point = stable_hash(f'{node}#{i}')
+            position = bisect.bisect(self._points, point)
+            self._points.insert(position, point)
+            self._owners.insert(position, node)
+
+    def remove(self, node):
+        self.nodes.remove(node)
+        keep = [i for i, owner in enumerate(self._owners) if owner != node]
+        self._points = [self._points[i] for i in keep]
+        self._owners = [self._owners[i] for i in keep]
+
+    def node_for(self, key):
+        if not self._points:
+            raise LookupError("The ring has no shards")
+        position = bisect.bisect_left(self._points, stable_hash(key))
+        return self._owners[position % len(self._points)]
+
+
+class ShardClient:
+    """HTTP client for one backend, with a keep-alive connection per thread."""
+
+    def __init__(self, url, timeout=30.0, headers=None):
+        parsed = urllib.parse.urlparse(url)
+        self.url = url
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.timeout = timeout
+        self.headers = headers or {}
+        self._local = threading.local()
+
+    def connect(self, timeout=None):
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout or self.timeout)
+
+    def request(self, method, path, body=None, headers=None):
+        """Send a request; returns (status, headers, body bytes)."""
+        headers = {**self.headers, **(headers or {})}
+        while True:
+            connection = getattr(self._local, 'connection', None)
+            reused = connection is not None
+            if not reused:
+                connection = self._local.connection = self.connect()
+            try:
+                connection.request(method, path, body, headers)
+                response = connection.getresponse()
+            except (ConnectionResetError, BrokenPipeError) as e:
+                # RemoteDisconnected is a ConnectionResetError. Only a kept-alive
+                # connection the server closed before answering is retried;
+                # timeouts and other errors may mean the request was processed
+                self._discard(connection)
+                if not reused:
+                    raise
+                logger.debug("Retrying %s %s on a new connection to %s: %s", method, path, self.url, e)
+                continue
+            except (OSError, http.client.HTTPException):
+                self._discard(connection)
+                raise
+            try:
+                return response.status, response.getheaders(), response.read()
+            except (OSError, http.client.HTTPException):
+                self._discard(connection)
+                raise
+
+    def _discard(self, connection):
+        connection.close()
+        self._local.connection = None
+
+    def call(self, method, path, payload=None):
+        """JSON request; returns (status, decoded body)."""
+        body = json.dumps(payload).encode() if payload is not None else None
+        status, _, data = self.request(method, path, body, {'Content-Type': 'application/json'})
+        return status, json.loads(data)
+
+
+class ShardCluster:
+    """Shard membership, routing and rebalancing behind the router.
+
+    Requests hold a lease on the printers they touch while they are
+    forwarded. add_shard waits for current leases to finish, asks each
+    shard which printers it holds and switches to the new ring. Then only
+    the printers whose owner changed, about 1/n of them and all bound for
+    the new shard, are exported, imported and dropped in batches. Requests
+    for a printer wait only while its own batch is being moved.
+
+    If a transfer fails, the printers not yet moved stay pinned to the
+    shard that still holds their state and are served there until
+    resume_rebalance() (or the next add_shard) moves them. Source copies
+    that could not be dropped after a successful move are dropped then too.
+    """
+
+    def __init__(self, backends, vnodes=160, timeout=30.0, admin_token=None, batch_size=100, workers=32):
+        self.ring = HashRing(vnodes=vnodes)
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.clients = {}
+        self.numbers = {}
+        self.moved = 0
+        self._headers = {'X-Admin-Token': admin_token} if admin_token else {}
+        self._condition = threading.Condition()
+        self._active = 0
+        self._switching = False
+        self._moving = set()
+        self._pinned = {}  # printer -> shard holding its state after an interrupted move
+        self._stale = {}  # shard -> printers moved away whose copy is still to be dropped
+        self._alert_aliases = {}  # router alert id before a move -> id after it
+        self._rebalance_lock = threading.Lock()
+        self._next = itertools.count()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='shard-router')
+        for name, url in backends.items():
+            self._register(name, url)
+            self.ring.add(name)
+
+    def _register(self, name, url):
+        if name in self.clients:
+            raise ValueError(f"Shard {name} already exists")
+        if len(self.numbers) >= MAX_SHARDS:
+            raise ValueError(f"At most {MAX_SHARDS} shards are supported")
+        self.clients[name] = ShardClient(url, self.timeout, self._headers)
+        self.numbers[name] = len(self.numbers)
+
+    @contextmanager
+    def lease(self, printer_ids):
+        """Owner shard of each printer, guaranteed not to move until the block exits."""
+        with self._condition:
+            while self._switching or self._moving.intersection(printer_ids):
+                self._condition.wait()
+            self._active += 1
+            owners = {printer_id: self._owner(printer_id) for printer_id in printer_ids}
+        try:
+            yield owners
+        finally:
+            with self._condition:
+                self._active -= 1
+                if not self._active:
+                    self._condition.notify_all()
+
+    def _owner(self, printer_id):
+        return self._pinned.get(printer_id) or self.ring.node_for(printer_id)
+
+    def owner(self, printer_id):
+        """The shard currently serving a printer."""
+        with self._condition:
+            return self._owner(printer_id)
+
+    def any_shard(self):
+        """Round-robin shard for requests that carry no printer ID."""
+        nodes = self.ring.nodes
+        return nodes[next(self._next) % len(nodes)]
+
+    def global_alert_id(self, node, alert_id):
+        return alert_id * MAX_SHARDS + self.numbers[node]
+
+    def resolve_alert_id(self, alert_id):
+        """The current router id of an alert, following the renames of any moves."""
+        while alert_id in self._alert_aliases:
+            alert_id = self._alert_aliases[alert_id]
+        return alert_id
+
+    def local_alert_id(self, alert_id):
+        """(shard, local alert id) for a router alert id, or (None, None) for an unknown shard."""
+        local, number = divmod(alert_id, MAX_SHARDS)
+        for node, n in self.numbers.items():
+            if n == number:
+                return node, local
+        return None, None
+
+    def fan_out(self, method, path, payload=None):
+        """Send the same JSON request to every shard in parallel; returns {shard: (status, body)}.
+
+        A shard that cannot be reached is reported with status 502.
+        """
+        def call(node):
+            try:
+                return self.clients[node].call(method, path, payload)
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                return 502, {'status': 'error', 'error': f'Shard {node} unavailable: {str(e)}'}
+
+        nodes = list(self.ring.nodes)
+        return dict(zip(nodes, self.pool.map(call, nodes)))
+
+    def _checked(self, node, method, path, payload=None):
+        status, body = self.clients[node].call(method, path, payload)
+        if status != 200:
+            raise ShardError(f"{method} {path} on shard {node} failed ({status}): {body.get('error')}")
+        return body
+
+    def _drain(self):
+        """Hold new requests and wait for the ones in flight; _switching stays set."""
+        with self._condition:
+            self._switching = True
+            while self._active:
+                self._condition.wait()
+
+    def add_shard(self, name, url):
+        """Add a backend to the ring and move the printers it now owns onto it.
+
+        An earlier interrupted rebalance is finished first. Returns a summary
+        with the number of printers held before and moved.
+        """
+        with self._rebalance_lock:
+            if self._pinned or self._stale:
+                self._resume()
+            self._register(name, url)
+            ring = self.ring.copy()
+            ring.add(name)
+
+            self._drain()
+            try:
+                held = {node: self._checked(node, 'GET', '/shard/printers')['printer_ids']
+                        for node in self.ring.nodes}
+            except (OSError, http.client.HTTPException, ShardError):
+                with self._condition:
+                    del self.clients[name], self.numbers[name]
+                    self._switching = False
+                    self._condition.notify_all()
+                raise
+            moves = {(node, name): [p for p in printer_ids if ring.node_for(p) == name]
+                     for node, printer_ids in held.items()}
+            with self._condition:
+                for printer_ids in moves.values():
+                    self._moving.update(printer_ids)
+                self.ring = ring
+                self._switching = False
+                self._condition.notify_all()
+
+            total = sum(len(printer_ids) for printer_ids in held.values())
+            moved = sum(len(printer_ids) for printer_ids in moves.values())
+            logger.info("Shard %s added: moving %d of %d printers", name, moved, total)
+            self._migrate(moves)
+            return {
+                'shard': name,
+                'printers': total,
+                'moved': moved,
+                'moved_from': {source: len(printer_ids) for (source, _), printer_ids in moves.items()},
+            }
+
+    def resume_rebalance(self):
+        """Move the printers an interrupted rebalance left pinned; returns how many moved."""
+        with self._rebalance_lock:
+            return self._resume()
+
+    def _resume(self):
+        for source in list(self._stale):
+            self._checked(source, 'POST', '/shard/drop', {'printer_ids': sorted(self._stale[source])})
+            del self._stale[source]
+
+        self._drain()
+        with self._condition:
+            moves = {}
+            for printer_id, source in self._pinned.items():
+                moves.setdefault((source, self.ring.node_for(printer_id)), []).append(printer_id)
+            self._moving.update(self._pinned)
+            self._pinned.clear()
+            self._switching = False
+            self._condition.notify_all()
+        moved = sum(len(printer_ids) for printer_ids in moves.values())
+        logger.info("Resuming rebalance: moving %d pinned printers", moved)
+        # A failed attempt may have left part of a batch on the target already
+        self._migrate(moves, clear_target=True)
+        return moved
+
+    def _migrate(self, moves, clear_target=False):
+        """Export, import and drop {(source, target): printer_ids} in batches.
+
+        Printers are served by the target as soon as their batch is imported.
+        On failure the printers not yet moved are pinned to their source and
+        the error is raised.
+        """
+        try:
+            for (source, target), printer_ids in moves.items():
+                for i in range(0, len(printer_ids), self.batch_size):
+                    batch = printer_ids[i:i + self.batch_size]
+                    exported = self._checked(source, 'POST', '/shard/export', {'printer_ids': batch})
+                    if clear_target:
+                        self._checked(target, 'POST', '/shard/drop', {'printer_ids': batch})
+                    imported = self._checked(target, 'POST', '/shard/import', {'printers': exported['printers']})
+                    self._alert_aliases.update(
+                        (self.global_alert_id(source, old), self.global_alert_id(target, new))
+                        for old, new in imported.get('alert_ids', ()))
+                    self.moved += len(batch)
+                    with self._condition:
+                        self._moving.difference_update(batch)
+                        self._condition.notify_all()
+                    try:
+                        self._checked(source, 'POST', '/shard/drop', {'printer_ids': batch})
+                    except (OSError, http.client.HTTPException, ShardError):
+                        self._stale.setdefault(source, set()).update(batch)
+                        raise
+        finally:
+            with self._condition:
+                if self._moving:
+                    for (source, _), printer_ids in moves.items():
+                        self._pinned.update((p, source) for p in printer_ids if p in self._moving)
+                    logger.error("Rebalance stopped with %d printers left on their old shard",
+                                 len(self._moving))
+                    self._moving.clear()
+                self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'shards': {name: {'url': client.url, 'number': self.numbers[name]}
+                           for name, client in self.clients.items() if name in self.ring.nodes},
+                'vnodes': self.ring.vnodes,
+                'active_requests': self._active,
+                'moving': len(self._moving),
+                'pinned': len(self._pinned),
+                'stale': sum(len(printer_ids) for printer_ids in self._stale.values()),
+                'moved': self.moved,
+            }
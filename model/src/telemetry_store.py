@@ -0,0 +1,411 @@
+import logging
+import threading
+import time
+
+import numpy as np
+
+from anomaly import METRIC_NAMES
+
+logger = logging.getLogger(__name__)
+
+# Storage tiers from finest to coarsest: (name, bucket width in seconds).
+# Each coarser width is a multiple of the finer one, so buckets nest.
+TIERS = (('raw', 1), ('1m', 60), ('1h', 3600), ('1d', 86400))
+
+# Seconds of history kept per tier
+DEFAULT_RETENTION = {
+    'raw': 900,
+    '1m': 86400,
+    '1h': 90 * 86400,
+    '1d': 730 * 86400,
+}
+
+# Streams (printer, metric) are allocated in fixed blocks so adding printers
+# never copies existing history
+BLOCK_STREAMS = 256
+
+
+class Tier:
+    """One resolution of the store: per stream, a ring of time-aligned buckets.
+
+    Bucket b (covering [b * width, (b + 1) * width)) lives in slot
+    b % capacity and carries the stamp b + 1, so a slot whose stamp does
+    not match is empty or holds data that aged out. Rings hold exactly the
+    retention period, which enforces it without any deletion pass.
+    """
+
+    def __init__(self, name, width, retention):
+        self.name = name
+        self.width = width
+        self.retention = retention
+        self.capacity = max(1, int(retention // width))
+        self.blocks = []
+
+    def add_block(self):
+        shape = (BLOCK_STREAMS, self.capacity)
+        self.blocks.append({
+            'stamp': np.zeros(shape, dtype=np.uint32),
+            'min': np.zeros(shape, dtype=np.float32),
+            'max': np.zeros(shape, dtype=np.float32),
+            'sum': np.zeros(shape, dtype=np.float32),
+            'count': np.zeros(shape, dtype=np.uint32),
+        })
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for block in self.blocks for array in block.values())
+
+    def merge(self, block, rows, buckets, minimum, maximum, total, count):
+        """Fold values into buckets (several may hit the same bucket)."""
+        arrays = self.blocks[block]
+        slots = buckets % self.capacity
+        stamps = (buckets + 1).astype(np.uint32)
+        stale = arrays['stamp'][rows, slots] != stamps
+        if stale.any():
+            r, s = rows[stale], slots[stale]
+            arrays['stamp'][r, s] = stamps[stale]
+            arrays['min'][r, s] = np.inf
+            arrays['max'][r, s] = -np.inf
+            arrays['sum'][r, s] = 0.0
+            arrays['count'][r, s] = 0
+        index = (rows, slots)
+        np.minimum.at(arrays['min'], index, minimum)
+        np.maximum.at(arrays['max'], index, maximum)
+        np.add.at(arrays['sum'], index, total)
+        np.add.at(arrays['count'], index, count)
+
+    def read(self, stream, start, end, oldest_bucket):
+        """Non-empty buckets of one stream overlapping [start, end), oldest first."""
+        block, row = divmod(stream, BLOCK_STREAMS)
+        first = max(int(start // self.width), oldest_bucket)
+        last = int(-(-end // self.width))
+        if last <= first:
+            return None
+        buckets = np.arange(first, last, dtype=np.int64)
+        slots = buckets % self.capacity
+        arrays = self.blocks[block]
+        valid = arrays['stamp'][row, slots] == buckets + 1
+        slots = slots[valid]
+        return (
+            buckets[valid] * self.width,
+            arrays['min'][row, slots],
+            arrays['max'][row, slots],
+            arrays['sum'][row, slots].astype(np.float64),
+            arrays['count'][row, slots].astype(np.int64),
+        )
+
+
+class TelemetryStore:
+    """Per-printer telemetry history in tiers of decreasing resolution.
+
+    Requests only write per-second buckets (the raw tier). A background
+    compaction pass rolls every complete minute into the 1-minute tier,
+    complete hours into the hourly tier and complete days into the daily
+    tier, keeping min/max/mean/count, and each tier keeps its own
+    retention period. Samples that arrive after their minute was compacted
+    (more than `grace` seconds late) are dropped and counted.
+
+    Memory is fixed per stream (see Tier) and independent of traffic. It is
+    allocated BLOCK_STREAMS streams at a time, so even one stream reserves a
+    whole block (about 27MB with the default retention).
+    """
+
+    def __init__(self, retention=None, grace=60.0):
+        retention = {**DEFAULT_RETENTION, **(retention or {})}
+        self.tiers = [Tier(name, width, retention[name]) for name, width in TIERS]
+        self.grace = grace
+        if self.tiers[0].retention < 2 * grace:
+            raise ValueError("Raw retention must cover at least twice the compaction grace period")
+        self._streams = {}
+        self._keys = []
+        self._free = []  # rows of dropped streams, reused before adding blocks
+        # Per tier, the time up to which it holds every complete bucket;
+        # the raw tier is always current
+        self._until = [None] * len(self.tiers)
+        self._now = 0.0
+        self._lock = threading.Lock()
+        self._worker = None
+        self._stop = threading.Event()
+        self.ingested = 0
+        self.late = 0
+
+    @property
+    def nbytes(self):
+        return sum(tier.nbytes for tier in self.tiers)
+
+    def _stream(self, printer_id, metric):
+        key = (printer_id, metric)
+        index = self._streams.get(key)
+        if index is None:
+            if self._free:
+                index = self._streams[key] = self._free.pop()
+                self._keys[index] = key
+                return index
+            index = self._streams[key] = len(self._keys)
+            self._keys.append(key)
+            if index % BLOCK_STREAMS == 0:
+                for tier in self.tiers:
+                    tier.add_block()
+        return index
+
+    def printer_ids(self):
+        with self._lock:
+            return list({printer_id for printer_id, _ in self._streams})
+
+    def export_printer(self, printer_id):
+        """Every retained bucket of a printer's streams, by metric and tier, as lists.
+
+        The result can be loaded elsewhere with import_printer.
+        """
+        exported = {}
+        with self._lock:
+            for metric in METRIC_NAMES:
+                stream = self._streams.get((printer_id, metric))
+                if stream is None:
+                    continue
+                tiers = exported[metric] = {}
+                for tier in self.tiers:
+                    newest = int(self._now // tier.width)
+                    oldest = newest - tier.capacity + 1
+                    part = tier.read(stream, oldest * tier.width, (newest + 1) * tier.width, oldest)
+                    if part is not None and len(part[0]):
+                        times, minimum, maximum, total, count = part
+                        tiers[tier.name] = [times.tolist(), minimum.astype(np.float64).tolist(),
+                                            maximum.astype(np.float64).tolist(), (total / count).tolist(),
+                                            count.tolist()]
+        return exported
+
+    def import_printer(self, printer_id, state):
+        """Load buckets from export_printer into the same tiers."""
+        for metric, tiers in state.items():
+            for tier_name, (timestamps, minimum, maximum, mean, count) in tiers.items():
+                self.import_rollups(tier_name, printer_id, metric, timestamps, minimum, maximum, mean, count)
+
+    def drop_printer(self, printer_id):
+        """Forget a printer's streams; their rows are cleared and reused by new streams."""
+        with self._lock:
+            dropped = [self._streams.pop((printer_id, metric)) for metric in METRIC_NAMES
+                       if (printer_id, metric) in self._streams]
+            for stream in dropped:
+                block, row = divmod(stream, BLOCK_STREAMS)
+                for tier in self.tiers:
+                    tier.blocks[block]['stamp'][row] = 0
+                self._keys[stream] = None
+                self._free.append(stream)
+            return bool(dropped)
+
+    def ingest(self, printer_id, samples, now=None):
+        """Store a batch of telemetry sample dicts (timestamp in seconds plus metric fields).
+
+        Returns the number of values stored.
+        """
+        now = time.time() if now is None else float(now)
+        streams, buckets, values = [], [], []
+        with self._lock:
+            for sample in samples:
+                timestamp = sample.get('timestamp')
+                second = int(now if timestamp is None else timestamp)
+                for metric in METRIC_NAMES:
+                    value = sample.get(metric)
+                    if value is not None:
+                        streams.append(self._stream(printer_id, metric))
+                        buckets.append(second)
+                        values.append(float(value))
+            if not values:
+                return 0
+            self._now = max(self._now, now)
+            streams = np.array(streams, dtype=np.int64)
+            buckets = np.array(buckets, dtype=np.int64)
+            values = np.array(values, dtype=np.float32)
+
+            oldest = int(self._now) - self.tiers[0].capacity + 1
+            if self._until[1] is not None:
+                oldest = max(oldest, int(self._until[1]))
+            keep = buckets >= oldest
+            self.late += int((~keep).sum())
+            streams, buckets, values = streams[keep], buckets[keep], values[keep]
+
+            blocks, rows = np.divmod(streams, BLOCK_STREAMS)
+            ones = np.ones(len(values), dtype=np.uint32)
+            for block in np.unique(blocks).tolist():
+                mask = blocks == block
+                self.tiers[0].merge(block, rows[mask], buckets[mask], values[mask], values[mask],
+                                    values[mask], ones[mask])
+            self.ingested += len(values)
+            return len(values)
+
+    def import_rollups(self, tier_name, printer_id, metric, timestamps, minimum, maximum, mean, count):
+        """Load existing aggregates (e.g. history from another system) straight into one tier.
+
+        `timestamps` are bucket start times; buckets already compacted into
+        coarser tiers are not rolled up again.
+        """
+        position = [tier.name for tier in self.tiers].index(tier_name)
+        tier = self.tiers[position]
+        count = np.asarray(count, dtype=np.uint32)
+        with self._lock:
+            stream = self._stream(printer_id, metric)
+            block, row = divmod(stream, BLOCK_STREAMS)
+            buckets = np.asarray(timestamps, dtype=np.int64) // tier.width
+            tier.merge(block, np.full(len(buckets), row), buckets,
+                       np.asarray(minimum, dtype=np.float32), np.asarray(maximum, dtype=np.float32),
+                       (np.asarray(mean, dtype=np.float64) * count).astype(np.float32), count)
+
+    def compact(self, now=None):
+        """Roll complete buckets of each tier into the next coarser one; returns buckets written per tier."""
+        now = time.time() if now is None else float(now)
+        written = {}
+        with self._lock:
+            self._now = max(self._now, now)
+            for level in range(1, len(self.tiers)):
+                finer, coarse = self.tiers[level - 1], self.tiers[level]
+                ready = now - self.grace if level == 1 else self._until[level - 1]
+                if ready is None:
+                    break
+                end = int(ready // coarse.width)
+                start = self._until[level]
+                if start is None:
+                    # First pass: everything the finer tier still retains
+                    start = int((now - finer.retention) // coarse.width)
+                else:
+                    start = int(start // coarse.width)
+                start = max(start, end - coarse.capacity)
+                if end > start:
+                    written[coarse.name] = self._roll_up(finer, coarse, start, end)
+                    self._until[level] = end * coarse.width
+        return written
+
+    def _roll_up(self, finer, coarse, start, end):
+        ratio = coarse.width // finer.width
+        chunk = max(1, 4096 // ratio)
+        written = 0
+        for first in range(start, end, chunk):
+            buckets = np.arange(first, min(first + chunk, end), dtype=np.int64)
+            fine = (buckets[:, None] * ratio + np.arange(ratio)).ravel()
+            slots = fine % finer.capacity
+            targets = buckets % coarse.capacity
+            shape = (BLOCK_STREAMS, len(buckets), ratio)
+            for source, target in zip(finer.blocks, coarse.blocks):
+                valid = (source['stamp'][:, slots] == (fine + 1).astype(np.uint32)).reshape(shape)
+                count = np.where(valid, source['count'][:, slots].reshape(shape), 0).sum(axis=2)
+                present = count > 0
+                if not present.any():
+                    continue
+                # Only buckets with data are written; the others keep whatever
+                # the slot holds (an expired stamp, or imported rollups)
+                rolled = {
+                    'stamp': np.broadcast_to((buckets + 1).astype(np.uint32), count.shape),
+                    'count': count,
+                    'sum': np.where(valid, source['sum'][:, slots].reshape(shape), 0).sum(axis=2),
+                    'min': np.where(valid, source['min'][:, slots].reshape(shape), np.inf).min(axis=2),
+                    'max': np.where(valid, source['max'][:, slots].reshape(shape), -np.inf).max(axis=2),
+                }
+                for field, values in rolled.items():
+                    target[field][:, targets] = np.where(present, values, target[field][:, targets])
+                written += int(present.sum())
+        return written
+
+    def choose_tier(self, start, step):
+        """Coarsest tier whose buckets are at most `step` seconds and which still covers `start`.
+
+        When the finest fitting tier no longer retains `start`, coarser
+        tiers are used instead, trading resolution for coverage.
+        """
+        position = 0
+        for i, tier in enumerate(self.tiers):
+            if tier.width <= step:
+                position = i
+        while position < len(self.tiers) - 1 and start < self._now - self.tiers[position].retention:
+            position += 1
+        return position
+
+    def query(self, printer_id, metric, start, end, step=None, max_points=500):
+        """Aggregated history of one metric over [start, end).
+
+        Points are `step` seconds apart (by default the range split into
+        about `max_points`), rounded up to a multiple of the tier read.
+        The newest part of the range, not yet compacted into that tier, is
+        read from the finer tiers. Returns None for an unknown stream.
+        """
+        start, end = float(start), float(end)
+        if step is None:
+            step = max(1.0, (end - start) / max_points)
+        with self._lock:
+            stream = self._streams.get((printer_id, metric))
+            if stream is None:
+                return None
+            position = self.choose_tier(start, step)
+            width = self.tiers[position].width
+            step = width * max(1, int(np.ceil(step / width - 1e-9)))
+
+            parts, low = [], start
+            for level in range(position, -1, -1):
+                tier = self.tiers[level]
+                high = end if level == 0 else min(end, self._until[level] or low)
+                if high > low:
+                    oldest = int(self._now // tier.width) - tier.capacity + 1
+                    part = tier.read(stream, low, high, oldest)
+                    if part is not None:
+                        parts.append(part)
+                    low = high
+                if low >= end:
+                    break
+
+        result = {'printer_id': printer_id, 'metric': metric, 'tier': self.tiers[position].name,
+                  'step': step, 'timestamps': [], 'min': [], 'max': [], 'mean': [], 'count': []}
+        if not parts:
+            return result
+        times, minimum, maximum, total, count = (np.concatenate(column) for column in zip(*parts))
+        if not len(times):
+            return result
+        points = times // step
+        starts = np.flatnonzero(np.r_[True, points[1:] != points[:-1]])
+        counts = np.add.reduceat(count, starts)
+        result.update({
+            'timestamps': (points[starts] * step).tolist(),
+            'min': np.minimum.reduceat(minimum, starts).astype(np.float64).tolist(),
+            'max': np.maximum.reduceat(maximum, starts).astype(np.float64).tolist(),
+            'mean': (np.add.reduceat(total, starts) / counts).tolist(),
+            'count': counts.tolist(),
+        })
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'streams': len(self._streams),
+                'ingested': self.ingested,
+                'late': self.late,
+                'bytes': self.nbytes,
+                'tiers': {
+                    tier.name: {
+                        'bucket_seconds': tier.width,
+                        'retention_seconds': tier.retention,
+                        'compacted_until': self._until[i],
+                    }
+                    for i, tier in enumerate(self.tiers)
+                },
+            }
+
+    def start(self, interval=10.0):
+        """Run compaction every `interval` seconds in a background thread."""
+        if self._worker is not None:
+            return
+        self._stop.clear()
+        self._worker = threading.Thread(target=self._run, args=(interval,), name='telemetry-compaction',
+                                        daemon=True)
+        self._worker.start()
+
+    def stop(self, timeout=5.0):
+        if self._worker is None:
+            return
+        self._stop.set()
+        self._worker.join(timeout)
+        self._worker = None
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.compact()
+            except Exception as e:
+                logger.error("Telemetry compaction failed: %s", str(e))
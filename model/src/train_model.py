@@ -1,3 +1,4 @@
+import argparse
 import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split, GridSearchCV
@@ -8,6 +9,8 @@ from sklearn.ensemble import GradientBoostingClassifier
 from sklearn.metrics import classification_report, confusion_matrix
 import joblib
 from maintenance_rules import MATERIAL_PROPERTIES, calculate_wear_factor, analyze_thermal_stress
+from dataset_cache import load_dataset
+from drift import DriftSketch, reference_path
 import random
 from scipy.stats import norm
 import os
@@ -18,7 +21,6 @@ def ensure_model_directory():
     if not os.path.exists(model_dir):
         os.makedirs(model_dir)
     return model_dir
-        os.makedirs('models')
 
 def calculate_material_stress(params, material_props):
     """Calculate material-specific stress factors."""
@@ -179,37 +181,48 @@ def create_preprocessing_pipeline(X):
             ('cat', categorical_transformer, categorical_features)
         ])
 
-def train_model():
-    """Train the maintenance prediction model with advanced features and tuning."""
+def build_model(X, **classifier_params):
+    """Create the preprocessing + gradient boosting pipeline (unfitted)."""
+    params = dict(
+        n_estimators=300,
+        learning_rate=0.05,
+        max_depth=6,
+        min_samples_split=50,
+        min_samples_leaf=20,
+        random_state=42
+    )
+    params.update(classifier_params)
+    return Pipeline([
+        ('preprocessor', create_preprocessing_pipeline(X)),
+        ('classifier', GradientBoostingClassifier(**params))
+    ])
+
+def train_model(data_path=None):
+    """Train the maintenance prediction model with advanced features and tuning.
+
+    Trains on synthetic data unless `data_path` points at a CSV, which is
+    loaded through its columnar cache (see dataset_cache).
+    """
     try:
         print("Ensuring model directory exists...")
         ensure_model_directory()
         
-        print("Generating synthetic training data...")
-        df = generate_synthetic_data()
+        if data_path:
+            print(f"Loading training data from {data_path}...")
+            df = load_dataset(data_path)
+        else:
+            print("Generating synthetic training data...")
+            df = generate_synthetic_data()
         
         # Split features and target
-        X = df.drop(['maintenance_needed', 'health_score'], axis=1)
+        X = df.drop(columns=['maintenance_needed', 'health_score'], errors='ignore')
         y = df['maintenance_needed']
         
         # Split data
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
         
         print("Creating preprocessing pipeline...")
-        preprocessor = create_preprocessing_pipeline(X)
-        
-        # Create model pipeline
-        model = Pipeline([
-            ('preprocessor', preprocessor),
-            ('classifier', GradientBoostingClassifier(
-                n_estimators=300,
-                learning_rate=0.05,
-                max_depth=6,
-                min_samples_split=50,
-                min_samples_leaf=20,
-                random_state=42
-            ))
-        ])
+        model = build_model(X)
         
         # Define parameter grid
         param_grid = {
@@ -244,6 +257,10 @@ def train_model():
         model_path = os.path.join(model_dir, 'printer_model.pkl')
         joblib.dump(best_model, model_path)
         print(f"Model saved to: {model_path}")
+
+        # Reference distribution for input drift monitoring, next to the model
+        DriftSketch.from_frame(X_train).save(reference_path(model_path))
+        print(f"Drift reference saved to: {reference_path(model_path)}")
         
         # Store feature names
         best_model.feature_names_in_ = list(X.columns)
@@ -255,8 +272,11 @@ def train_model():
         raise
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Train the maintenance prediction model.')
+    parser.add_argument('--data', help='training CSV (default: generate synthetic data)')
+    args = parser.parse_args()
     try:
-        model = train_model()
+        model = train_model(args.data)
         print("Model training completed successfully!")
     except Exception as e:
         print(f"Failed to train model: {str(e)}")
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The backend modules import each other by name from src/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
@@ -0,0 +1,99 @@
+from alert_store import AlertStore
+
+NOW = 1_790_000_000.0
+
+
+def forecast_alert(days):
+    return {'type': 'warning', 'message': f'Nozzle maintenance due in {days:.1f} days', 'component': 'Nozzle',
+            'priority': 'medium', 'due_date': f'in {days} days'}
+
+
+def overdue_alert():
+    return {'type': 'critical', 'message': 'Belt maintenance is overdue', 'component': 'Belt', 'priority': 'high'}
+
+
+def test_repeats_with_changing_message_roll_up():
+    store = AlertStore(dedup_window=3600.0)
+    first, = store.ingest('p1', [forecast_alert(6.9)], now=NOW)
+    second, = store.ingest('p1', [forecast_alert(6.8)], now=NOW + 60)
+    assert second is first
+    assert len(store) == 1 and len(store.open_alerts(now=NOW + 60)) == 1
+    alert = store.get(first.id, now=NOW + 60)
+    assert alert['count'] == 2
+    assert alert['message'] == 'Nozzle maintenance due in 6.8 days'
+    assert alert['due_date'] == 'in 6.8 days'
+
+
+def test_late_occurrence_does_not_replace_newer_message():
+    store = AlertStore()
+    record, = store.ingest('p1', [forecast_alert(6.8)], now=NOW + 60)
+    store.ingest('p1', [forecast_alert(6.9)], now=NOW)
+    assert record.count == 2 and record.message == 'Nozzle maintenance due in 6.8 days'
+
+
+def test_type_component_and_printer_keep_alerts_apart():
+    store = AlertStore()
+    store.ingest('p1', [forecast_alert(6.9), {**forecast_alert(0.0), 'type': 'critical'},
+                        {**forecast_alert(5.0), 'component': 'Bed'}], now=NOW)
+    store.ingest('p2', [forecast_alert(6.9)], now=NOW)
+    assert len(store) == 4
+
+
+def test_repeat_after_window_starts_new_record():
+    store = AlertStore(dedup_window=3600.0)
+    first, = store.ingest('p1', [forecast_alert(6.9)], now=NOW)
+    second, = store.ingest('p1', [forecast_alert(3.0)], now=NOW + 7200)
+    assert second.id != first.id
+    assert [record.id for record in store.open_alerts(now=NOW + 7200)] == [second.id]
+
+
+def test_ingest_reports_records_it_opened():
+    store = AlertStore()
+    store.ingest('p1', [forecast_alert(6.9)], now=NOW)
+    opened = []
+    records = store.ingest('p1', [forecast_alert(6.8), overdue_alert(), overdue_alert()], now=NOW + 60, opened=opened)
+    assert [record.id for record in opened] == [records[1].id]
+    assert opened[0].count == 2
+
+
+def test_moved_printer_keeps_rolling_up():
+    source, target = AlertStore(), AlertStore()
+    source.ingest('p1', [forecast_alert(6.9)], now=NOW)
+    target.import_printer('p1', source.export_printer('p1'))
+    record, = target.ingest('p1', [forecast_alert(6.5)], now=NOW + 60)
+    assert record.count == 2 and len(target) == 1
+
+
+def test_import_reports_new_ids():
+    source, target = AlertStore(), AlertStore()
+    target.ingest('p2', [forecast_alert(6.9)], now=NOW)
+    original, = source.ingest('p1', [forecast_alert(6.9)], now=NOW)
+    renamed = target.import_printer('p1', source.export_printer('p1'))
+    assert renamed == [(original.id, 1)]
+    assert target.get(1, now=NOW)['first_seen'] == original.first_seen
+
+
+def test_distinct_alerts_for_one_component_stay_apart():
+    from anomaly import SPIKE, detection_alert
+    from maintenance_rules import generate_alerts
+
+    store = AlertStore()
+    job = {'material': 'PLA', 'nozzle_temperature': 260.0, 'bed_temperature': 100.0, 'print_speed': 150.0,
+           'fan_speed': 0.0, 'layer_height': 0.35, 'wall_thickness': 0.4, 'nozzle_diameter': 0.4,
+           'infill_density': 20.0, 'infill_pattern': 'grid', 'print_time': 2.0}
+    alerts = generate_alerts(job)
+    recommendations = [a for a in alerts if a['component'] == 'Material Settings']
+    assert len(recommendations) > 1
+    store.ingest('p1', alerts, now=NOW)
+    assert len(store) == len(alerts)
+
+    spikes = [detection_alert(metric, SPIKE, 9.0, 1.0) for metric in ('motorVibrationX', 'motorVibrationY')]
+    store.ingest('p1', spikes, now=NOW)
+    assert len(store) == len(alerts) + 2
+
+    overdue = {'type': 'critical', 'message': 'Nozzle maintenance overdue', 'component': 'Nozzle',
+               'priority': 'critical'}
+    wear = {'type': 'critical', 'message': 'High wear conditions detected', 'component': 'Nozzle',
+            'priority': 'critical'}
+    store.ingest('p2', [overdue, wear], now=NOW)
+    assert len(store) == len(alerts) + 4
@@ -0,0 +1,59 @@
+import math
+
+import numpy as np
+import pytest
+
+from anomaly import SPIKE, StreamingDetector, process_telemetry, telemetry_values
+
+
+def baseline(detector, printer_id='p1', n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    samples = [{'motorVibrationX': 1.0 + 0.05 * rng.standard_normal()} for _ in range(n)]
+    assert process_telemetry(detector, printer_id, samples) == []
+
+
+def test_spike_is_reported_once():
+    detector = StreamingDetector()
+    baseline(detector)
+    alerts = process_telemetry(detector, 'p1', [{'motorVibrationX': 5.0}, {'motorVibrationX': 1.0}])
+    assert [alert['message'] for alert in alerts] == ['Sudden change in X motor vibration']
+    assert alerts[0]['score'] > detector.spike_z
+
+
+def test_slow_drift_is_reported():
+    detector = StreamingDetector()
+    baseline(detector)
+    found = []
+    for step in range(1, 200):
+        found += process_telemetry(detector, 'p1', [{'motorVibrationX': 1.0 + 0.002 * step}])
+    assert found and 'drifting upward' in found[0]['message']
+
+
+def test_temperature_is_tracked_against_target():
+    assert dict(telemetry_values({'extruderTemp': 212.0, 'extruderTargetTemp': 210.0})) == {'extruderTemp': 2.0}
+
+
+@pytest.mark.parametrize('sample', [{'motorVibrationX': math.nan}, {'bedTemp': math.inf},
+                                    {'extruderTemp': 210.0, 'extruderTargetTemp': math.nan}])
+def test_non_finite_values_are_rejected(sample):
+    with pytest.raises(ValueError):
+        list(telemetry_values(sample))
+
+
+def test_non_finite_value_leaves_state_untouched():
+    detector = StreamingDetector()
+    baseline(detector)
+    before = detector.export_printer('p1')
+    stream = detector.stream_index('p1', 'motorVibrationX')
+    with pytest.raises(ValueError):
+        detector.process([stream, stream], [1.0, math.nan])
+    assert detector.export_printer('p1') == before
+
+
+def test_streams_are_independent():
+    detector = StreamingDetector()
+    baseline(detector, 'p1')
+    baseline(detector, 'p2', seed=1)
+    streams = [detector.stream_index('p1', 'motorVibrationX'), detector.stream_index('p2', 'motorVibrationX')]
+    detections = detector.process(streams, [5.0, 1.0])
+    assert [(int(stream), int(kind)) for _, stream, kind, _ in detections] == [(streams[0], SPIKE)]
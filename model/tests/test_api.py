@@ -0,0 +1,171 @@
+import math
+import time
+
+import pytest
+
+import api
+
+JOB = {
+    'material': 'PLA',
+    'nozzle_temperature': 205.0,
+    'bed_temperature': 60.0,
+    'print_speed': 60.0,
+    'fan_speed': 100.0,
+    'layer_height': 0.2,
+    'wall_thickness': 1.2,
+    'nozzle_diameter': 0.4,
+    'infill_density': 20.0,
+    'infill_pattern': 'grid',
+    'print_time': 2.5,
+}
+
+
+@pytest.fixture
+def client():
+    return api.app.test_client()
+
+
+def test_predict_scores_known_job(client):
+    response = client.post('/predict', json=JOB)
+    assert response.status_code == 200
+    assert 0.0 <= response.get_json()['maintenance_probability'] <= 1.0
+
+
+def test_predict_gyroid_infill_returns_rule_scores(client):
+    # gyroid is the dashboard's default pattern but not one the model was trained on
+    response = client.post('/predict', json={**JOB, 'infill_pattern': 'gyroid'})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['status'] == 'success'
+    assert 'wear_factor' in body and 'thermal_stress' in body
+    if api.model is not None:
+        assert 'maintenance_probability' not in body
+
+
+def test_batch_with_gyroid_job_scores_the_others(client):
+    response = client.post('/predict/batch', json={'jobs': [JOB, {**JOB, 'infill_pattern': 'gyroid'}]})
+    assert response.status_code == 200
+    first, second = response.get_json()['results']
+    if api.model is not None:
+        assert 'maintenance_probability' in first
+        assert 'maintenance_probability' not in second
+
+
+def test_failed_scoring_records_nothing_for_the_printer(client, monkeypatch):
+    if api.model is None:
+        pytest.skip('no model loaded')
+
+    def fail(frame):
+        raise RuntimeError('model unavailable')
+
+    monkeypatch.setattr(api.model, 'predict_proba', fail, raising=False)
+    response = client.post('/predict', json={**JOB, 'printer_id': 'test-failed-scoring'})
+    assert response.status_code == 500
+    assert api.forecaster.forecast_printer('test-failed-scoring') is None
+
+
+def test_printer_job_gets_forecast_without_due_alerts(client):
+    response = client.post('/predict', json={**JOB, 'printer_id': 'test-first-job'})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert all(info['days_remaining'] is None for info in body['maintenance_forecast'].values())
+    assert not any('maintenance due' in str(alert) for alert in body['alerts'])
+
+
+def telemetry(timestamp):
+    return {'printer_id': 'test-telemetry', 'samples': [{'timestamp': timestamp, 'extruderTemp': 205.0}]}
+
+
+def test_telemetry_millisecond_timestamps_are_converted(client):
+    now = time.time()
+    response = client.post('/telemetry', json=telemetry(now * 1000))
+    assert response.status_code == 200
+    history = api.telemetry_store.query('test-telemetry', 'extruderTemp', now - 60, now + 60)
+    assert history['timestamps'] and abs(history['timestamps'][-1] - now) < 2
+
+
+@pytest.mark.parametrize('offset', [-api.app.config['TELEMETRY_RETENTION']['raw'] - 60,
+                                    api.app.config['TELEMETRY_LATE_GRACE'] + 60])
+def test_telemetry_rejects_timestamps_outside_raw_window(client, offset):
+    response = client.post('/telemetry', json=telemetry(time.time() + offset))
+    assert response.status_code == 400
+    assert 'outside the accepted range' in response.get_json()['error']
+
+
+def test_telemetry_rejects_non_numeric_timestamp(client):
+    assert client.post('/telemetry', json=telemetry('yesterday')).status_code == 400
+
+
+@pytest.mark.parametrize('value', ['NaN', 'Infinity', '-Infinity'])
+def test_telemetry_rejects_non_finite_values(client, value):
+    body = '{"printer_id": "test-nan", "samples": [{"extruderTemp": %s}, {"bedTemp": 60.0}]}' % value
+    response = client.post('/telemetry', data=body, content_type='application/json')
+    assert response.status_code == 400
+    assert 'finite' in response.get_json()['error']
+    assert api.telemetry_store.query('test-nan', 'bedTemp', 0, time.time() + 60) is None
+
+
+def test_non_string_printer_id_is_rejected(client):
+    assert client.post('/predict', json={**JOB, 'printer_id': 42}).status_code == 400
+    response = client.post('/predict/batch', json={'jobs': [JOB, {**JOB, 'printer_id': 42}]})
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith('Job 1:')
+    assert client.post('/telemetry', json={**telemetry(time.time()), 'printer_id': 42}).status_code == 400
+
+
+def test_alert_repeated_within_a_call_is_pushed(monkeypatch):
+    pushed = []
+    monkeypatch.setattr(api.push_hub, 'publish_alerts', lambda printer_id, alerts: pushed.extend(alerts))
+    alert = {'type': 'critical', 'message': 'Repeated in one call', 'component': 'Belt', 'priority': 'high'}
+    api.store_alerts('printer-push', [alert, alert])
+    assert [(a['message'], a['count']) for a in pushed] == [('Repeated in one call', 2)]
+    api.store_alerts('printer-push', [alert])
+    assert len(pushed) == 1
+
+
+@pytest.mark.parametrize('timestamp', ['abc', None, -1, time.time() + 3600])
+def test_job_timestamp_is_validated(client, timestamp):
+    job = {**JOB, 'printer_id': 'test-job-timestamp', 'timestamp': timestamp}
+    response = client.post('/predict', json=job)
+    if timestamp is None:
+        assert response.status_code == 200
+    else:
+        assert response.status_code == 400
+        assert 'timestamp' in response.get_json()['error']
+
+
+def test_invalid_timestamp_in_batch_records_nothing(client):
+    job = {**JOB, 'printer_id': 'test-batch-timestamp'}
+    jobs = [job, {**job, 'timestamp': 'abc'}]
+    response = client.post('/predict/batch', json={'jobs': jobs})
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith('Job 1:')
+    assert api.forecaster.forecast_printer('test-batch-timestamp') is None
+
+
+def test_job_millisecond_timestamp_is_converted(client):
+    now = time.time()
+    response = client.post('/predict', json={**JOB, 'printer_id': 'test-job-ms', 'timestamp': now * 1000})
+    assert response.status_code == 200
+    assert abs(api.forecaster.export_printer('test-job-ms')['last'][0] - now) < 2
+
+
+@pytest.mark.parametrize('limit', ['-1', '2.5', 'ten'])
+def test_forecast_rejects_bad_limit(client, limit):
+    assert client.get('/forecast', query_string={'limit': limit}).status_code == 400
+
+
+def test_explanation_adds_up_to_the_prediction(client):
+    if api.explainer is None:
+        pytest.skip('no explainable model loaded')
+    response = client.post('/predict/batch?explain=true', json={'jobs': [JOB, {**JOB, 'material': 'ABS'}]})
+    assert response.status_code == 200
+    for result in response.get_json()['results']:
+        explanation = result['explanation']
+        probability = result['maintenance_probability']
+        if explanation['output'] == 'probability':
+            prediction = probability
+        else:
+            prediction = math.log(probability / (1.0 - probability))
+        total = explanation['base_value'] + sum(explanation['contributions'].values())
+        assert total == pytest.approx(prediction, abs=1e-6)
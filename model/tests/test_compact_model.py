@@ -0,0 +1,36 @@
+import pytest
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from compact_model import explainer_for, export_arrays, known_categories
+from train_model import build_model, generate_synthetic_data
+
+
+@pytest.fixture(scope='module')
+def data():
+    df = generate_synthetic_data(300)
+    return df.drop(['maintenance_needed', 'health_score'], axis=1), df['maintenance_needed']
+
+
+def test_export_single_step_pipelines(data):
+    X, y = data
+    model = build_model(X, n_estimators=5, max_depth=3).fit(X, y)
+    export_arrays(model)
+    assert set(known_categories(model)) == {'material', 'infill_pattern'}
+
+
+def test_export_rejects_multi_step_preprocessing(data):
+    X, y = data
+    model = build_model(X, n_estimators=5, max_depth=3)
+    numeric = model.named_steps['preprocessor'].transformers[0][2]
+    model.set_params(preprocessor=ColumnTransformer([
+        ('num', Pipeline([('impute', SimpleImputer()), ('scaler', StandardScaler())]), numeric),
+    ]))
+    model.fit(X[numeric], y)
+    with pytest.raises(ValueError, match='impute, scaler'):
+        export_arrays(model)
+    # Callers that only inspect the model fall back instead of failing
+    assert known_categories(model) == {}
+    assert explainer_for(model) is None
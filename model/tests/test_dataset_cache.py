@@ -0,0 +1,47 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dataset_cache import default_cache_dir, load_columns, load_dataset, read_manifest
+from train_model import generate_synthetic_data
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = str(tmp_path / 'data.csv')
+    generate_synthetic_data(200).to_csv(path, index=False)
+    return path
+
+
+def test_cache_round_trip(csv_path):
+    original = pd.read_csv(csv_path)
+    cached = load_dataset(csv_path)
+    assert os.path.exists(os.path.join(default_cache_dir(csv_path), 'manifest.json'))
+    assert list(cached.columns) == list(original.columns)
+    for name in original.columns:
+        if pd.api.types.is_numeric_dtype(original[name]):
+            np.testing.assert_allclose(cached[name].to_numpy(dtype=np.float64), original[name], rtol=1e-6)
+        else:
+            assert cached[name].astype(str).tolist() == original[name].tolist()
+    assert cached['maintenance_needed'].dtype == np.uint8
+
+
+def test_columns_are_memory_mapped(csv_path):
+    frame = load_dataset(csv_path)
+    arrays, manifest = load_columns(default_cache_dir(csv_path))
+    assert manifest['rows'] == len(frame)
+    assert all(isinstance(values, np.memmap) for values in arrays.values())
+    # The frame reads the mapped file rather than a copy
+    numeric = next(column['name'] for column in manifest['columns'] if column['kind'] == 'numeric')
+    assert isinstance(frame[numeric].to_numpy().base, np.memmap)
+    arrays, _ = load_columns(default_cache_dir(csv_path), mmap=False)
+    assert not any(isinstance(values, np.memmap) for values in arrays.values())
+
+
+def test_changed_csv_rebuilds_cache(csv_path):
+    load_dataset(csv_path)
+    generate_synthetic_data(50).to_csv(csv_path, index=False)
+    assert len(load_dataset(csv_path)) == 50
+    assert read_manifest(default_cache_dir(csv_path))['rows'] == 50
@@ -0,0 +1,51 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from drift import NUMERIC_FEATURES, DriftSketch, binned_ks, compare, psi
+
+
+def test_psi_and_ks_of_a_known_shift():
+    expected = np.array([50.0, 50.0])
+    actual = np.array([80.0, 20.0])
+    assert psi(expected, actual) == pytest.approx(0.3 * math.log(1.6) + 0.3 * math.log(2.5))
+    assert binned_ks(expected, actual) == pytest.approx(0.3)
+    assert psi(expected, expected * 3) == 0.0 and binned_ks(expected, expected * 3) == 0.0
+
+
+def jobs(n, seed, shift=0.0):
+    """Model inputs from a fixed distribution, with `shift` added to print_speed."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({name: rng.normal(100.0, 10.0, n) for name in NUMERIC_FEATURES})
+    df['print_speed'] += shift
+    df['material'] = rng.choice(['PLA', 'PETG'], n)
+    df['infill_pattern'] = rng.choice(['grid', 'lines'], n)
+    return df
+
+
+@pytest.fixture(scope='module')
+def reference():
+    return DriftSketch.from_frame(jobs(40000, seed=0))
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_same_distribution_is_stable(reference, seed):
+    live = reference.empty_like()
+    live.update(jobs(10000, seed))
+    report = compare(reference, live)
+    assert report['drifted'] == []
+    assert all(entry['status'] == 'stable' for entry in report['materials'].values())
+
+
+def test_shifted_feature_is_reported(reference):
+    live = reference.empty_like()
+    live.update(jobs(10000, seed=1, shift=10.0))
+    report = compare(reference, live)
+    assert sorted(report['drifted']) == ['PETG/print_speed', 'PLA/print_speed']
+    for entry in report['materials'].values():
+        scores = entry['features']['print_speed']
+        # A one-sigma shift of a normal: PSI about 1, KS about 0.38
+        assert scores['status'] == 'significant' and scores['psi'] > 0.5
+        assert scores['ks'] == pytest.approx(0.38, abs=0.03)
@@ -0,0 +1,76 @@
+import math
+
+import numpy as np
+
+from forecasting import COMPONENTS, ComponentForecaster, forecast_alerts
+
+DAY = 86400.0
+START = 1_790_000_000.0
+INCREMENT = np.full(len(COMPONENTS), 0.01)
+
+
+def days_remaining(forecaster, printer_id='p1'):
+    forecast = forecaster.forecast_printer(printer_id)
+    return {component: info['days_remaining'] for component, info in forecast['components'].items()}
+
+
+def test_first_event_has_no_forecast():
+    forecaster = ComponentForecaster()
+    forecaster.update('p1', INCREMENT, START)
+    assert all(days is None for days in days_remaining(forecaster).values())
+    assert forecast_alerts(forecaster.forecast_printer('p1')) == []
+    _, _, rate, remaining = forecaster.forecast()
+    assert np.isnan(rate).all() and np.isnan(remaining).all()
+
+
+def test_events_closer_than_a_day_have_no_forecast():
+    forecaster = ComponentForecaster()
+    for hour in range(6):
+        forecaster.update('p1', INCREMENT, START + hour * 3600)
+    assert all(days is None for days in days_remaining(forecaster).values())
+
+
+def test_steady_use_forecasts_remaining_life():
+    forecaster = ComponentForecaster(forgetting=1.0)
+    for day in range(10):
+        forecaster.update('p1', INCREMENT, START + day * DAY)
+    # 0.1 worn at 0.01 per day
+    for days in days_remaining(forecaster).values():
+        assert math.isclose(days, 90.0, rel_tol=1e-6)
+
+
+def test_reset_component_waits_for_new_history():
+    forecaster = ComponentForecaster(forgetting=1.0)
+    for day in range(10):
+        forecaster.update('p1', INCREMENT, START + day * DAY)
+    forecaster.reset('p1', 'nozzle', START + 10 * DAY)
+    forecaster.update('p1', INCREMENT, START + 30 * DAY)
+
+    remaining = days_remaining(forecaster)
+    assert remaining['nozzle'] is None
+    assert remaining['bed'] is not None
+    assert all(alert['component'] != 'Nozzle' for alert in forecast_alerts(forecaster.forecast_printer('p1')))
+
+    forecaster.update('p1', INCREMENT, START + 32 * DAY)
+    # 0.02 worn at 0.005 per day since the reset, not the pre-reset history
+    assert math.isclose(days_remaining(forecaster)['nozzle'], 196.0, rel_tol=1e-6)
+
+
+def test_export_import_keeps_fit_span():
+    source = ComponentForecaster()
+    source.update('p1', INCREMENT, START)
+    target = ComponentForecaster()
+    target.import_printer('p1', source.export_printer('p1'))
+    target.update('p1', INCREMENT, START + 2 * DAY)
+    assert all(days is not None for days in days_remaining(target).values())
+
+
+def test_drop_and_grow_keep_other_printers():
+    forecaster = ComponentForecaster(initial_capacity=2)
+    for day in (0, 2):
+        for printer_id in ('p1', 'p2', 'p3'):
+            forecaster.update(printer_id, INCREMENT, START + day * DAY)
+    forecaster.drop_printer('p1')
+    forecaster.update('p4', INCREMENT, START + 3 * DAY)
+    assert days_remaining(forecaster, 'p3')['nozzle'] is not None
+    assert days_remaining(forecaster, 'p4')['nozzle'] is None
@@ -0,0 +1,49 @@
+import os
+
+import pytest
+from flask import Flask
+
+from profiling import init_profiling
+
+
+@pytest.fixture
+def profiled(tmp_path):
+    app = Flask(__name__)
+    app.config.update(PROFILING_ENABLED=True, PROFILING_DIR=str(tmp_path), PROFILING_MAX_SECONDS=1,
+                      PROFILING_MAX_PROFILES=3, PROFILING_ADMIN_TOKEN='secret')
+
+    @app.route('/ping')
+    def ping():
+        return 'pong'
+
+    init_profiling(app)
+    return app, tmp_path
+
+
+def test_request_profiling_needs_the_admin_token(profiled):
+    app, _ = profiled
+    client = app.test_client()
+    assert 'X-Profile-Id' not in client.get('/ping', headers={'X-Profile': '1'}).headers
+    assert 'X-Profile-Id' not in client.get('/ping?profile=1', headers={'X-Admin-Token': 'wrong'}).headers
+    assert 'X-Profile-Id' in client.get('/ping', headers={'X-Profile': '1', 'X-Admin-Token': 'secret'}).headers
+
+    app.config['PROFILING_ADMIN_TOKEN'] = None
+    assert 'X-Profile-Id' not in client.get('/ping', headers={'X-Profile': '1'}).headers
+
+
+def test_old_profiles_are_removed(profiled):
+    app, profile_dir = profiled
+    client = app.test_client()
+    ids = [client.get('/ping', headers={'X-Profile': '1', 'X-Admin-Token': 'secret'}).headers['X-Profile-Id']
+           for _ in range(5)]
+    assert sorted(os.listdir(profile_dir)) == [f'{profile_id}.prof' for profile_id in sorted(ids)[-3:]]
+
+
+@pytest.mark.parametrize('query, status', [('', 200), ('?sort=tottime&limit=5', 200), ('?limit=ten', 400),
+                                           ('?limit=-1', 400), ('?sort=bogus', 400)])
+def test_profile_report_arguments_are_validated(profiled, query, status):
+    app, _ = profiled
+    client = app.test_client()
+    admin = {'X-Admin-Token': 'secret'}
+    profile_id = client.get('/ping', headers={'X-Profile': '1', **admin}).headers['X-Profile-Id']
+    assert client.get(f'/admin/profiles/{profile_id}{query}', headers=admin).status_code == status
@@ -0,0 +1,95 @@
+import pytest
+
+import api
+from rate_limiter import MemoryBucketStorage, TokenBucketLimiter, create_storage
+from test_api import JOB
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def storage(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryBucketStorage()
+    return create_storage(f"sqlite:///{tmp_path / 'buckets.db'}")
+
+
+def test_bucket_refills_over_time(storage):
+    assert storage.consume('k', 10, 10, 1.0, 0.0) == (True, 0.0)
+    allowed, _ = storage.consume('k', 1, 10, 1.0, 0.5)
+    assert not allowed
+    allowed, remaining = storage.consume('k', 1, 10, 1.0, 2.0)
+    assert allowed and remaining == pytest.approx(1.0)
+
+
+def test_expire_drops_idle_buckets(storage):
+    storage.consume('old', 1, 10, 1.0, 0.0)
+    storage.consume('new', 1, 10, 1.0, 100.0)
+    assert storage.expire(50.0) == 1
+    # A dropped bucket starts full again
+    assert storage.consume('old', 10, 10, 1.0, 101.0)[0]
+
+
+def test_cost_above_capacity_takes_a_full_bucket():
+    limiter = TokenBucketLimiter(MemoryBucketStorage(), capacity=100, refill_rate=10.0)
+    assert limiter.consume('k', 500)[0]
+    allowed, _, retry_after = limiter.consume('k', 500)
+    assert not allowed and 0 < retry_after <= 10.0
+
+
+def test_overrides_and_explicit_limits():
+    limiter = TokenBucketLimiter(MemoryBucketStorage(), capacity=10, refill_rate=1.0,
+                                 overrides={'key:big': (1000, 1.0)}, printer_limit=(2, 1.0))
+    assert limiter.consume('key:big', 500)[0]
+    assert limiter.consume('key:small', 20)[0]  # capped at 10, a full bucket
+    assert limiter.consume('p', 1, limiter.printer_limit)[0]
+    assert limiter.consume('p', 1, limiter.printer_limit)[0]
+    assert not limiter.consume('p', 1, limiter.printer_limit)[0]
+
+
+@pytest.fixture
+def limited(monkeypatch):
+    limiter = TokenBucketLimiter(MemoryBucketStorage(), capacity=api.app.config['MAX_BATCH_SIZE'],
+                                 refill_rate=0.001, printer_limit=(3, 0.001))
+    monkeypatch.setattr(api, 'rate_limiter', limiter)
+    monkeypatch.setitem(api.app.config, 'RATE_LIMIT_API_KEYS', frozenset({'fleet'}))
+    return api.app.test_client()
+
+
+def test_full_batch_is_not_rate_limited(limited):
+    response = limited.post('/predict/batch', json={'jobs': [JOB] * 700})
+    assert response.status_code == 200
+    response = limited.post('/predict/batch', json={'jobs': [JOB] * 700})
+    assert response.status_code == 429
+    assert response.get_json()['retry_after'] > 0 and 'Retry-After' in response.headers
+
+
+def test_oversized_batch_gets_413(limited):
+    response = limited.post('/predict/batch', json={'jobs': [JOB] * (api.app.config['MAX_BATCH_SIZE'] + 1)})
+    assert response.status_code == 413
+
+
+def test_printer_quota_under_api_key(limited):
+    headers = {'X-API-Key': 'fleet'}
+    for _ in range(3):
+        assert limited.post('/predict', json={**JOB, 'printer_id': 'p1'}, headers=headers).status_code == 200
+    assert limited.post('/predict', json={**JOB, 'printer_id': 'p1'}, headers=headers).status_code == 429
+    # Other printers under the same key still have their own quota
+    assert limited.post('/predict', json={**JOB, 'printer_id': 'p2'}, headers=headers).status_code == 200
+    response = limited.post('/predict/batch', json={'jobs': [{**JOB, 'printer_id': 'p3'}] * 4}, headers=headers)
+    assert response.status_code == 200  # four jobs are capped at the printer's full bucket
+
+
+def test_unknown_api_key_is_limited_by_address(limited):
+    limited.post('/predict/batch', json={'jobs': [JOB] * 1000}, headers={'X-API-Key': 'rotating-1'})
+    response = limited.post('/predict', json=JOB, headers={'X-API-Key': 'rotating-2'})
+    assert response.status_code == 429
+
+
+def test_forwarded_client_address_behind_trusted_proxy(limited, monkeypatch):
+    from werkzeug.middleware.proxy_fix import ProxyFix
+
+    monkeypatch.setattr(api.app, 'wsgi_app', ProxyFix(api.app.wsgi_app, x_for=1))
+    first = {'X-Forwarded-For': '10.0.0.1'}
+    assert limited.post('/predict/batch', json={'jobs': [JOB] * 1000}, headers=first).status_code == 200
+    assert limited.post('/predict', json=JOB, headers=first).status_code == 429
+    # Another client behind the same proxy has its own bucket
+    assert limited.post('/predict', json=JOB, headers={'X-Forwarded-For': '10.0.0.2'}).status_code == 200
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+import api
+from response_surface import AXES, OUTPUTS, ResponseSurface, axis_bounds
+
+BUDGET = {'wear_factor': 0.06, 'thermal_stress': 0.01, 'maintenance_probability': 0.2}
+
+
+def linear_surface(model_sha256='model-hash', error=0.01):
+    """A PLA/grid surface with two knots per axis holding a linear function of the inputs."""
+    knots = [np.array([bounds]) for bounds in axis_bounds('PLA')]
+    corners = np.array(np.meshgrid(*(k[0] for k in knots), indexing='ij'))
+    total = sum(corners[a] / knots[a][0, 1] for a in range(len(AXES)))
+    table = np.stack([total, 2 * total, total / len(AXES)], axis=-1)[None, None].astype(np.float32)
+    meta = {
+        'version': 1, 'materials': ['PLA'], 'infill_patterns': ['grid'], 'axes': list(AXES),
+        'points': [2] * len(AXES), 'outputs': list(OUTPUTS), 'model_sha256': model_sha256,
+        'error': {name: {'max': error, 'p99': error, 'mean': error} for name in OUTPUTS},
+    }
+    return ResponseSurface(table, knots, meta)
+
+
+def test_lookup_interpolates_inside_the_grid_only(tmp_path):
+    surface = linear_surface()
+    surface.save(tmp_path / 'surface.npz')
+    surface = ResponseSurface.load(tmp_path / 'surface.npz')
+    job = {'material': 'PLA', 'infill_pattern': 'grid', 'layer_height': 0.2, 'wall_thickness': 1.2,
+           'infill_density': 20.0, 'nozzle_temperature': 205.0, 'bed_temperature': 60.0,
+           'print_speed': 60.0, 'fan_speed': 100.0}
+    expected = sum(job[axis] / bounds[1] for axis, bounds in zip(AXES, axis_bounds('PLA')))
+    outputs, inside = surface.lookup([job, {**job, 'material': 'ABS'}, {**job, 'print_speed': 1000.0}])
+    assert inside.tolist() == [True, False, False]
+    assert outputs[0] == pytest.approx([expected, 2 * expected, expected / len(AXES)], rel=1e-5)
+    assert np.isnan(outputs[1:]).all()
+
+
+def test_check_rejects_other_model_and_error_over_budget():
+    linear_surface().check('model-hash', BUDGET)
+    with pytest.raises(ValueError, match='different model'):
+        linear_surface().check('other-hash', BUDGET)
+    with pytest.raises(ValueError, match='over budget'):
+        linear_surface(error=0.5).check('model-hash', BUDGET)
+
+
+def test_api_refuses_surface_built_for_another_model(tmp_path, monkeypatch):
+    model_path = tmp_path / 'model.pkl'
+    model_path.write_bytes(b'model')
+    monkeypatch.setitem(api.app.config, 'MODEL_PATH', str(model_path))
+    monkeypatch.setitem(api.app.config, 'RESPONSE_SURFACE_MAX_ERROR', BUDGET)
+    linear_surface('stale-hash').save(tmp_path / 'stale.npz')
+    linear_surface(api.file_sha256(model_path)).save(tmp_path / 'current.npz')
+    assert api.load_response_surface(str(tmp_path / 'stale.npz')) is None
+    assert api.load_response_surface(str(tmp_path / 'current.npz')) is not None
@@ -0,0 +1,68 @@
+import numpy as np
+
+from alert_store import AlertStore
+from forecasting import ComponentForecaster
+from scheduler import assign_days, maintenance_plan, select_tasks
+
+NOW = 1_790_000_000.0
+
+
+def day_loads(day, hours, days):
+    return [float(hours[day == d].sum()) for d in range(days)]
+
+
+def test_local_search_repacks_days_the_greedy_pass_leaves_short():
+    # Two 2 h days: by value per hour the greedy pass puts both short tasks
+    # on day 0 and only one long task fits after them
+    hours = np.array([1.5, 1.5, 1.5, 1.5, 0.5, 0.5])
+    value = np.array([150.0, 150.0, 150.0, 150.0, 60.0, 60.0])
+    printers = np.arange(6)
+    greedy = select_tasks(printers, hours, value, 2.0, 2, 4.0, max_swaps=0)
+    refined = select_tasks(printers, hours, value, 2.0, 2, 4.0)
+    assert value[greedy >= 0].sum() == 270.0
+    assert value[refined >= 0].sum() == 420.0
+    assert day_loads(refined, hours, 2) == [2.0, 2.0]
+
+
+def test_selection_respects_printer_downtime_and_day_capacity():
+    rng = np.random.default_rng(0)
+    hours = rng.choice([0.5, 1.0, 1.5], 300)
+    value = rng.uniform(-100.0, 2000.0, 300)
+    printers = rng.integers(0, 40, 300)
+    day = select_tasks(printers, hours, value, 16.0, 7, 4.0)
+    assert all(load <= 16.0 for load in day_loads(day, hours, 7))
+    assert all(hours[(day >= 0) & (printers == p)].sum() <= 4.0 for p in range(40))
+    assert (value[day >= 0] > 0).all()
+
+
+def test_urgent_tasks_move_to_earlier_days_without_changing_loads():
+    hours = [1.0, 1.0, 0.5, 1.0]
+    packed = [2, 0, 1, 1]
+    order = [0, 3, 2, 1]  # most urgent first
+    days = assign_days(order, hours, packed)
+    assert days == [0, 1, 1, 2]
+    moved = dict(zip(order, days))
+    assert sorted(day_loads(np.array([moved[i] for i in range(4)]), np.array(hours), 3)) == \
+        sorted(day_loads(np.array(packed), np.array(hours), 3))
+
+
+def test_plan_schedules_every_selected_task_within_the_horizon():
+    store = AlertStore()
+    components = ('Mechanical', 'Extruder', 'Bed', 'Power', 'Temperature Control')
+    for p in range(60):
+        for c, component in enumerate(components):
+            store.ingest(f'printer-{p}', [{'type': 'critical', 'message': f'{component} failing',
+                                           'component': component, 'priority': ('critical', 'high')[c % 2],
+                                           'maintenance_items': ['Check it']}], now=NOW)
+    forecaster = ComponentForecaster()
+    plan = maintenance_plan(store.open_alerts(now=NOW), forecaster.forecast(), NOW,
+                            technicians=1, hours_per_day=8.0, horizon_days=5)
+    assert plan['scheduled'] + plan['deferred'] == plan['candidates'] == 300
+    assert plan['technician_hours_used'] <= plan['technician_hours_available'] == 40.0
+    assert plan['technician_hours_used'] >= 39.0
+    loads = {}
+    for task in plan['tasks']:
+        assert 0 <= task['day'] < 5
+        loads[task['day']] = loads.get(task['day'], 0.0) + task['technician_hours']
+    assert all(load <= 8.0 for load in loads.values())
+    assert plan['net_benefit'] == sum(task['expected_benefit'] for task in plan['tasks'])
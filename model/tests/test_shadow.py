@@ -0,0 +1,58 @@
+import os
+import time
+
+import pytest
+
+from compact_model import load_artifact
+from shadow import ShadowEvaluator
+from test_api import JOB
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), '..', 'models', 'printer_model.npz')
+
+
+@pytest.fixture(scope='module')
+def feature_names():
+    return list(load_artifact(MODEL_PATH).feature_names_in_)
+
+
+def test_candidate_scores_are_recorded(feature_names):
+    shadow = ShadowEvaluator(MODEL_PATH, feature_names, batch_size=4, linger=0.01)
+    try:
+        row = {name: JOB[name] for name in feature_names}
+        for _ in range(10):
+            shadow.submit(row, 0.9, 1.0)
+        assert shadow.drain()
+        stats = shadow.stats()
+        assert stats['submitted'] == stats['scored'] == stats['window'] == 10
+        assert stats['errors'] == stats['worker_errors'] == 0 and stats['workers_alive'] == 1
+    finally:
+        shadow.stop()
+
+
+def test_worker_that_cannot_load_the_candidate_is_reported(tmp_path, feature_names):
+    shadow = ShadowEvaluator(str(tmp_path / 'missing.npz'), feature_names, workers=2, linger=0.01)
+    try:
+        for _ in range(5):
+            shadow.submit({name: JOB[name] for name in feature_names}, 0.5, 1.0)
+        assert shadow.drain()
+        deadline = time.monotonic() + 30
+        while shadow.stats()['worker_errors'] < 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        stats = shadow.stats()
+        assert stats['worker_errors'] == 2 and stats['errors'] == 5 and stats['scored'] == 0
+    finally:
+        shadow.stop()
+
+
+def test_stop_does_not_block_on_a_full_queue(tmp_path, feature_names):
+    # Opening a FIFO blocks until a writer appears, so the worker never starts taking samples
+    fifo = tmp_path / 'hangs.pkl'
+    os.mkfifo(fifo)
+    shadow = ShadowEvaluator(str(fifo), feature_names, queue_size=2)
+    for _ in range(5):
+        shadow.submit({}, 0.5, 1.0)
+    assert shadow.stats()['dropped'] >= 3
+    start = time.monotonic()
+    shadow.stop(timeout=1.0)
+    assert time.monotonic() - start < 5.0
+    assert shadow.stats()['workers_alive'] == 0
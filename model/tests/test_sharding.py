@@ -0,0 +1,317 @@
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from sharding import ShardClient
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    hits = []
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.hits.append(self.path)
+        if self.path == '/slow':
+            time.sleep(0.5)
+        body = json.dumps({'path': self.path}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        # Close without announcing it, as a server dropping an idle keep-alive connection does
+        self.close_connection = self.path == '/close'
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    Handler.hits = []
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_port}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_closed_keep_alive_connection_is_retried(server):
+    client = ShardClient(server, timeout=5.0)
+    assert client.call('POST', '/close', {}) == (200, {'path': '/close'})
+    assert client.call('POST', '/next', {}) == (200, {'path': '/next'})
+    assert Handler.hits == ['/close', '/next']
+
+
+def test_timeout_is_not_retried(server):
+    client = ShardClient(server, timeout=0.2)
+    client.call('POST', '/fast', {})
+    with pytest.raises(TimeoutError):
+        client.call('POST', '/slow', {})
+    time.sleep(0.6)
+    assert Handler.hits == ['/fast', '/slow']
+
+
+def test_router_rejects_non_string_printer_id():
+    import router
+
+    client = router.app.test_client()
+    response = client.post('/predict', json={'printer_id': 42})
+    assert response.status_code == 400
+    response = client.post('/predict/batch', json={'jobs': [{'printer_id': 'p1'}, {'printer_id': 42}]})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Job 1: printer_id must be a string'
+
+
+class FakeBackend:
+    """In-memory stand-in for a shard's /shard/* state transfer endpoints."""
+
+    def __init__(self, printers=()):
+        self.state = {p: {'origin': p, 'alert_id': i} for i, p in enumerate(printers)}
+        self.next_alert_id = len(self.state)
+        self.fail = {}  # path -> number of calls that succeed before it fails
+
+    def call(self, method, path, payload=None):
+        remaining = self.fail.get(path)
+        if remaining is not None:
+            if remaining == 0:
+                return 500, {'error': 'injected failure'}
+            self.fail[path] = remaining - 1
+        if path == '/shard/printers':
+            return 200, {'printer_ids': sorted(self.state)}
+        if path == '/shard/export':
+            return 200, {'printers': {p: self.state[p] for p in payload['printer_ids'] if p in self.state}}
+        if path == '/shard/import':
+            alert_ids = []
+            for p, state in payload['printers'].items():
+                alert_ids.append([state['alert_id'], self.next_alert_id])
+                self.state[p] = dict(state, alert_id=self.next_alert_id)
+                self.next_alert_id += 1
+            return 200, {'alert_ids': alert_ids}
+        if path == '/shard/drop':
+            for p in payload['printer_ids']:
+                self.state.pop(p, None)
+            return 200, {}
+        raise AssertionError(path)
+
+
+@pytest.fixture
+def fake_cluster(monkeypatch):
+    import sharding
+
+    printers = [f'printer-{i:03d}' for i in range(300)]
+    ring = sharding.HashRing(['a', 'b'])
+    backends = {url: FakeBackend([p for p in printers if ring.node_for(p) == url]) for url in ('a', 'b')}
+    backends['c'] = FakeBackend()
+
+    class FakeClient:
+        def __init__(self, url, timeout=None, headers=None):
+            self.url = url
+            self.call = backends[url].call
+
+    monkeypatch.setattr(sharding, 'ShardClient', FakeClient)
+    cluster = sharding.ShardCluster({'a': 'a', 'b': 'b'}, batch_size=10)
+    yield cluster, backends, printers
+    cluster.pool.shutdown()
+
+
+def assert_served_where_held(cluster, backends, printers):
+    for p in printers:
+        holders = [name for name, backend in backends.items() if p in backend.state]
+        assert cluster.owner(p) in holders
+
+
+def test_failed_import_pins_unmoved_printers_until_resumed(fake_cluster):
+    from sharding import ShardError
+
+    cluster, backends, printers = fake_cluster
+    backends['c'].fail['/shard/import'] = 2
+    with pytest.raises(ShardError):
+        cluster.add_shard('c', 'c')
+    stats = cluster.stats()
+    assert 'c' in stats['shards'] and stats['pinned'] > 0 and stats['moving'] == 0
+    assert_served_where_held(cluster, backends, printers)
+
+    del backends['c'].fail['/shard/import']
+    assert cluster.resume_rebalance() == stats['pinned']
+    assert cluster.stats()['pinned'] == 0
+    for p in printers:
+        holders = [name for name, backend in backends.items() if p in backend.state]
+        assert holders == [cluster.ring.node_for(p)] == [cluster.owner(p)]
+
+
+def test_failed_source_drop_is_retried(fake_cluster):
+    from sharding import ShardError
+
+    cluster, backends, printers = fake_cluster
+    backends['a'].fail['/shard/drop'] = 0
+    with pytest.raises(ShardError):
+        cluster.add_shard('c', 'c')
+    assert cluster.stats()['stale'] > 0
+    assert_served_where_held(cluster, backends, printers)
+
+    del backends['a'].fail['/shard/drop']
+    cluster.resume_rebalance()
+    assert cluster.stats()['stale'] == 0 and cluster.stats()['pinned'] == 0
+    for p in printers:
+        assert [name for name, backend in backends.items() if p in backend.state] == [cluster.owner(p)]
+
+
+def test_moved_alerts_keep_their_router_ids(fake_cluster):
+    cluster, backends, printers = fake_cluster
+    issued = {p: cluster.global_alert_id(cluster.owner(p), backends[cluster.owner(p)].state[p]['alert_id'])
+              for p in printers}
+    cluster.add_shard('c', 'c')
+    moved = [p for p in printers if cluster.owner(p) == 'c']
+    assert moved
+    for p in printers:
+        node, local_id = cluster.local_alert_id(cluster.resolve_alert_id(issued[p]))
+        assert (node, local_id) == (cluster.owner(p), backends[cluster.owner(p)].state[p]['alert_id'])
+
+
+class ShardHandler(BaseHTTPRequestHandler):
+    """Minimal /predict/batch backend that echoes which shard scored each job."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        cursor = int(query['cursor'][0]) if 'cursor' in query else None
+        older = [item for item in self.server.alerts if cursor is None or item['id'] < cursor]
+        items = older[:int(query['limit'][0])]
+        next_cursor = items[-1]['id'] if len(older) > len(items) else None
+        self.reply({'status': 'success', 'items': items, 'next_cursor': next_cursor})
+
+    def do_POST(self):
+        data = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append((dict(self.headers), data))
+        for index, job in enumerate(data['jobs']):
+            if job.get('invalid'):
+                return self.reply({'status': 'error', 'error': f'Job {index}: invalid'}, 400)
+        results = [{'printer_id': job.get('printer_id'), 'shard': self.server.name} for job in data['jobs']]
+        self.reply({'status': 'success', 'count': len(results), 'results': results})
+
+    def reply(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def routed(monkeypatch):
+    import router
+    from sharding import ShardCluster
+
+    servers = {}
+    for name in ('a', 'b'):
+        httpd = ThreadingHTTPServer(('127.0.0.1', 0), ShardHandler)
+        httpd.name, httpd.requests, httpd.alerts = name, [], []
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        servers[name] = httpd
+    cluster = ShardCluster({name: f'http://127.0.0.1:{httpd.server_port}' for name, httpd in servers.items()})
+    monkeypatch.setattr(router, 'cluster', cluster)
+    yield router.app.test_client(), cluster, servers
+    for httpd in servers.values():
+        httpd.shutdown()
+        httpd.server_close()
+    cluster.pool.shutdown()
+
+
+def test_batch_split_across_shards_is_reassembled_in_order(routed):
+    client, cluster, servers = routed
+    jobs = [{'printer_id': f'printer-{i}'} for i in range(40)] + [{}]
+    response = client.post('/predict/batch', json={'jobs': jobs}, headers={'X-API-Key': 'fleet'},
+                           environ_base={'REMOTE_ADDR': '10.1.2.3'})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [r['printer_id'] for r in results] == [job.get('printer_id') for job in jobs]
+    for job, result in zip(jobs[:-1], results):
+        assert result['shard'] == cluster.ring.node_for(job['printer_id'])
+    for httpd in servers.values():
+        assert httpd.requests, 'both shards take part'
+        for headers, _ in httpd.requests:
+            assert headers['X-API-Key'] == 'fleet'
+            assert headers['X-Forwarded-For'] == '10.1.2.3'
+
+
+def test_failed_part_reports_scored_and_failed_jobs(routed):
+    client, cluster, servers = routed
+    jobs = [{'printer_id': f'printer-{i}'} for i in range(40)]
+    bad = next(i for i, job in enumerate(jobs) if cluster.ring.node_for(job['printer_id']) == 'b' and i > 5)
+    jobs[bad]['invalid'] = True
+    response = client.post('/predict/batch', json={'jobs': jobs})
+    assert response.status_code == 400
+    reply = response.get_json()
+    assert reply['error'] == f'Job {bad}: invalid'
+    on_b = [i for i, job in enumerate(jobs) if cluster.ring.node_for(job['printer_id']) == 'b']
+    assert reply['failed'] == on_b
+    for i, result in enumerate(reply['results']):
+        assert (result is None) == (i in on_b)
+
+
+def test_unavailable_shard_fails_only_its_part(routed):
+    client, cluster, servers = routed
+    servers['b'].shutdown()
+    servers['b'].server_close()
+    jobs = [{'printer_id': f'printer-{i}'} for i in range(40)]
+    response = client.post('/predict/batch', json={'jobs': jobs})
+    assert response.status_code == 502
+    reply = response.get_json()
+    assert reply['failed'] == [i for i, job in enumerate(jobs) if cluster.ring.node_for(job['printer_id']) == 'b']
+    assert all(result['shard'] == 'a' for result in reply['results'] if result is not None)
+
+
+def test_alert_pages_cover_every_alert_once(routed):
+    client, cluster, servers = routed
+    # Shards page newest id first; shard a's newest ids were imported from
+    # another shard and keep their older first_seen
+    servers['a'].alerts = [{'id': i, 'first_seen': first_seen}
+                           for i, first_seen in zip(range(8, 0, -1), (10, 20, 80, 70, 60, 50, 40, 30))]
+    servers['b'].alerts = [{'id': i, 'first_seen': 5 * i + 2} for i in range(12, 0, -1)]
+    seen, cursor = [], None
+    while True:
+        query = {'limit': 3, **({'cursor': cursor} if cursor else {})}
+        page = client.get('/alerts', query_string=query).get_json()
+        seen.extend(item['id'] for item in page['items'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    expected = [cluster.global_alert_id(name, item['id']) for name, httpd in servers.items() for item in httpd.alerts]
+    assert sorted(seen) == sorted(expected)
+
+
+def test_adding_a_shard_moves_about_one_in_n_keys_to_it():
+    from sharding import HashRing
+
+    keys = [f'printer-{i}' for i in range(20000)]
+    ring = HashRing(['a', 'b', 'c', 'd'])
+    before = {key: ring.node_for(key) for key in keys}
+    ring.add('e')
+    moved = [key for key in keys if ring.node_for(key) != before[key]]
+    assert abs(len(moved) / len(keys) - 1 / 5) < 0.03
+    assert {ring.node_for(key) for key in moved} == {'e'}
+    ring.remove('e')
+    assert all(ring.node_for(key) == before[key] for key in keys)
+
+
+def test_ring_balances_load():
+    from collections import Counter
+
+    from sharding import HashRing
+
+    keys = [f'printer-{i}' for i in range(20000)]
+    ring = HashRing(['a', 'b', 'c', 'd', 'e'])
+    counts = Counter(ring.node_for(key) for key in keys)
+    assert len(counts) == 5
+    assert all(0.85 < count / (len(keys) / 5) < 1.15 for count in counts.values())
@@ -0,0 +1,70 @@
+import pytest
+
+from telemetry_store import BLOCK_STREAMS, TelemetryStore
+
+DAY = 1_790_000_000 // 86400 * 86400
+
+
+def samples(start, seconds, value=lambda t: float(t % 60)):
+    return [{'timestamp': start + t, 'extruderTemp': value(t)} for t in range(seconds)]
+
+
+def test_compaction_rolls_minutes_into_coarser_tiers():
+    store = TelemetryStore(grace=60.0)
+    store.ingest('p1', samples(DAY, 180), now=DAY + 180)
+    written = store.compact(now=DAY + 180 + 60)
+    assert written['1m'] == 3
+
+    history = store.query('p1', 'extruderTemp', DAY, DAY + 180, step=60)
+    assert history['tier'] == '1m'
+    assert history['timestamps'] == [DAY, DAY + 60, DAY + 120]
+    assert history['min'] == [0.0] * 3 and history['max'] == [59.0] * 3
+    assert history['mean'] == pytest.approx([29.5] * 3)
+    assert history['count'] == [60] * 3
+
+
+def test_query_reads_uncompacted_tail_from_raw_tier():
+    store = TelemetryStore(grace=60.0)
+    store.ingest('p1', samples(DAY, 150), now=DAY + 150)
+    store.compact(now=DAY + 150)
+    history = store.query('p1', 'extruderTemp', DAY, DAY + 180, step=60)
+    # Minute 0 is compacted, minute 1 is still inside the grace period
+    assert history['count'] == [60, 60, 30]
+
+
+def test_buckets_outside_retention_are_not_returned():
+    store = TelemetryStore(retention={'1m': 3600}, grace=60.0)
+    store.ingest('p1', samples(DAY, 60, value=lambda t: 1.0), now=DAY + 60)
+    store.compact(now=DAY + 120)
+    store.compact(now=DAY + 3660)
+    store.ingest('p1', samples(DAY + 7200, 60, value=lambda t: 2.0), now=DAY + 7260)
+    store.compact(now=DAY + 7320)
+
+    # The first minute has left the 1m ring; the hourly rollup still has it
+    history = store.query('p1', 'extruderTemp', DAY, DAY + 3600, step=60)
+    assert history['tier'] == '1h'
+    assert history['timestamps'] == [DAY] and history['mean'] == [1.0] and history['count'] == [60]
+    recent = store.query('p1', 'extruderTemp', DAY + 7200, DAY + 7320, step=60)
+    assert recent['tier'] == '1m' and recent['mean'] == [2.0]
+
+
+def test_samples_behind_compaction_are_counted_late():
+    store = TelemetryStore(grace=60.0)
+    store.ingest('p1', samples(DAY, 120), now=DAY + 120)
+    store.compact(now=DAY + 180)
+    assert store.ingest('p1', samples(DAY + 30, 1), now=DAY + 180) == 0
+    assert store.late == 1
+    assert store.query('p1', 'extruderTemp', DAY, DAY + 60, step=60)['count'] == [60]
+
+
+def test_storage_is_allocated_in_blocks_of_streams():
+    store = TelemetryStore()
+    store.ingest('p0', samples(DAY, 1), now=DAY)
+    block = store.nbytes
+    per_stream = 20 * sum(tier.capacity for tier in store.tiers)
+    assert block == BLOCK_STREAMS * per_stream
+    for i in range(1, BLOCK_STREAMS):
+        store.ingest(f'p{i}', samples(DAY, 1), now=DAY)
+    assert store.nbytes == block
+    store.ingest('one-more', samples(DAY, 1), now=DAY)
+    assert store.nbytes == 2 * block